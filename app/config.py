@@ -50,6 +50,55 @@ class Settings:
     TOKEN_HEALTH_INTERVAL_HOURS: int = 24  # период автопроверки
     TOKEN_HEALTH_NOTIFY: bool = True       # уведомлять при ошибке
 
+    # --- Метрики постов (архив) ---
+    METRICS_CACHE_TTL_SECONDS: int = 120   # сколько живёт закешированная статистика
+    METRICS_CONCURRENCY: int = 5           # одновременных запросов к Threads при пакетной загрузке
+    METRICS_SNAPSHOT_INTERVAL_MINUTES: int = 15  # как часто запускается сборщик снимков
+    METRICS_SNAPSHOT_RAW_DAYS: int = 7     # снимки старше N дней прореживаются до одного в сутки
+    COMMENTS_CACHE_TTL_SECONDS: int = 300  # кеш страниц комментариев в архиве
+    ARCHIVE_SYNC_INTERVAL_HOURS: int = 6   # автосинхронизация архива с Threads (0 — выключено)
+    ARCHIVE_RETENTION_MONTHS: int = 0      # посты старше N месяцев уходят в холодный архив (0 — выключено)
+    ARCHIVE_MAINTENANCE_HOUR: int = 4      # «тихий» час (TZ планировщика) для переноса и VACUUM
+    ARCHIVE_VACUUM_PAGES: int = 2000       # сколько свободных страниц возвращать за один incremental_vacuum
+
+    # --- Кеш строк BotSettings / Account ---
+    ROW_CACHE_TTL_SECONDS: int = 600       # страховочный TTL (записи инвалидируются явно)
+
+    # --- Очередь уведомлений ---
+    NOTIFY_MERGE_WINDOW_SECONDS: int = 3        # сообщения в один чат за это окно склеиваются
+    NOTIFY_GLOBAL_RATE_PER_SEC: int = 25        # общий лимит бота (Telegram: ~30/с)
+    NOTIFY_PER_CHAT_INTERVAL_SECONDS: int = 1   # личные чаты: не чаще 1 сообщения в секунду
+    NOTIFY_GROUP_INTERVAL_SECONDS: int = 3      # группы: ~20 сообщений в минуту
+    DIGEST_DAILY_HOUR: int = 21                 # во сколько (по TZ пользователя) уходит дневная сводка
+
+    # --- Анти-флуд (token bucket на пользователя) ---
+    THROTTLE_BUCKET_CAPACITY: int = 12     # максимум токенов (запас на «пачку» нажатий)
+    THROTTLE_REFILL_PER_MINUTE: int = 40   # скорость пополнения
+
+    # --- Статистика кешей/анти-флуда в логе ---
+    STATS_LOG_MINUTES: int = 60            # как часто писать строку статистики (0 — только при остановке)
+
+    # --- AI (Gemini) ---
+    GEMINI_API_KEY: Optional[str] = None
+    GEMINI_MODEL: str = "gemini-2.5-flash-preview-09-2025"
+    AI_CONCURRENCY: int = 4            # одновременных запросов к Gemini на весь бот
+    AI_USER_HOURLY_QUOTA: int = 30     # запросов на пользователя в час (0 — без лимита)
+    AI_TIMEOUT_SECONDS: int = 30
+    AI_CACHE_TTL_HOURS: int = 72       # срок жизни закешированного ответа (0 — кеш выключен)
+    AI_CACHE_MAX_ROWS: int = 5000      # сверх лимита вытесняются давно не использованные
+
+    # --- Раздельный запуск (UI / воркер публикаций) ---
+    ROLE: str = "all"                  # all | ui | worker (можно переопределить флагом --role)
+    WORKER_POLL_SECONDS: int = 2       # как часто воркер читает очередь событий
+    WORKER_SHARDS: int = 1             # сколько воркеров делят задачи (job_id % WORKER_SHARDS)
+    WORKER_SHARD: int = 0              # номер этого воркера; служебные задачи — только у шарда 0
+
+    # --- Очередь публикаций (publish_attempts) ---
+    PUBLISH_MAX_ATTEMPTS: int = 5          # попыток на одно срабатывание, затем — ошибка пользователю
+    PUBLISH_RETRY_BASE_SECONDS: int = 60   # пауза перед повтором: base * 2^(попытка-1), не больше часа
+    PUBLISH_LEASE_SECONDS: int = 300       # аренда попытки воркером; истекла — попытку подхватит другой
+    PUBLISH_QUEUE_POLL_SECONDS: int = 30   # как часто воркер ищет повторы и брошенные попытки
+
     # --- Для обратной совместимости ---
     THREADS_TOKEN: Optional[str] = None
 
@@ -69,6 +118,39 @@ class Settings:
             IMGBB_API_KEY=os.getenv("IMGBB_API_KEY") or None, # (ИЗМЕНЕНО) Загружаем ключ
             TOKEN_HEALTH_INTERVAL_HOURS=_getenv_int("TOKEN_HEALTH_INTERVAL_HOURS", 24),
             TOKEN_HEALTH_NOTIFY=_getenv_bool("TOKEN_HEALTH_NOTIFY", True),
+            METRICS_CACHE_TTL_SECONDS=_getenv_int("METRICS_CACHE_TTL_SECONDS", 120),
+            METRICS_CONCURRENCY=_getenv_int("METRICS_CONCURRENCY", 5),
+            METRICS_SNAPSHOT_INTERVAL_MINUTES=_getenv_int("METRICS_SNAPSHOT_INTERVAL_MINUTES", 15),
+            METRICS_SNAPSHOT_RAW_DAYS=_getenv_int("METRICS_SNAPSHOT_RAW_DAYS", 7),
+            COMMENTS_CACHE_TTL_SECONDS=_getenv_int("COMMENTS_CACHE_TTL_SECONDS", 300),
+            ARCHIVE_SYNC_INTERVAL_HOURS=_getenv_int("ARCHIVE_SYNC_INTERVAL_HOURS", 6),
+            ARCHIVE_RETENTION_MONTHS=_getenv_int("ARCHIVE_RETENTION_MONTHS", 0),
+            ARCHIVE_MAINTENANCE_HOUR=_getenv_int("ARCHIVE_MAINTENANCE_HOUR", 4),
+            ARCHIVE_VACUUM_PAGES=_getenv_int("ARCHIVE_VACUUM_PAGES", 2000),
+            ROW_CACHE_TTL_SECONDS=_getenv_int("ROW_CACHE_TTL_SECONDS", 600),
+            NOTIFY_MERGE_WINDOW_SECONDS=_getenv_int("NOTIFY_MERGE_WINDOW_SECONDS", 3),
+            NOTIFY_GLOBAL_RATE_PER_SEC=_getenv_int("NOTIFY_GLOBAL_RATE_PER_SEC", 25),
+            NOTIFY_PER_CHAT_INTERVAL_SECONDS=_getenv_int("NOTIFY_PER_CHAT_INTERVAL_SECONDS", 1),
+            NOTIFY_GROUP_INTERVAL_SECONDS=_getenv_int("NOTIFY_GROUP_INTERVAL_SECONDS", 3),
+            DIGEST_DAILY_HOUR=_getenv_int("DIGEST_DAILY_HOUR", 21),
+            THROTTLE_BUCKET_CAPACITY=_getenv_int("THROTTLE_BUCKET_CAPACITY", 12),
+            THROTTLE_REFILL_PER_MINUTE=_getenv_int("THROTTLE_REFILL_PER_MINUTE", 40),
+            STATS_LOG_MINUTES=_getenv_int("STATS_LOG_MINUTES", 60),
+            GEMINI_API_KEY=os.getenv("GEMINI_API_KEY") or None,
+            GEMINI_MODEL=os.getenv("GEMINI_MODEL") or "gemini-2.5-flash-preview-09-2025",
+            AI_CONCURRENCY=_getenv_int("AI_CONCURRENCY", 4),
+            AI_USER_HOURLY_QUOTA=_getenv_int("AI_USER_HOURLY_QUOTA", 30),
+            AI_TIMEOUT_SECONDS=_getenv_int("AI_TIMEOUT_SECONDS", 30),
+            AI_CACHE_TTL_HOURS=_getenv_int("AI_CACHE_TTL_HOURS", 72),
+            AI_CACHE_MAX_ROWS=_getenv_int("AI_CACHE_MAX_ROWS", 5000),
+            ROLE=(os.getenv("ROLE") or "all").strip().lower(),
+            WORKER_POLL_SECONDS=_getenv_int("WORKER_POLL_SECONDS", 2),
+            WORKER_SHARDS=_getenv_int("WORKER_SHARDS", 1),
+            WORKER_SHARD=_getenv_int("WORKER_SHARD", 0),
+            PUBLISH_MAX_ATTEMPTS=_getenv_int("PUBLISH_MAX_ATTEMPTS", 5),
+            PUBLISH_RETRY_BASE_SECONDS=_getenv_int("PUBLISH_RETRY_BASE_SECONDS", 60),
+            PUBLISH_LEASE_SECONDS=_getenv_int("PUBLISH_LEASE_SECONDS", 300),
+            PUBLISH_QUEUE_POLL_SECONDS=_getenv_int("PUBLISH_QUEUE_POLL_SECONDS", 30),
             THREADS_TOKEN=os.getenv("THREADS_TOKEN") or None,
         )
 
@@ -6,7 +6,10 @@ from sqlalchemy import text
 from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 # Берём всё из моделей
-from app.database.models import Base, async_engine as models_engine, DATABASE_URL, async_session
+from app.database.models import (
+    Base, async_engine as models_engine, DATABASE_URL, async_session,
+    SEARCH_FTS_TABLE, SEARCH_KIND_COLD_POST, SEARCH_KIND_POST, SEARCH_KIND_DRAFT, SEARCH_KIND_JOB,
+)
 
 log = logging.getLogger(__name__)
 
@@ -46,9 +49,29 @@ async def init_db() -> None:
     await ensure_column_if_missing("accounts", "token_status", "TEXT")
     await ensure_column_if_missing("accounts", "token_status_msg", "TEXT")
     await ensure_column_if_missing("accounts", "token_checked_at", "TIMESTAMP")
+    await ensure_column_if_missing("accounts", "archive_synced_until", "TIMESTAMP")
+    await ensure_column_if_missing("bot_settings", "digest_mode", "TEXT")
+    await ensure_published_posts_unique()
+    await ensure_index_if_missing("ix_jobs_user_time_id", "jobs", ["tg_user_id", "time_str", "id"])
+    await ensure_index_if_missing(
+        "ix_published_posts_user_published", "published_posts", ["tg_user_id", "published_at"]
+    )
+    await ensure_search_index()
 
 
 
+async def ensure_wal_mode() -> None:
+    """
+    SQLite: журнал WAL — читатели не блокируют писателя. Нужен, когда с одной БД
+    работают несколько процессов (ROLE=ui + ROLE=worker). Режим сохраняется в файле БД.
+    """
+    if not DATABASE_URL.startswith("sqlite"):
+        return
+    async with _ensure_engine().connect() as conn:
+        mode = (await conn.execute(text("PRAGMA journal_mode=WAL"))).scalar()
+    log.info("DB init: journal_mode=%s", mode)
+
+
 async def ensure_column_if_missing(table: str, column: str, ddl: str) -> None:
     """
     Простая 'ленивая миграция': если в таблице нет колонки — добавляем её.
@@ -66,3 +89,112 @@ async def ensure_column_if_missing(table: str, column: str, ddl: str) -> None:
         log.info(f"[init_db] Adding missing column: {table}.{column} ({ddl})")
         await session.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
         await session.commit()
+
+
+async def ensure_index_if_missing(name: str, table: str, columns: list[str], unique: bool = False) -> bool:
+    """
+    'Ленивая миграция' для индексов (create_all не добавляет их в уже существующие таблицы).
+    Возвращает True, если индекс был создан.
+    """
+    async with async_session() as session:
+        res = await session.execute(text(f"PRAGMA index_list({table})"))
+        if name in {row[1] for row in res.fetchall()}:  # row[1] — имя индекса
+            return False
+
+        log.info(f"[init_db] Creating missing index: {name} on {table}({', '.join(columns)})")
+        await session.execute(text(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})"
+        ))
+        await session.commit()
+        return True
+
+
+async def ensure_published_posts_unique() -> None:
+    """
+    Уникальность (account_id, threads_post_id) в архиве.
+    Перед созданием индекса удаляем дубликаты (оставляем самую раннюю запись).
+    """
+    async with async_session() as session:
+        res = await session.execute(text("PRAGMA index_list(published_posts)"))
+        if "ux_published_posts_account_post" in {row[1] for row in res.fetchall()}:
+            return
+
+        res = await session.execute(text(
+            "DELETE FROM published_posts WHERE id NOT IN ("
+            " SELECT MIN(id) FROM published_posts GROUP BY account_id, threads_post_id)"
+        ))
+        if res.rowcount:
+            log.warning(f"[init_db] Removed {res.rowcount} duplicate published_posts row(s)")
+            await session.execute(text(
+                "DELETE FROM post_metrics_snapshots WHERE post_id NOT IN (SELECT id FROM published_posts)"
+            ))
+        await session.commit()
+
+    await ensure_index_if_missing(
+        "ux_published_posts_account_post", "published_posts", ["account_id", "threads_post_id"], unique=True
+    )
+
+
+# --- Полнотекстовый поиск (SQLite FTS5) ---
+_SEARCH_SOURCES = {
+    "published_posts": SEARCH_KIND_POST,
+    "drafts": SEARCH_KIND_DRAFT,
+    "jobs": SEARCH_KIND_JOB,
+}
+
+
+async def ensure_search_index() -> bool:
+    """
+    Создаёт FTS5-индекс по текстам постов/черновиков/задач и триггеры синхронизации.
+    При первом создании заполняет индекс существующими строками.
+    Возвращает False, если FTS5 недоступен (поиск тогда работает через LIKE).
+    """
+    if not DATABASE_URL.startswith("sqlite"):
+        log.info("[init_db] Full-text search index skipped: not a SQLite database")
+        return False
+
+    async with async_session() as session:
+        exists = (await session.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": SEARCH_FTS_TABLE},
+        )).first()
+        try:
+            if not exists:
+                log.info(f"[init_db] Creating full-text search index: {SEARCH_FTS_TABLE}")
+                await session.execute(text(
+                    f"CREATE VIRTUAL TABLE {SEARCH_FTS_TABLE} USING fts5("
+                    "text, tg_user_id UNINDEXED, tokenize = 'unicode61 remove_diacritics 2')"
+                ))
+
+            for table, kind in _SEARCH_SOURCES.items():
+                rowid_new, rowid_old = f"new.id * 4 + {kind}", f"old.id * 4 + {kind}"
+                insert_new = (
+                    f"INSERT INTO {SEARCH_FTS_TABLE}(rowid, text, tg_user_id) "
+                    f"VALUES ({rowid_new}, coalesce(new.text, ''), new.tg_user_id);"
+                )
+                delete_old = f"DELETE FROM {SEARCH_FTS_TABLE} WHERE rowid = {rowid_old};"
+                for suffix, ddl in (
+                    ("ai", f"AFTER INSERT ON {table} BEGIN {insert_new} END"),
+                    ("ad", f"AFTER DELETE ON {table} BEGIN {delete_old} END"),
+                    ("au", f"AFTER UPDATE OF text, tg_user_id ON {table} BEGIN {delete_old} {insert_new} END"),
+                ):
+                    await session.execute(text(f"CREATE TRIGGER IF NOT EXISTS {table}_fts_{suffix} {ddl}"))
+
+                if not exists:
+                    await session.execute(text(
+                        f"INSERT INTO {SEARCH_FTS_TABLE}(rowid, text, tg_user_id) "
+                        f"SELECT id * 4 + {kind}, coalesce(text, ''), tg_user_id FROM {table}"
+                    ))
+
+            # Холодный архив хранит сжатый текст, поэтому в индекс его пишет сам перенос
+            # (app.services.archive_retention); здесь только чистка при удалении.
+            await session.execute(text(
+                "CREATE TRIGGER IF NOT EXISTS published_posts_cold_fts_ad AFTER DELETE ON published_posts_cold "
+                f"BEGIN DELETE FROM {SEARCH_FTS_TABLE} WHERE rowid = old.id * 4 + {SEARCH_KIND_COLD_POST}; END"
+            ))
+            await session.commit()
+        except OperationalError as e:
+            await session.rollback()
+            log.warning(f"[init_db] FTS5 is not available, search will fall back to LIKE: {e}")
+            return False
+    return True
@@ -10,7 +10,7 @@ from typing import Optional, List # Добавлено List
 
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncAttrs
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from sqlalchemy import BigInteger, String, Integer, Text, ForeignKey, DateTime, Column, Boolean
+from sqlalchemy import BigInteger, String, Integer, Text, ForeignKey, DateTime, Column, Boolean, Index, LargeBinary, UniqueConstraint
 
 from sqlalchemy.orm import relationship
 from datetime import datetime, timezone # Добавлено timezone
@@ -79,10 +79,15 @@ class Account(Base):
     token_status = Column(String(16), nullable=True)
     token_status_msg = Column(Text, nullable=True)
     token_checked_at = Column(DateTime, nullable=True)
+    archive_synced_until = Column(DateTime, nullable=True)  # самый новый пост, импортированный синхронизацией
 
 
 class Job(Base):
     __tablename__ = "jobs"
+    __table_args__ = (
+        # Список задач листается курсором (time_str, id) в пределах пользователя
+        Index("ix_jobs_user_time_id", "tg_user_id", "time_str", "id"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     tg_user_id: Mapped[int] = mapped_column(BigInteger, index=True)
@@ -107,6 +112,12 @@ class JobMedia(Base):
 
 class PublishedPost(Base):
     __tablename__ = "published_posts"
+    __table_args__ = (
+        # Один пост Threads — одна запись на аккаунт (upsert при синхронизации)
+        Index("ux_published_posts_account_post", "account_id", "threads_post_id", unique=True),
+        # Архив листается по датам и курсором (published_at, id) в пределах пользователя
+        Index("ix_published_posts_user_published", "tg_user_id", "published_at"),
+    )
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
     tg_user_id: Mapped[int] = mapped_column(BigInteger, index=True)
@@ -117,6 +128,48 @@ class PublishedPost(Base):
     has_media: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
 
 
+class PostMetricsSnapshot(Base):
+    """Снимок статистики поста (временной ряд для архива)."""
+    __tablename__ = "post_metrics_snapshots"
+    __table_args__ = (
+        Index("ix_post_metrics_snapshots_post_taken", "post_id", "taken_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    post_id: Mapped[int] = mapped_column(Integer, ForeignKey("published_posts.id", ondelete="CASCADE"), nullable=False)
+    taken_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    likes: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)    # None — поле недоступно
+    replies: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+
+class PublishedPostCold(Base):
+    """
+    Холодное хранилище архива: посты старше ARCHIVE_RETENTION_MONTHS.
+    Текст сжат (zlib), для списков хранится короткий preview;
+    последние известные метрики переносятся из снимков.
+    В колбеках такие посты адресуются отрицательным id (archive_post:-<id>).
+    """
+    __tablename__ = "published_posts_cold"
+    __table_args__ = (
+        Index("ux_published_posts_cold_account_post", "account_id", "threads_post_id", unique=True),
+        Index("ix_published_posts_cold_user_published", "tg_user_id", "published_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    original_id: Mapped[int] = mapped_column(Integer, nullable=False, unique=True)  # id в published_posts
+    tg_user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    account_id: Mapped[int] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=False)
+    threads_post_id: Mapped[str] = mapped_column(String, nullable=False)
+    text_z: Mapped[Optional[bytes]] = mapped_column(LargeBinary, nullable=True)
+    preview: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    published_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    has_media: Mapped[bool] = mapped_column(Boolean, default=False, nullable=False)
+    likes: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    replies: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+    metrics_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+
 # --- (НОВЫЕ МОДЕЛИ) ---
 class Draft(Base):
     __tablename__ = "drafts"
@@ -151,4 +204,77 @@ class BotSettings(Base):
     notify_chat_id: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
     tz: Mapped[Optional[str]] = mapped_column(String, nullable=True)
     default_account_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("accounts.id"), nullable=True) # Добавлен ForeignKey
+    digest_mode = Column(String, nullable=True)  # 'off' | 'hourly' | 'daily' — сводка успешных публикаций
+
+
+class DigestItem(Base):
+    """Успешная публикация, ожидающая отправки в сводке (digest)."""
+    __tablename__ = "digest_items"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    tg_user_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+
+
+class AiCacheEntry(Base):
+    """Закешированный ответ Gemini (ключ — sha256 от модели, промпта и параметров)."""
+    __tablename__ = "ai_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String, nullable=False)
+    response: Mapped[str] = mapped_column(Text, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    last_used_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    hits: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
 
+
+class WorkerEvent(Base):
+    """Событие для процессов-воркеров (ROLE=worker): пересборка расписания, сброс кеша."""
+    __tablename__ = "worker_events"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    kind: Mapped[str] = mapped_column(String(32), nullable=False)
+    payload: Mapped[Optional[str]] = mapped_column(Text, nullable=True)  # JSON
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class PublishAttempt(Base):
+    """
+    Попытка публикации одного срабатывания задачи (очередь publish_attempts).
+    Шаги step: queued -> media_ready -> container_created -> published; после каждого —
+    commit, так что повтор продолжает с последнего шага, не создавая второй контейнер.
+    status: running (под арендой lease_owner до lease_until) / pending (ждёт next_attempt_at)
+    / done / failed / cancelled.
+    """
+    __tablename__ = "publish_attempts"
+    __table_args__ = (
+        # Одно срабатывание — одна попытка, даже если триггер сработал в двух процессах
+        UniqueConstraint("job_id", "scheduled_for", name="ux_publish_attempts_job_fire"),
+        Index("ix_publish_attempts_status_next", "status", "next_attempt_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    job_id: Mapped[int] = mapped_column(Integer, nullable=False)  # без FK: история переживает удаление задачи
+    tg_user_id: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    scheduled_for: Mapped[datetime] = mapped_column(DateTime, nullable=False)  # UTC, до минуты
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="running")
+    step: Mapped[str] = mapped_column(String(24), nullable=False, default="queued")
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    lease_owner: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    lease_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    next_attempt_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    # Снимок на шаге media_ready: {"account_id", "time_str", "text", "image_urls", "media_failed"}
+    payload: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    container_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    published_id: Mapped[Optional[str]] = mapped_column(String, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+# --- Полнотекстовый поиск ---
+# Виртуальная FTS5-таблица создаётся в init_db.ensure_search_index (ORM её не описывает).
+# rowid = id * 4 + kind, чтобы посты, черновики, задачи и холодный архив жили в одном индексе.
+SEARCH_FTS_TABLE = "search_fts"
+SEARCH_KIND_COLD_POST, SEARCH_KIND_POST, SEARCH_KIND_DRAFT, SEARCH_KIND_JOB = 0, 1, 2, 3
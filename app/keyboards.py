@@ -7,11 +7,14 @@
 from __future__ import annotations
 
 import locale # Для форматирования дат
-from typing import Iterable, List, Tuple
+import logging
+import time
+from functools import lru_cache, wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton, KeyboardButton # Добавлен KeyboardButton
 from datetime import datetime, date # Добавлено date
 
-from app.database.models import Job, Account, PublishedPost, Draft # Добавлен Draft
+from app.database.models import Account, SEARCH_KIND_COLD_POST, SEARCH_KIND_POST, SEARCH_KIND_DRAFT
 
 # Попробуем установить локаль для названий месяцев
 try:
@@ -25,22 +28,98 @@ except locale.Error:
         print("Warning: Could not set locale to en_US for month names.")
         pass # Игнорируем ошибку, если локаль не установлена
 
+# =========================
+#   КЕШ ГОТОВЫХ КЛАВИАТУР
+# =========================
+# Статичные меню и клавиатуры с небольшим числом состояний собираются один раз.
+# Разметка aiogram изменяема (pydantic-модели без frozen, inline_keyboard — обычные
+# списки), поэтому собранный экземпляр наружу не отдаётся: кеш хранит прототип,
+# а каждый вызов получает свою копию (новые списки рядов и копии кнопок) —
+# это в разы дешевле полной сборки с валидацией, и правка результата одним
+# хендлером не видна другим пользователям.
+
+log = logging.getLogger(__name__)
+
+_kb_stats: Dict[str, Dict[str, float]] = {}
+
+
+def _copy_markup(markup: Any) -> Any:
+    """Независимая копия Inline/Reply-разметки: свои списки рядов и свои кнопки."""
+    field = "inline_keyboard" if isinstance(markup, InlineKeyboardMarkup) else "keyboard"
+    rows = [[button.model_copy() for button in row] for row in getattr(markup, field)]
+    return markup.model_copy(update={field: rows})
+
+
+def memo_keyboard(maxsize: Optional[int] = None) -> Callable:
+    """
+    Декоратор: кеширует результат сборщика клавиатуры по аргументам (должны быть хешируемыми).
+    maxsize=None — без ограничения (для статичных меню и конечного набора состояний).
+    Возвращает копию закешированной разметки (см. _copy_markup) — её можно менять.
+    Сборки, попадания и время сборки — в keyboard_stats() / log_keyboard_stats().
+    """
+    def decorator(builder: Callable[..., Any]) -> Callable[..., Any]:
+        stats = _kb_stats.setdefault(builder.__name__, {"calls": 0, "builds": 0, "build_ms": 0.0})
+
+        @lru_cache(maxsize=maxsize)
+        def build(*args, **kwargs):
+            started = time.perf_counter()
+            markup = builder(*args, **kwargs)
+            stats["builds"] += 1
+            stats["build_ms"] += (time.perf_counter() - started) * 1000
+            return markup
+
+        @wraps(builder)
+        def wrapper(*args, **kwargs):
+            stats["calls"] += 1
+            return _copy_markup(build(*args, **kwargs))
+
+        wrapper.cache_info = build.cache_info
+        wrapper.cache_clear = build.cache_clear
+        return wrapper
+    return decorator
+
+
+def keyboard_stats() -> Dict[str, Dict[str, Any]]:
+    return {
+        name: {
+            "builds": int(st["builds"]),
+            "hits": int(st["calls"] - st["builds"]),
+            "build_ms": round(st["build_ms"], 3),
+        }
+        for name, st in _kb_stats.items()
+    }
+
+
+def log_keyboard_stats() -> None:
+    """Одна строка в лог: сборки / попадания / время сборки по каждой клавиатуре."""
+    stats = keyboard_stats()
+    if not stats:
+        return
+    log.info("keyboards: %s", ", ".join(
+        f"{name} builds={st['builds']} hits={st['hits']} build_ms={st['build_ms']}"
+        for name, st in sorted(stats.items())
+    ))
+
+
 # =========================
 #   ГЛАВНОЕ МЕНЮ И НАСТРОЙКИ
 # =========================
 
+@memo_keyboard()
 def main_menu_kb() -> InlineKeyboardMarkup:
     """Главное меню (инлайн-версия)."""
     rows = [
         [InlineKeyboardButton(text="📝 Post now", callback_data="post_now")],
         [InlineKeyboardButton(text="⏱ Schedule", callback_data="sched_menu")],
         [InlineKeyboardButton(text="📄 Drafts", callback_data="drafts_menu")], # Добавлена кнопка Drafts
+        [InlineKeyboardButton(text="🔍 Search", callback_data="search_start")],
         [InlineKeyboardButton(text="🔑 Accounts", callback_data="tok_accounts")],
         [InlineKeyboardButton(text="⚙️ Settings", callback_data="settings_menu")],
     ]
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+@memo_keyboard()
 def settings_menu_kb() -> InlineKeyboardMarkup:
     """Меню настроек."""
     rows = [
@@ -96,19 +175,33 @@ def account_delete_confirm_kb(acc_id: int) -> InlineKeyboardMarkup:
 #   УВЕДОМЛЕНИЯ И ЧАСОВОЙ ПОЯС
 # =========================
 
+@memo_keyboard()
 def notify_menu() -> InlineKeyboardMarkup:
     """Меню уведомлений."""
     rows = [
         [InlineKeyboardButton(text="📍 Send reports here", callback_data="notify_here")],
         [InlineKeyboardButton(text="📊 Status", callback_data="notify_status")],
         [InlineKeyboardButton(text="🌍 Time Zone", callback_data="tz_menu")], # Ссылка на tz_menu
+        [InlineKeyboardButton(text="🗞 Digest", callback_data="digest_menu")],
         [InlineKeyboardButton(text="🧪 Test", callback_data="notify_test")],
         [InlineKeyboardButton(text="🔕 Off", callback_data="notify_off")],
         [InlineKeyboardButton(text="⬅️ Back to Settings", callback_data="settings_menu")],
     ]
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
+@memo_keyboard(maxsize=8)
+def digest_mode_kb(current: str) -> InlineKeyboardMarkup:
+    """Выбор режима сводки успешных публикаций."""
+    labels = {"off": "⚡ Instant", "hourly": "🕐 Hourly digest", "daily": "📅 Daily digest"}
+    rows = [
+        [InlineKeyboardButton(text=f"{'✅ ' if mode == current else ''}{label}", callback_data=f"digest_set:{mode}")]
+        for mode, label in labels.items()
+    ]
+    rows.append([InlineKeyboardButton(text="⬅️ Back", callback_data="notify_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
 # --- (ВОССТАНОВЛЕНА ФУНКЦИЯ tz_menu) ---
+@memo_keyboard(maxsize=256)
 def tz_menu(current_tz: str) -> InlineKeyboardMarkup:
     """Меню настройки часового пояса."""
     rows = [
@@ -127,6 +220,15 @@ def tz_menu(current_tz: str) -> InlineKeyboardMarkup:
 #         SCHEDULE
 # =========================
 
+def schedule_export_format_kb(formats: Iterable[Tuple[str, str]]) -> InlineKeyboardMarkup:
+    """Выбор формата экспорта: пары (формат, подпись)."""
+    rows = [[InlineKeyboardButton(text=f"📤 {label}", callback_data=f"sched_export_fmt:{fmt}")]
+            for fmt, label in formats]
+    rows.append([InlineKeyboardButton(text="⬅️ Back to Schedule", callback_data="sched_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+@memo_keyboard()
 def schedule_menu() -> InlineKeyboardMarkup:
     """Главное меню раздела Schedule."""
     rows = [
@@ -147,8 +249,9 @@ def schedule_menu() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+@memo_keyboard(maxsize=128)
 def dow_picker_kb(mask: int) -> InlineKeyboardMarkup:
-    """Компактный пикер дней недели."""
+    """Компактный пикер дней недели (все 128 вариантов маски собираются при импорте)."""
     days = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
 
     # Кнопки дней недели в два ряда
@@ -174,6 +277,11 @@ def dow_picker_kb(mask: int) -> InlineKeyboardMarkup:
 
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
+
+for _mask in range(128):
+    dow_picker_kb(_mask)
+
+
 def weekly_view_kb(days_info: list[tuple[str, str, int]]) -> InlineKeyboardMarkup:
     """Клавиатура для недельного просмотра."""
     rows = []
@@ -190,8 +298,14 @@ def day_view_kb(date_str: str) -> InlineKeyboardMarkup:
         [InlineKeyboardButton(text="⬅️ Back to Weekly View", callback_data="sched_weekly_view")]
     ])
 
-def job_list_kb(jobs: list[Job]) -> InlineKeyboardMarkup:
-    """Клавиатура со списком задач для выбора (улучшенная)."""
+def job_list_kb(
+    jobs: list, *, has_prev: bool = False, has_next: bool = False, filter_code: str = "",
+) -> InlineKeyboardMarkup:
+    """
+    Страница списка задач (улучшенная).
+    jobs — строки с id, time_str, dow_mask, text (можно укороченный) и media_count;
+    листание — курсором (time_str, id) первой/последней задачи страницы: sched_lp:{p|n}:{HHMM}:{id}:{фильтр}.
+    """
     rows = []
     # Словарь для форматирования дней недели
     dow_map = {0: "Mo", 1: "Tu", 2: "We", 3: "Th", 4: "Fr", 5: "Sa", 6: "Su"}
@@ -205,8 +319,8 @@ def job_list_kb(jobs: list[Job]) -> InlineKeyboardMarkup:
         elif mask == 96: dow_str = "Weekends"
         else: dow_str = ",".join([dow_map[i] for i in range(7) if (mask >> i) & 1])
 
-        # Количество медиа (если связь загружена)
-        media_count = len(job.media) if hasattr(job, 'media') and job.media is not None else 0
+        # Количество медиа (считается подзапросом)
+        media_count = getattr(job, "media_count", 0) or 0
         media_icon = f"🖼️{media_count}" if media_count > 0 else ""
 
         # Сокращение текста
@@ -216,10 +330,35 @@ def job_list_kb(jobs: list[Job]) -> InlineKeyboardMarkup:
         label = f"⏰{job.time_str} 🗓️{dow_str} {media_icon}📝{short_text}"
         rows.append([InlineKeyboardButton(text=label, callback_data=f"sched_job_view:{job.id}")])
 
+    nav = []
+    if has_prev and jobs:
+        first = jobs[0]
+        nav.append(InlineKeyboardButton(
+            text="⬅️ Prev", callback_data=f"sched_lp:p:{first.time_str.replace(':', '')}:{first.id}:{filter_code}"))
+    if has_next and jobs:
+        last = jobs[-1]
+        nav.append(InlineKeyboardButton(
+            text="Next ➡️", callback_data=f"sched_lp:n:{last.time_str.replace(':', '')}:{last.id}:{filter_code}"))
+    if nav:
+        rows.append(nav)
+
+    rows.append([InlineKeyboardButton(text="🔎 Filter", callback_data="sched_lfilter")])
     rows.append([InlineKeyboardButton(text="⬅️ Back to Schedule", callback_data="sched_menu")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
+def job_list_filter_kb(accounts: Iterable[Tuple[int, str]]) -> InlineKeyboardMarkup:
+    """Фильтр списка задач: по аккаунту (пары id, название) или по дню недели."""
+    days = ["Mo", "Tu", "We", "Th", "Fr", "Sa", "Su"]
+    rows = [[InlineKeyboardButton(text="📃 All tasks", callback_data="sched_lf:")]]
+    day_buttons = [InlineKeyboardButton(text=d, callback_data=f"sched_lf:d{i}") for i, d in enumerate(days)]
+    rows += [day_buttons[:4], day_buttons[4:]]
+    for acc_id, title in accounts:
+        rows.append([InlineKeyboardButton(text=f"👤 {title or f'id={acc_id}'}", callback_data=f"sched_lf:a{acc_id}")])
+    rows.append([InlineKeyboardButton(text="⬅️ Back to List", callback_data="sched_list")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
 def job_actions_kb(job_id: int) -> InlineKeyboardMarkup:
     """Кнопки действий для конкретной задачи."""
     rows = [
@@ -245,53 +384,87 @@ def job_delete_confirm_kb(job_id: int) -> InlineKeyboardMarkup:
 #         ARCHIVE
 # =========================
 
-def archive_dates_kb(dates_with_counts: List[Tuple[str | date, int]]) -> InlineKeyboardMarkup: # Изменено на str | date
-    """Клавиатура для выбора даты в архиве."""
+def archive_years_kb(years_with_counts: List[Tuple[str, int]]) -> InlineKeyboardMarkup:
+    """Архив: годы с количеством постов + импорт."""
+    rows = [[InlineKeyboardButton(text=f"{year} ({count} posts)", callback_data=f"archive_year:{year}")]
+            for year, count in years_with_counts]
+    rows.append([InlineKeyboardButton(text="📥 Import Manual Post", callback_data="archive_import_start")]) # Кнопка импорта
+    rows.append([InlineKeyboardButton(text="⬅️ Back to Settings", callback_data="settings_menu")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def archive_months_kb(year: str, months_with_counts: List[Tuple[str, int]]) -> InlineKeyboardMarkup:
+    """Месяцы выбранного года ('YYYY-MM', кол-во), по два в ряд."""
+    buttons = []
+    for month, count in months_with_counts:
+        label = datetime.strptime(month, "%Y-%m").strftime(f"%b ({count})")
+        buttons.append(InlineKeyboardButton(text=label, callback_data=f"archive_month:{month}"))
+    rows = [buttons[i:i + 2] for i in range(0, len(buttons), 2)]
+    rows.append([InlineKeyboardButton(text="⬅️ Back to Years", callback_data="archive_list:0")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def archive_dates_kb(
+    dates_with_counts: List[Tuple[str | date, int]], month: str,
+    has_prev: bool = False, has_next: bool = False,
+) -> InlineKeyboardMarkup:
+    """
+    Страница дат месяца ('YYYY-MM-DD', кол-во).
+    Листание — курсором по дате: archive_month:{YYYY-MM}:{prev|next}:{дата}.
+    """
     rows = []
+    shown: List[str] = []
     for dt_val, count in dates_with_counts:
-        # --- (ИСПРАВЛЕНИЕ) ---
         # Преобразуем строку в date, если это строка
-        dt: date | None = None # Явно указываем тип
-        if isinstance(dt_val, str):
-            try:
-                # date.fromisoformat ожидает 'YYYY-MM-DD'
-                dt = date.fromisoformat(dt_val)
-            except ValueError:
-                print(f"Warning: Could not parse date string '{dt_val}' in archive_dates_kb")
-                continue # Пропускаем некорректные даты
-        elif isinstance(dt_val, date):
-            dt = dt_val
-        else:
-             print(f"Warning: Unexpected date type '{type(dt_val)}' in archive_dates_kb")
-             continue # Пропускаем
-
-        if dt is None: # Дополнительная проверка
-             continue
-
+        try:
+            dt = date.fromisoformat(dt_val) if isinstance(dt_val, str) else dt_val
+        except ValueError:
+            continue # Пропускаем некорректные даты
         date_str = dt.strftime('%Y-%m-%d')
-        # --- Конец исправления ---
-        # Используем locale для форматирования, %B - полное название месяца
+        shown.append(date_str)
         label = dt.strftime(f'%d %b %Y ({count} posts)') # %b - сокращенное название месяца
         rows.append([InlineKeyboardButton(text=label, callback_data=f"archive_date:{date_str}")])
 
-    rows.append([InlineKeyboardButton(text="📥 Import Manual Post", callback_data="archive_import_start")]) # Кнопка импорта
-    rows.append([InlineKeyboardButton(text="⬅️ Back to Settings", callback_data="settings_menu")])
+    nav = []
+    if has_prev and shown:
+        nav.append(InlineKeyboardButton(text="⬅️ Newer", callback_data=f"archive_month:{month}:prev:{shown[0]}"))
+    if has_next and shown:
+        nav.append(InlineKeyboardButton(text="Older ➡️", callback_data=f"archive_month:{month}:next:{shown[-1]}"))
+    if nav:
+        rows.append(nav)
+
+    rows.append([InlineKeyboardButton(text="⬅️ Back to Months", callback_data=f"archive_year:{month[:4]}")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
-def archive_posts_kb(posts: List[PublishedPost], accounts_map: dict, date_str: str) -> InlineKeyboardMarkup:
-    """Клавиатура со списком постов за выбранную дату."""
+def archive_posts_kb(posts: list, date_str: str, has_prev: bool = False, has_next: bool = False) -> InlineKeyboardMarkup:
+    """
+    Страница постов за выбранную дату: строки с id, published_at, has_media, text (начало), account_id, account_title.
+    Листание — курсором (published_at, id): archive_date:{дата}:{prev|next}:{HHMMSSffffff}:{id}.
+    """
     rows = []
     for post in posts:
         time_str = post.published_at.strftime('%H:%M')
-        acc_title = accounts_map.get(post.account_id, f"id={post.account_id}")
+        acc_title = post.account_title or f"id={post.account_id}"
         media_icon = "🖼️" if post.has_media else ""
         short_text = (post.text or "")[:30].replace("\n", " ")
         if len(post.text or "") > 30: short_text += "..."
         label = f"{time_str} ({acc_title}) {media_icon} {short_text}"
         rows.append([InlineKeyboardButton(text=label, callback_data=f"archive_post:{post.id}")])
 
-    rows.append([InlineKeyboardButton(text="⬅️ Back to Dates", callback_data="archive_list:0")])
+    nav = []
+    if has_prev and posts:
+        first = posts[0]
+        nav.append(InlineKeyboardButton(
+            text="⬅️ Newer", callback_data=f"archive_date:{date_str}:prev:{first.published_at:%H%M%S%f}:{first.id}"))
+    if has_next and posts:
+        last = posts[-1]
+        nav.append(InlineKeyboardButton(
+            text="Older ➡️", callback_data=f"archive_date:{date_str}:next:{last.published_at:%H%M%S%f}:{last.id}"))
+    if nav:
+        rows.append(nav)
+
+    rows.append([InlineKeyboardButton(text="⬅️ Back to Dates", callback_data=f"archive_month:{date_str[:7]}")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 
@@ -310,16 +483,17 @@ def archive_post_detail_kb(date_str: str, post_db_id: int) -> InlineKeyboardMark
 def archive_comments_kb(
     comments: list[dict], post_db_id: int, date_str: str,
     current_page: int, per_page: int,
-    has_next_page: bool, has_prev_page: bool
+    has_next_page: bool, has_prev_page: bool,
+    drafted_ids: frozenset = frozenset(),
 ) -> InlineKeyboardMarkup:
-    """Клавиатура для отображения комментариев с пагинацией."""
+    """Клавиатура для отображения комментариев с пагинацией (🤖 — есть черновик ответа)."""
     rows = []
     for i, comment in enumerate(comments):
         user = comment.get('username', 'unknown')
         text = (comment.get('text', '') or '')[:40].replace('\n', ' ')
         if len(comment.get('text', '')) > 40: text += '...'
-        label = f"👤{user}: \"{text}\""
         comment_id = comment.get('id', '')
+        label = f"{'🤖' if comment_id in drafted_ids else '👤'}{user}: \"{text}\""
         # Кнопка для выбора комментария
         rows.append([InlineKeyboardButton(text=label, callback_data=f"archive_select_comment:{post_db_id}:{comment_id}")])
 
@@ -341,6 +515,10 @@ def archive_comments_kb(
     if nav_buttons:
         rows.append(nav_buttons)
 
+    if comments:
+        # Один запрос к ИИ на всю страницу
+        rows.append([InlineKeyboardButton(text="🤖 Draft replies for this page", callback_data=f"archive_draft_page:{post_db_id}")])
+
     # Кнопка Назад к посту
     rows.append([InlineKeyboardButton(text="⬅️ Back to Post", callback_data=f"archive_post:{post_db_id}")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
@@ -387,9 +565,11 @@ def archive_import_account_kb(accounts: List[Account]) -> InlineKeyboardMarkup:
     rows.append([InlineKeyboardButton(text="⬅️ Back to Archive", callback_data="archive_list:0")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
-def archive_import_list_kb(posts: List[dict]) -> InlineKeyboardMarkup:
-    """Список постов для импорта."""
+def archive_import_list_kb(posts: List[dict], account_id: Optional[int] = None) -> InlineKeyboardMarkup:
+    """Список постов для импорта (+ кнопка полной синхронизации аккаунта)."""
     rows = []
+    if account_id is not None:
+        rows.append([InlineKeyboardButton(text="🔄 Sync all posts", callback_data=f"archive_sync_acc:{account_id}")])
     for post in posts:
         ts_str = post.get('timestamp', '')
         dt_str = "Unknown time"
@@ -408,32 +588,49 @@ def archive_import_list_kb(posts: List[dict]) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 # --- (НОВЫЕ КЛАВИАТУРЫ ДЛЯ ЧЕРНОВИКОВ) ---
-def drafts_menu_kb(drafts: List[Draft]) -> InlineKeyboardMarkup:
-    """Отображает список черновиков и кнопку 'Создать'."""
+def drafts_menu_kb(drafts: list, has_prev: bool = False, has_next: bool = False) -> InlineKeyboardMarkup:
+    """
+    Отображает страницу черновиков и кнопку 'Создать'.
+    drafts — строки с id, text (можно укороченный) и media_count;
+    листание — курсором по id: drafts_page:prev:{первый id} / drafts_page:next:{последний id}.
+    """
     rows = []
     for draft in drafts:
         # Отображаем начало текста и количество медиа
         short_text = (draft.text or "No text")[:40].replace("\n", " ")
         if len(draft.text or "") > 40: short_text += "..."
-        # (ИСПРАВЛЕНИЕ) Проверяем, существует ли атрибут media перед подсчетом
-        media_count = len(draft.media) if hasattr(draft, 'media') and draft.media is not None else 0
+        media_count = getattr(draft, "media_count", 0) or 0
         media_icon = f"🖼️{media_count}" if media_count > 0 else ""
         label = f"📄{draft.id}: {media_icon} \"{short_text}\""
         rows.append([InlineKeyboardButton(text=label, callback_data=f"draft_view:{draft.id}")])
 
+    nav = []
+    if has_prev and drafts:
+        nav.append(InlineKeyboardButton(text="⬅️ Newer", callback_data=f"drafts_page:prev:{drafts[0].id}"))
+    if has_next and drafts:
+        nav.append(InlineKeyboardButton(text="Older ➡️", callback_data=f"drafts_page:next:{drafts[-1].id}"))
+    if nav:
+        rows.append(nav)
+
     rows.append([InlineKeyboardButton(text="➕ Create New Draft", callback_data="draft_create")])
     rows.append([InlineKeyboardButton(text="⬅️ Back to Main Menu", callback_data="back_main")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
-def draft_view_kb(draft_id: int) -> InlineKeyboardMarkup:
+def draft_view_kb(draft_id: int, has_hashtags: bool = False) -> InlineKeyboardMarkup:
     """Кнопки действий для просмотра/редактирования черновика."""
+    # Если теги уже предложены — «Regenerate» запрашивает новые в обход кеша
+    hashtags_btn = (
+        InlineKeyboardButton(text="🔄 Regenerate Hashtags", callback_data=f"draft_regen_hashtags:{draft_id}")
+        if has_hashtags else
+        InlineKeyboardButton(text="✨ Suggest Hashtags", callback_data=f"draft_suggest_hashtags:{draft_id}")
+    )
     rows = [
         [
             InlineKeyboardButton(text="✏️ Edit Text", callback_data=f"draft_edit_text:{draft_id}"),
             InlineKeyboardButton(text="🖼️ Manage Media", callback_data=f"draft_manage_media:{draft_id}"),
         ],
         [
-            InlineKeyboardButton(text="✨ Suggest Hashtags", callback_data=f"draft_suggest_hashtags:{draft_id}"),
+            hashtags_btn,
             InlineKeyboardButton(text="📋 Copy for Threads", callback_data=f"draft_copy:{draft_id}"),
         ],
         [
@@ -470,7 +667,42 @@ def draft_delete_confirm_kb(draft_id: int) -> InlineKeyboardMarkup:
 
 # --- Конец клавиатур для черновиков ---
 
+# =========================
+#         SEARCH
+# =========================
+
+def search_results_kb(hits: list, page: int, has_next: bool) -> InlineKeyboardMarkup:
+    """Результаты поиска: кнопка на каждый найденный пост / черновик / задачу + пагинация."""
+    rows = []
+    for hit in hits:
+        snippet = " ".join((hit.snippet or "").split())[:40] or "(No text)"
+        if hit.kind in (SEARCH_KIND_POST, SEARCH_KIND_COLD_POST):
+            when = hit.when.strftime('%d %b %Y') if hit.when else "?"
+            # Холодный архив адресуется отрицательным id
+            post_id = hit.item_id if hit.kind == SEARCH_KIND_POST else -hit.item_id
+            label, cb = f"🗂 {when}: {snippet}", f"archive_post:{post_id}"
+        elif hit.kind == SEARCH_KIND_DRAFT:
+            label, cb = f"📄 Draft: {snippet}", f"draft_view:{hit.item_id}"
+        else:
+            label, cb = f"⏱ {hit.time_str or '?'}: {snippet}", f"sched_job_view:{hit.item_id}"
+        rows.append([InlineKeyboardButton(text=label, callback_data=cb)])
+
+    nav = []
+    if page > 0:
+        nav.append(InlineKeyboardButton(text="⬅️ Prev", callback_data=f"search_page:{page - 1}"))
+    if has_next:
+        nav.append(InlineKeyboardButton(text="Next ➡️", callback_data=f"search_page:{page + 1}"))
+    if nav:
+        rows.append(nav)
+
+    rows.append([
+        InlineKeyboardButton(text="🔍 New search", callback_data="search_start"),
+        InlineKeyboardButton(text="⬅️ Main menu", callback_data="back_main"),
+    ])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
 # Общая кнопка для возврата
+@memo_keyboard(maxsize=256)
 def back_button(callback_data: str) -> InlineKeyboardMarkup:
     """Простая клавиатура с одной кнопкой 'Назад'."""
     return InlineKeyboardMarkup(inline_keyboard=[
@@ -1,31 +1,139 @@
 # app/middleware/throttling.py
 # ------------------------------------------------------------
 # Middleware для защиты от флуда (слишком частых запросов).
-# Если пользователь отправляет запросы чаще, чем раз в N секунд,
-# бот будет игнорировать их, предотвращая перегрузку.
+# Token bucket на пользователя:
+# • ведро на THROTTLE_BUCKET_CAPACITY токенов, пополняется со скоростью
+#   THROTTLE_REFILL_PER_MINUTE токенов в минуту;
+# • каждое событие «стоит» токены: навигация — 1, тяжёлые действия
+#   (публикация, статистика, ИИ, импорт CSV) — больше;
+# • не хватает токенов — событие отклоняется, пользователь получает подсказку
+#   (колбек — всплывашкой, сообщение — один раз за серию отказов);
+# • состояние хранится в TTLCache (память ограничена), счётчики отказов — в throttle_stats()
+#   (main.py периодически пишет их в лог через log_throttle_stats).
+# Регистрируется в main.py как outer-middleware для message и callback_query.
 # ------------------------------------------------------------
 
-from typing import Callable, Dict, Any, Awaitable
+import logging
+import math
+import time
+from collections import Counter
+from typing import Callable, Dict, Any, Awaitable, List
 
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery, User
 from cachetools import TTLCache
 
-# Кеш для хранения времени последнего сообщения от пользователя.
-# `ttl` — время жизни записи в секундах.
-# В данном случае, мы не будем отвечать пользователю чаще, чем раз в 0.7 секунды.
-THROTTLE_TIME = 0.7
-user_cache = TTLCache(maxsize=10_000, ttl=THROTTLE_TIME)
+from app.config import settings
+
+log = logging.getLogger(__name__)
+
+DEFAULT_COST = 1
+
+# Стоимость колбеков по префиксу callback_data (до первого ':')
+CALLBACK_COSTS: Dict[str, int] = {
+    "post_publish": 5,
+    "archive_get_stats": 3,
+    "archive_generate_reply": 4,
+    "archive_draft_page": 6,
+    "archive_sync_acc": 5,
+    "archive_import_select": 3,
+    "draft_suggest_hashtags": 4,
+    "draft_regen_hashtags": 4,
+    "search_page": 2,
+}
+
+# Стоимость команд
+COMMAND_COSTS: Dict[str, int] = {
+    "import_schedule": 3,
+    "export_schedule": 4,
+    "search": 2,
+}
+
+# Любой документ — это импорт CSV (других загрузок файлов у бота нет)
+DOCUMENT_COST = 8
+
+
+def event_route(event: Message | CallbackQuery) -> str:
+    """Ключ маршрута для стоимости и метрик: префикс колбека, /команда, document или text."""
+    if isinstance(event, CallbackQuery):
+        return (event.data or "").split(":", 1)[0] or "callback"
+    if event.document is not None:
+        return "document"
+    text = event.text or ""
+    if text.startswith("/"):
+        parts = text[1:].split(maxsplit=1)
+        return "/" + (parts[0].split("@", 1)[0] if parts else "")
+    return "message"
+
+
+def route_cost(route: str) -> int:
+    if route == "document":
+        return DOCUMENT_COST
+    if route.startswith("/"):
+        return COMMAND_COSTS.get(route[1:], DEFAULT_COST)
+    return CALLBACK_COSTS.get(route, DEFAULT_COST)
+
+
+class TokenBucketLimiter:
+    """Ведро токенов на ключ (tg_user_id). Без await внутри — гонок в asyncio нет."""
+
+    def __init__(self, capacity: int, refill_per_minute: int, maxsize: int = 10_000) -> None:
+        self.capacity = float(max(1, capacity))
+        self.rate = max(1, refill_per_minute) / 60.0  # токенов в секунду
+        # Запись можно забыть, когда ведро гарантированно снова полное
+        idle_ttl = max(60.0, self.capacity / self.rate)
+        self._buckets: TTLCache = TTLCache(maxsize=maxsize, ttl=idle_ttl)
+
+    def _state(self, key: int, now: float) -> List[float]:
+        # [токены, время последнего пополнения, уже предупреждали (0/1)]
+        state = self._buckets.get(key)
+        if state is None:
+            return [self.capacity, now, 0.0]
+        state[0] = min(self.capacity, state[0] + (now - state[1]) * self.rate)
+        state[1] = now
+        return state
+
+    def try_acquire(self, key: int, cost: int) -> float:
+        """0.0 — пропускаем; иначе — сколько секунд ждать до нужного количества токенов."""
+        now = time.monotonic()
+        state = self._state(key, now)
+        cost_f = min(float(cost), self.capacity)
+        if state[0] >= cost_f:
+            state[0] -= cost_f
+            state[2] = 0.0
+            self._buckets[key] = state
+            return 0.0
+        self._buckets[key] = state
+        return (cost_f - state[0]) / self.rate
+
+    def mark_warned(self, key: int) -> bool:
+        """True, если в этой серии отказов пользователя ещё не предупреждали."""
+        state = self._buckets.get(key)
+        if state is None or state[2]:
+            return False
+        state[2] = 1.0
+        return True
+
+    def __len__(self) -> int:
+        return len(self._buckets)
 
 
 class ThrottlingMiddleware(BaseMiddleware):
+    def __init__(self, capacity: int | None = None, refill_per_minute: int | None = None) -> None:
+        self.limiter = TokenBucketLimiter(
+            capacity if capacity is not None else settings.THROTTLE_BUCKET_CAPACITY,
+            refill_per_minute if refill_per_minute is not None else settings.THROTTLE_REFILL_PER_MINUTE,
+        )
+        self.allowed = 0
+        self.rejected: Counter = Counter()  # маршрут -> кол-во отклонённых событий
+
     async def __call__(
         self,
         handler: Callable[[Message | CallbackQuery, Dict[str, Any]], Awaitable[Any]],
         event: Message | CallbackQuery,
         data: Dict[str, Any]
     ) -> Any:
-        
+
         # (ИЗМЕНЕНО) Получаем объект пользователя из данных события.
         # Это более надежный способ, чем event.from_user, так как он работает
         # для разных типов обновлений (сообщения, колбеки и т.д.).
@@ -35,16 +143,48 @@ class ThrottlingMiddleware(BaseMiddleware):
         if not user:
             return await handler(event, data)
 
-        user_id = user.id
+        route = event_route(event)
+        wait = self.limiter.try_acquire(user.id, route_cost(route))
+        if not wait:
+            self.allowed += 1
+            # Передаем управление дальше, к хэндлерам
+            return await handler(event, data)
+
+        self.rejected[route] += 1
+        log.debug("throttling: rejected %s from user=%s (wait %.1fs)", route, user.id, wait)
+        hint = f"⏳ Too many requests. Please wait {math.ceil(wait)}s."
+        try:
+            if isinstance(event, CallbackQuery):
+                # Колбек обязательно «отвечаем», иначе у пользователя висят часики
+                await event.answer(hint)
+            elif self.limiter.mark_warned(user.id):
+                await event.answer(hint)
+        except Exception as e:
+            log.debug("throttling: failed to send hint to user=%s: %s", user.id, e)
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "allowed": self.allowed,
+            "rejected": sum(self.rejected.values()),
+            "rejected_by_route": dict(self.rejected),
+            "tracked_users": len(self.limiter),
+        }
+
+
+throttling_middleware = ThrottlingMiddleware()
+
+
+def throttle_stats() -> Dict[str, Any]:
+    return throttling_middleware.stats()
 
-        # Проверяем, есть ли пользователь в кеше
-        if user_id in user_cache:
-            # Если есть, значит, он отправляет запросы слишком часто, игнорируем
-            return
-        
-        # Если пользователя нет в кеше, добавляем его
-        user_cache[user_id] = None
-        
-        # Передаем управление дальше, к хэндлерам
-        return await handler(event, data)
 
+def log_throttle_stats() -> None:
+    """Одна строка в лог: пропущено / отклонено (по маршрутам) / пользователей в памяти."""
+    stats = throttle_stats()
+    if not stats["allowed"] and not stats["rejected"]:
+        return
+    by_route = ", ".join(f"{route}={n}" for route, n in sorted(stats["rejected_by_route"].items()))
+    log.info("throttling: allowed=%s rejected=%s tracked_users=%s%s",
+             stats["allowed"], stats["rejected"], stats["tracked_users"],
+             f" ({by_route})" if by_route else "")
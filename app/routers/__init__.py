@@ -17,6 +17,7 @@ from .timezone import router as timezone_router # Для настроек TZ
 from .help import router as help_router
 from .archive import router as archive_router # <-- Добавили в прошлый раз
 from .drafts import router as drafts_router # <-- НОВЫЙ ИМПОРТ
+from .search import router as search_router
 
 # Создаем главный роутер
 router = Router(name="main-router")
@@ -32,4 +33,5 @@ router.include_router(timezone_router)
 router.include_router(help_router)
 router.include_router(archive_router)
 router.include_router(drafts_router) # <-- ПОДКЛЮЧАЕМ НОВЫЙ РОУТЕР
+router.include_router(search_router)
 
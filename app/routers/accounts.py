@@ -18,6 +18,7 @@ from app.database.models import async_session, Account
 from app.services.safe_edit import safe_edit
 from app.services.threads_client import get_profile as get_threads_profile, ThreadsError
 from app.services.token_health import check_and_cache_token_health
+from app.services.row_cache import invalidate_account, invalidate_user_accounts
 from app.keyboards import accounts_menu_kb, account_actions_kb, account_delete_confirm_kb
 
 log = logging.getLogger(__name__)
@@ -141,6 +142,7 @@ async def _process_and_save_token(message: Message, state: FSMContext, token: st
             )
             session.add(new_acc)
             await session.commit()
+            invalidate_account(new_acc.id)  # мог остаться закешированный «нет такого id»
             
             await check_and_cache_token_health(new_acc.id, notify_on_error=False)
 
@@ -149,6 +151,7 @@ async def _process_and_save_token(message: Message, state: FSMContext, token: st
             if len(user_accounts) == 1:
                 user_accounts[0].is_default = True
                 await session.commit()
+                invalidate_account(user_accounts[0].id)
 
         await wait_msg.edit_text(f"✅ Token is valid and saved!\nAccount: <b>{username}</b>")
 
@@ -231,6 +234,7 @@ async def acc_delete_do(cb: CallbackQuery):
             remaining_accounts[0].is_default = True
         
         await session.commit()
+    invalidate_user_accounts(user_id)
 
     await cb.answer("Account deleted.")
     await acc_list_menu(cb)
@@ -266,6 +270,7 @@ async def acc_rename_finish(message: Message, state: FSMContext):
             .values(title=new_name)
         )
         await session.commit()
+    invalidate_account(acc_id)
     
     await state.clear()
     await message.answer("✅ Account renamed.")
@@ -305,6 +310,7 @@ async def acc_set_default(cb: CallbackQuery):
             .values(is_default=True)
         )
         await session.commit()
+    invalidate_user_accounts(user_id)
 
     await cb.answer("Set as default account.")
     
@@ -5,30 +5,38 @@
 
 import logging
 from html import escape
-from datetime import datetime
+from datetime import datetime, timedelta
 from collections import defaultdict
-from dateutil import parser
 from typing import Iterable, List, Dict, Optional
 from aiogram import Router, F, types
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select, func, and_
+from sqlalchemy import select, func, union_all, tuple_
 
-from app.database.models import async_session, PublishedPost, Account
-from app.services.safe_edit import safe_edit
+from app.database.models import async_session, PublishedPost, PublishedPostCold, Account
+from app.services.safe_edit import safe_edit, ProgressiveEditor
 from app.keyboards import (
-    archive_dates_kb, archive_posts_kb, archive_post_detail_kb,
+    archive_years_kb, archive_months_kb, archive_dates_kb, archive_posts_kb, archive_post_detail_kb,
     archive_comments_kb, archive_comment_reply_kb, archive_confirm_reply_kb,
-    archive_import_account_kb, archive_import_list_kb
+    archive_import_account_kb, archive_import_list_kb, back_button
 )
 
 from app.services.threads_client import (
-    get_post_metrics, get_post_comments, post_reply, get_user_media,
+    post_reply, get_user_media,
     ThreadsError, ThreadsAPIError
 )
+from app.services.comments_cache import (
+    get_comments_page, prefetch_next_page, find_comment, invalidate_post, next_cursor,
+    remember_reply_drafts, get_reply_draft, drafted_comment_ids, forget_reply_draft,
+)
+from app.services.metrics import get_metrics
+from app.services.metrics_collector import latest_snapshot, record_snapshot, is_snapshot_fresh
+from app.services.archive_sync import sync_account_archive, post_row, upsert_posts
+from app.services.archive_retention import get_archived_post
+from app.services.row_cache import get_account
 # --- (ИЗМЕНЕНИЕ) Импортируем новую функцию ---
-from app.services.ai_assistant import generate_reply_with_gemini
+from app.services.ai_assistant import stream_reply_with_gemini, generate_replies_batch
 # ---
 
 import httpx # httpx и json больше не нужны здесь напрямую
@@ -48,82 +56,210 @@ class ArchiveFSM(StatesGroup):
 
 COMMENTS_PER_PAGE = 5
 
+
+def _format_snapshot_stats(snap) -> str:
+    """Stats block from a PostMetricsSnapshot (None values shown as N/A)."""
+    likes = snap.likes if snap.likes is not None else "N/A"
+    replies = snap.replies if snap.replies is not None else "N/A"
+    return (
+        f"\n\n📊 **Statistics:**\n"
+        f"  ❤️ Likes: `{likes}`\n" # Use code block for numbers
+        f"  💬 Replies: `{replies}`\n"
+        f"  🕒 _as of {snap.taken_at.strftime('%d %b %H:%M')} UTC_"
+    )
+
 # --- (ИЗМЕНЕНИЕ) Функция generate_reply_with_gemini удалена отсюда ---
 
 # =========================
 #      ARCHIVE LOGIC
 # =========================
 # ... (весь остальной код файла без изменений) ...
+ARCHIVE_DATES_PER_PAGE = 10
+ARCHIVE_POSTS_PER_PAGE = 10
+
+
+def _archive_union(user_id: int, start: Optional[datetime] = None, end: Optional[datetime] = None):
+    """
+    Hot + cold archive as one subquery with only the columns the list buttons need.
+    Cold posts get negative ids (same convention as archive_post:-<id>).
+    """
+    def part(model, post_id, snippet):
+        stmt = select(
+            post_id.label("id"), model.account_id.label("account_id"),
+            model.published_at.label("published_at"), model.has_media.label("has_media"),
+            func.substr(snippet, 1, 31).label("text"),
+        ).where(model.tg_user_id == user_id)
+        if start is not None:
+            stmt = stmt.where(model.published_at >= start, model.published_at < end)
+        return stmt
+
+    return union_all(
+        part(PublishedPost, PublishedPost.id, PublishedPost.text),
+        part(PublishedPostCold, -PublishedPostCold.id, PublishedPostCold.preview),
+    ).subquery()
+
+
+def _month_bounds(month: str) -> tuple[datetime, datetime]:
+    """'2025-10' -> [2025-10-01, 2025-11-01)."""
+    start = datetime.strptime(month, "%Y-%m")
+    return start, (start.replace(year=start.year + 1, month=1) if start.month == 12 else start.replace(month=start.month + 1))
+
+
 @router.callback_query(F.data.startswith("archive_list:"))
 async def archive_list_dates(cb: CallbackQuery, state: FSMContext):
-    """Displays publication dates."""
+    """Archive entry point: years with post counts (drill-down: year -> month -> date -> posts)."""
     await state.clear()
-    user_id = cb.from_user.id
+    posts = _archive_union(cb.from_user.id)
+    year = func.strftime("%Y", posts.c.published_at)
     async with async_session() as session:
-        result = await session.execute(
-            select(
-                func.date(PublishedPost.published_at),
-                func.count(PublishedPost.id)
-            )
-            .where(PublishedPost.tg_user_id == user_id)
-            .group_by(func.date(PublishedPost.published_at))
-            .order_by(func.date(PublishedPost.published_at).desc())
-        )
-        dates_with_counts = result.all()
+        years_with_counts = (await session.execute(
+            select(year, func.count()).group_by(year).order_by(year.desc())
+        )).all()
 
-    if not dates_with_counts:
+    if not years_with_counts:
         await safe_edit(
             cb.message,
             "<b>🗄️ Archive is empty</b>\n\nYou haven't published any posts via the bot yet.",
-            reply_markup=archive_dates_kb([])
+            reply_markup=archive_years_kb([])
         )
         await cb.answer(); return
 
     await safe_edit(
         cb.message,
-        "🗄️ **Published Posts Archive**\n\nSelect a date to view posts or import a new one:",
-        reply_markup=archive_dates_kb(dates_with_counts)
+        "🗄️ **Published Posts Archive**\n\nSelect a year to browse posts or import a new one:",
+        reply_markup=archive_years_kb(years_with_counts)
+    )
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("archive_year:"))
+async def archive_list_months(cb: CallbackQuery, state: FSMContext):
+    """Months of the selected year with post counts."""
+    await state.clear()
+    try:
+        year_str = cb.data.split(":", 1)[1]
+        start = datetime.strptime(year_str, "%Y")
+    except ValueError:
+        await cb.answer("Invalid year.", show_alert=True); return
+
+    posts = _archive_union(cb.from_user.id, start, start.replace(year=start.year + 1))
+    month = func.strftime("%Y-%m", posts.c.published_at)
+    async with async_session() as session:
+        months_with_counts = (await session.execute(
+            select(month, func.count()).group_by(month).order_by(month.desc())
+        )).all()
+
+    if not months_with_counts:
+        await cb.answer("No posts found for this year.", show_alert=True); return
+    await safe_edit(
+        cb.message,
+        f"🗄️ **Archive {year_str}**\n\nSelect a month:",
+        reply_markup=archive_months_kb(year_str, months_with_counts)
+    )
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("archive_month:"))
+async def archive_list_month_dates(cb: CallbackQuery, state: FSMContext):
+    """
+    Dates of the selected month (newest first), keyset-paginated by date:
+    archive_month:{YYYY-MM}[:{next|prev}:{YYYY-MM-DD}].
+    """
+    await state.clear()
+    parts = cb.data.split(":")
+    try:
+        month_str = parts[1]
+        start, end = _month_bounds(month_str)
+        direction, cursor = (parts[2], parts[3]) if len(parts) == 4 else ("next", None)
+    except (ValueError, IndexError):
+        await cb.answer("Invalid month.", show_alert=True); return
+
+    posts = _archive_union(cb.from_user.id, start, end)
+    day = func.date(posts.c.published_at)
+    stmt = select(day, func.count()).group_by(day)
+    backwards = cursor is not None and direction == "prev"
+    if backwards:
+        stmt = stmt.having(day > cursor).order_by(day)
+    else:
+        if cursor is not None:
+            stmt = stmt.having(day < cursor)
+        stmt = stmt.order_by(day.desc())
+    async with async_session() as session:
+        dates_with_counts = (await session.execute(stmt.limit(ARCHIVE_DATES_PER_PAGE + 1))).all()
+
+    more = len(dates_with_counts) > ARCHIVE_DATES_PER_PAGE
+    dates_with_counts = dates_with_counts[:ARCHIVE_DATES_PER_PAGE]
+    if backwards:
+        dates_with_counts.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = cursor is not None, more
+
+    if not dates_with_counts:
+        await cb.answer("No posts found for this month.", show_alert=True); return
+    await safe_edit(
+        cb.message,
+        f"🗄️ **Archive {start.strftime('%B %Y')}**\n\nSelect a date to view posts:",
+        reply_markup=archive_dates_kb(dates_with_counts, month_str, has_prev=has_prev, has_next=has_next)
     )
     await cb.answer()
 
 
 @router.callback_query(F.data.startswith("archive_date:"))
 async def archive_list_posts_by_date(cb: CallbackQuery, state: FSMContext):
-    """Shows posts for the selected date."""
+    """
+    Shows posts for the selected date (newest first), keyset-paginated by (published_at, id):
+    archive_date:{YYYY-MM-DD}[:{next|prev}:{HHMMSSffffff}:{id}].
+    """
     await state.clear()
-    date_str = cb.data.split(":", 1)[1]
-    user_id = cb.from_user.id
+    parts = cb.data.split(":")
+    try:
+        date_str = parts[1]
+        day_start = datetime.strptime(date_str, "%Y-%m-%d")
+        cursor = None
+        direction = "next"
+        if len(parts) == 5:
+            direction = parts[2]
+            cursor = (datetime.strptime(date_str + parts[3], "%Y-%m-%d%H%M%S%f"), int(parts[4]))
+    except (ValueError, IndexError):
+        await cb.answer("Invalid date.", show_alert=True); return
+
+    posts = _archive_union(cb.from_user.id, day_start, day_start + timedelta(days=1))
+    stmt = (
+        select(posts.c.id, posts.c.published_at, posts.c.has_media, posts.c.text, Account.title.label("account_title"),
+               posts.c.account_id)
+        .outerjoin(Account, Account.id == posts.c.account_id)
+    )
+    backwards = cursor is not None and direction == "prev"
+    key = tuple_(posts.c.published_at, posts.c.id)
+    if backwards:
+        stmt = stmt.where(key > tuple_(*cursor)).order_by(posts.c.published_at, posts.c.id)
+    else:
+        if cursor is not None:
+            stmt = stmt.where(key < tuple_(*cursor))
+        stmt = stmt.order_by(posts.c.published_at.desc(), posts.c.id.desc())
     async with async_session() as session:
-        posts = (await session.execute(
-            select(PublishedPost)
-            .where(
-                PublishedPost.tg_user_id == user_id,
-                func.date(PublishedPost.published_at) == date_str
-            )
-            .order_by(PublishedPost.published_at.desc())
-        )).scalars().all()
+        page = (await session.execute(stmt.limit(ARCHIVE_POSTS_PER_PAGE + 1))).all()
+
+    more = len(page) > ARCHIVE_POSTS_PER_PAGE
+    page = page[:ARCHIVE_POSTS_PER_PAGE]
+    if backwards:
+        page.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = cursor is not None, more
 
-    if not posts:
+    if not page:
         await cb.answer("No posts found for this date.", show_alert=True)
         return
 
-    acc_ids = {p.account_id for p in posts}
-    accounts_map = {}
-    if acc_ids:
-        accs = (await session.execute(select(Account).where(Account.id.in_(acc_ids)))).scalars().all()
-        accounts_map = {a.id: a.title or f"id={a.id}" for a in accs}
-
     # Format date nicely for the title, e.g., "Posts from Oct 22, 2025"
-    try:
-        date_obj = datetime.strptime(date_str, '%Y-%m-%d').date()
-        formatted_date_title = date_obj.strftime('%b %d, %Y')
-    except ValueError:
-        formatted_date_title = date_str # Fallback
+    formatted_date_title = day_start.strftime('%b %d, %Y')
 
     await safe_edit(
         cb.message,
         f"🗓️ **Posts from {formatted_date_title}**\n\nSelect a post to view details:",
-        reply_markup=archive_posts_kb(posts, accounts_map, date_str)
+        reply_markup=archive_posts_kb(page, date_str, has_prev=has_prev, has_next=has_next)
     )
     await cb.answer()
 
@@ -139,13 +275,16 @@ async def archive_view_post(cb: CallbackQuery, state: FSMContext):
 
     user_id = cb.from_user.id
     async with async_session() as session:
-        post = await session.get(PublishedPost, post_db_id)
+        post = await get_archived_post(session, post_db_id)
         if not post or post.tg_user_id != user_id:
             await cb.answer("Post not found.", show_alert=True); return
 
-        acc = await session.get(Account, post.account_id)
+        acc = await get_account(post.account_id)
         acc_title = acc.title if acc else "Unknown"
 
+    # Last collected snapshot (no Threads call here)
+    snap = await latest_snapshot(post_db_id)
+
     date_str = post.published_at.strftime('%Y-%m-%d')
     time_str = post.published_at.strftime('%H:%M:%S')
     media_status = "✅ Yes" if post.has_media else "❌ No"
@@ -159,6 +298,8 @@ async def archive_view_post(cb: CallbackQuery, state: FSMContext):
         f"🆔 **Threads ID:** `{escape(post.threads_post_id)}`\n\n"
         f"📝 **Text:**\n{escape(post.text or '(No text)')}"
     )
+    if snap:
+        text += _format_snapshot_stats(snap)
 
     await safe_edit(cb.message, text, reply_markup=archive_post_detail_kb(date_str, post_db_id))
     await cb.answer()
@@ -174,29 +315,31 @@ async def archive_get_post_stats(cb: CallbackQuery, state: FSMContext):
 
     user_id = cb.from_user.id
     async with async_session() as session:
-        post = await session.get(PublishedPost, post_db_id)
+        post = await get_archived_post(session, post_db_id)
         if not post or post.tg_user_id != user_id:
             await cb.answer("Post not found.", show_alert=True); return
 
-        acc = await session.get(Account, post.account_id)
+        acc = await get_account(post.account_id)
         if not acc or not acc.access_token:
             await cb.answer("Account token not found.", show_alert=True); return
 
         acc_title = acc.title if acc else "Unknown"
+        acc_id = acc.id
         access_token = acc.access_token
         threads_post_id = post.threads_post_id
 
-    await cb.answer("📊 Requesting statistics...")
-
     stats_text = ""
+    snap = await latest_snapshot(post_db_id)
     try:
-        metrics = await get_post_metrics(access_token, threads_post_id)
-        # Enhanced formatting
-        stats_text = (
-            f"\n\n📊 **Statistics:**\n"
-            f"  ❤️ Likes: `{metrics.get('likes', 'N/A')}`\n" # Use code block for numbers
-            f"  💬 Replies: `{metrics.get('replies', 'N/A')}`"
-        )
+        if is_snapshot_fresh(snap, post.published_at):
+            # Collected recently by the background collector — no API call
+            await cb.answer()
+        else:
+            await cb.answer("📊 Requesting statistics...")
+            # Short-TTL cache + remembered unsupported fields (see app/services/metrics.py)
+            metrics = await get_metrics(acc_id, access_token, threads_post_id)
+            snap = await record_snapshot(post_db_id, metrics)
+        stats_text = _format_snapshot_stats(snap)
     except ThreadsAPIError as e:
         stats_text = f"\n\n📊 **Statistics:**\n  ⚠️ _{escape(str(e))}_"
         log.warning("Failed to get stats for post %s (db_id %s): %s", threads_post_id, post_db_id, e)
@@ -283,10 +426,10 @@ async def _show_comments_page(cb: CallbackQuery, state: FSMContext, post_db_id:
     """Helper function to fetch and display a specific page of comments."""
     user_id = cb.from_user.id
     async with async_session() as session:
-        post = await session.get(PublishedPost, post_db_id)
+        post = await get_archived_post(session, post_db_id)
         if not post or post.tg_user_id != user_id:
             await cb.answer("Post not found.", show_alert=True); return
-        acc = await session.get(Account, post.account_id)
+        acc = await get_account(post.account_id)
         if not acc or not acc.access_token:
             await cb.answer("Account token not found.", show_alert=True); return
         access_token = acc.access_token
@@ -300,25 +443,25 @@ async def _show_comments_page(cb: CallbackQuery, state: FSMContext, post_db_id:
 
     await cb.answer(f"Loading page {page_to_show}...")
     try:
-        # Fetch comments using the correct cursor for this page
-        comments_data = await get_post_comments(
+        # Cached per (post, cursor); usually already prefetched while the previous page was read
+        comments_data = await get_comments_page(
             access_token, threads_post_id, limit=COMMENTS_PER_PAGE, after=cursor_for_this_page_request
         )
         comments = comments_data.get("data", [])
-        paging_info = comments_data.get("paging", {})
-        next_cursor = paging_info.get("cursors", {}).get("after")
+        next_page_cursor = next_cursor(comments_data)
 
         # Store the cursor needed to fetch the *next* page
-        if next_cursor:
-            pagination_cursors[page_to_show + 1] = next_cursor
-        # Remove cursor for pages beyond the next one if 'next_cursor' is None (reached the end)
+        if next_page_cursor:
+            pagination_cursors[page_to_show + 1] = next_page_cursor
+        # Remove cursor for pages beyond the next one if 'next_page_cursor' is None (reached the end)
         elif page_to_show + 1 in pagination_cursors:
              del pagination_cursors[page_to_show + 1]
 
 
-        has_next_page = bool(next_cursor)
+        has_next_page = bool(next_page_cursor)
         has_prev_page = page_to_show > 1
 
+        # Comments themselves live in the comments cache, FSM keeps only cursors
         await state.set_state(ArchiveFSM.viewing_comments)
         await state.update_data(
             post_db_id=post_db_id,
@@ -326,7 +469,6 @@ async def _show_comments_page(cb: CallbackQuery, state: FSMContext, post_db_id:
             date_str=date_str,
             current_page=page_to_show,
             pagination_cursors=pagination_cursors,
-            current_comments_cache=comments
         )
 
         text = f"🗣️ **Comments for post:**\n`{escape(post.text[:50])}...`\n\n(Page {page_to_show})"
@@ -339,9 +481,12 @@ async def _show_comments_page(cb: CallbackQuery, state: FSMContext, post_db_id:
             reply_markup=archive_comments_kb(
                 comments, post_db_id, date_str, page_to_show, COMMENTS_PER_PAGE,
                 has_next_page=has_next_page,
-                has_prev_page=has_prev_page
+                has_prev_page=has_prev_page,
+                drafted_ids=frozenset(drafted_comment_ids(threads_post_id)),
             )
         )
+        # Warm up the next page while the user reads this one
+        prefetch_next_page(access_token, threads_post_id, limit=COMMENTS_PER_PAGE, page=comments_data)
 
     except ThreadsAPIError as e:
         await safe_edit(cb.message, f"⚠️ Failed to load comments: {escape(str(e))}",
@@ -365,30 +510,39 @@ async def archive_select_comment(cb: CallbackQuery, state: FSMContext):
         await cb.answer("Invalid comment data.", show_alert=True); return
 
     fsm_data = await state.get_data()
-    comments_cache = fsm_data.get("current_comments_cache", [])
+    threads_post_id = fsm_data.get("threads_post_id")
 
     original_comment_text = "N/A"
     original_comment_user = "Unknown"
 
-    comment = next((c for c in comments_cache if c.get("id") == comment_id), None)
+    comment = find_comment(threads_post_id, comment_id) if threads_post_id else None
+    if comment is None and threads_post_id:
+        # Cache entry expired — reload the page the user is looking at
+        access_token = await _get_token_for_post(state, cb.from_user.id, post_db_id)
+        cursor = fsm_data.get("pagination_cursors", {}).get(fsm_data.get("current_page", 1))
+        if access_token:
+            try:
+                page = await get_comments_page(access_token, threads_post_id, limit=COMMENTS_PER_PAGE, after=cursor)
+                comment = next((c for c in page.get("data", []) if c.get("id") == comment_id), None)
+            except ThreadsError as e:
+                log.warning("Failed to reload comments page for post %s: %s", threads_post_id, e)
 
     if comment:
         original_comment_text = comment.get("text", "")
         original_comment_user = comment.get("username", "Unknown")
     else:
-        log.warning("Comment ID %s not found in FSM cache. State: %s", comment_id, fsm_data)
+        log.warning("Comment ID %s not found in comments cache. State: %s", comment_id, fsm_data)
         await cb.answer("Could not find comment details in session. Please go back and try again.", show_alert=True)
         return
 
     user_id = cb.from_user.id
     acc_title = "My Account" # Fallback
     async with async_session() as session:
-        post = await session.get(PublishedPost, post_db_id)
+        post = await get_archived_post(session, post_db_id)
         if post and post.tg_user_id == user_id:
-             acc = await session.get(Account, post.account_id)
+             acc = await get_account(post.account_id)
              if acc: acc_title = acc.title or f"id={acc.id}"
 
-    await state.set_state(ArchiveFSM.replying_to_comment)
     await state.update_data(
         reply_to_comment_id=comment_id,
         original_comment_text=original_comment_text,
@@ -396,6 +550,24 @@ async def archive_select_comment(cb: CallbackQuery, state: FSMContext):
         account_title=acc_title
     )
 
+    # Reply already drafted for the whole page — go straight to review
+    page_draft = get_reply_draft(threads_post_id, comment_id) if threads_post_id else None
+    if page_draft:
+        await state.set_state(ArchiveFSM.confirming_ai_reply)
+        await state.update_data(ai_reply_draft=page_draft)
+        text = (
+            f"💬 **Replying to:**\n"
+            f"  👤 `{escape(original_comment_user)}`\n"
+            f"  📝 _{escape(original_comment_text)}_\n\n"
+            f"🤖 **AI Draft Reply:**\n{escape(page_draft)}\n\n"
+            f"Publish this reply?"
+        )
+        await safe_edit(cb.message, text, reply_markup=archive_confirm_reply_kb(post_db_id, comment_id))
+        await cb.answer()
+        return
+
+    await state.set_state(ArchiveFSM.replying_to_comment)
+
     text = (
         f"💬 **Replying to:**\n"
         f"  👤 `{escape(original_comment_user)}`\n"
@@ -406,6 +578,74 @@ async def archive_select_comment(cb: CallbackQuery, state: FSMContext):
     await cb.answer()
 
 
+@router.callback_query(ArchiveFSM.viewing_comments, F.data.startswith("archive_draft_page:"))
+async def archive_draft_page(cb: CallbackQuery, state: FSMContext):
+    """Drafts AI replies for every comment on the current page with a single model call."""
+    try:
+        post_db_id = int(cb.data.split(":", 1)[1])
+    except (ValueError, IndexError):
+        await cb.answer("Invalid post ID.", show_alert=True); return
+
+    fsm_data = await state.get_data()
+    threads_post_id = fsm_data.get("threads_post_id")
+    current_page = fsm_data.get("current_page", 1)
+    pagination_cursors = fsm_data.get("pagination_cursors", {1: None})
+
+    user_id = cb.from_user.id
+    async with async_session() as session:
+        post = await get_archived_post(session, post_db_id)
+    acc = await get_account(post.account_id) if post and post.tg_user_id == user_id else None
+    if not acc or not acc.access_token or not threads_post_id:
+        await cb.answer("Account token not found.", show_alert=True); return
+
+    try:
+        page = await get_comments_page(
+            acc.access_token, threads_post_id, limit=COMMENTS_PER_PAGE, after=pagination_cursors.get(current_page)
+        )
+    except ThreadsError as e:
+        log.warning("Failed to load comments page for batch drafting (post %s): %s", threads_post_id, e)
+        await cb.answer("Failed to load comments, please try again.", show_alert=True); return
+    comments = page.get("data", [])
+
+    pending = [
+        (c.get("id", ""), c.get("username", "unknown"), c.get("text", "") or "")
+        for c in comments if not get_reply_draft(threads_post_id, c.get("id", ""))
+    ]
+    if not any(text.strip() for _, _, text in pending):
+        await cb.answer("All comments on this page already have drafts — tap a 🤖 comment to review.", show_alert=True)
+        return
+
+    await cb.answer("🤖 Drafting replies for this page...")
+    error_text = ""
+    try:
+        drafts = await generate_replies_batch(pending, acc.title or f"id={acc.id}", tg_user_id=user_id)
+        remember_reply_drafts(threads_post_id, drafts)
+    except ValueError as e:
+        log.warning("Batch reply drafting failed for post %s: %s", threads_post_id, e)
+        error_text = f"⚠️ Could not draft replies: {escape(str(e))}\n\n"
+
+    lines = [f"🤖 **Draft replies** (page {current_page})\n", error_text]
+    for c in comments:
+        reply = get_reply_draft(threads_post_id, c.get("id", ""))
+        if reply:
+            lines.append(
+                f"👤 `{escape(c.get('username', 'unknown'))}`: _{escape((c.get('text') or '')[:80])}_\n"
+                f"➡️ {escape(reply)}\n"
+            )
+    lines.append("Tap a 🤖 comment to review, edit and publish its reply.")
+
+    await safe_edit(
+        cb.message,
+        "\n".join(line for line in lines if line),
+        reply_markup=archive_comments_kb(
+            comments, post_db_id, fsm_data.get("date_str", ""), current_page, COMMENTS_PER_PAGE,
+            has_next_page=(current_page + 1) in pagination_cursors,
+            has_prev_page=current_page > 1,
+            drafted_ids=frozenset(drafted_comment_ids(threads_post_id)),
+        ),
+    )
+
+
 @router.callback_query(ArchiveFSM.replying_to_comment, F.data.startswith("archive_generate_reply:"))
 @router.callback_query(ArchiveFSM.confirming_ai_reply, F.data.startswith("archive_generate_reply:"))
 async def archive_generate_reply(cb: CallbackQuery, state: FSMContext):
@@ -421,20 +661,33 @@ async def archive_generate_reply(cb: CallbackQuery, state: FSMContext):
     original_comment_user = fsm_data.get("original_comment_user", "Unknown")
     account_title = fsm_data.get("account_title", "My Account")
 
-    await cb.answer("🤖 Generating AI reply...")
-    ai_draft = await generate_reply_with_gemini(original_comment_text, account_title)
-
-    await state.set_state(ArchiveFSM.confirming_ai_reply)
-    await state.update_data(ai_reply_draft=ai_draft)
+    # В состоянии подтверждения это кнопка «Regenerate» — идём мимо кеша
+    regenerate = await state.get_state() == ArchiveFSM.confirming_ai_reply.state
 
-    text = (
+    header = (
         f"💬 **Replying to:**\n"
         f"  👤 `{escape(original_comment_user)}`\n"
         f"  📝 _{escape(original_comment_text)}_\n\n"
-        f"🤖 **AI Draft Reply:**\n{escape(ai_draft)}\n\n"
-        f"Publish this reply?"
+        f"🤖 **AI Draft Reply:**\n"
     )
-    await safe_edit(cb.message, text, reply_markup=archive_confirm_reply_kb(post_db_id, comment_id))
+
+    await cb.answer("🤖 Generating AI reply...")
+    # Text appears as it is generated; edits are coalesced to respect Telegram limits
+    editor = ProgressiveEditor(cb.message)
+    ai_draft = ""
+    try:
+        async for ai_draft in stream_reply_with_gemini(
+            original_comment_text, account_title, tg_user_id=cb.from_user.id, use_cache=not regenerate
+        ):
+            await editor.update(f"{header}{escape(ai_draft)} ▌")
+    except ValueError as e:
+        ai_draft = f"Sorry, I couldn't generate a reply: {e}"
+
+    await state.set_state(ArchiveFSM.confirming_ai_reply)
+    await state.update_data(ai_reply_draft=ai_draft)
+
+    text = f"{header}{escape(ai_draft)}\n\nPublish this reply?"
+    await editor.finish(text, reply_markup=archive_confirm_reply_kb(post_db_id, comment_id))
 
 
 @router.callback_query(ArchiveFSM.replying_to_comment, F.data.startswith("archive_write_reply:"))
@@ -489,6 +742,8 @@ async def archive_handle_manual_reply(message: Message, state: FSMContext):
              return
 
         await post_reply(access_token=access_token, text=reply_text, reply_to_id=comment_id)
+        invalidate_post(fsm_data.get("threads_post_id", ""))
+        forget_reply_draft(fsm_data.get("threads_post_id", ""), comment_id)
         await safe_edit(wait_msg, "✅ Reply published successfully!")
 
         # Возвращаемся к списку комментариев (на ту же страницу)
@@ -528,6 +783,8 @@ async def archive_publish_ai_reply(cb: CallbackQuery, state: FSMContext):
              return
 
         await post_reply(access_token=access_token, text=ai_draft, reply_to_id=comment_id)
+        invalidate_post(fsm_data.get("threads_post_id", ""))
+        forget_reply_draft(fsm_data.get("threads_post_id", ""), comment_id)
         await safe_edit(cb.message, "✅ AI Reply published successfully!")
 
         # Возвращаемся к списку комментариев (на ту же страницу)
@@ -606,6 +863,8 @@ async def archive_handle_edited_reply(message: Message, state: FSMContext):
              return
 
         await post_reply(access_token=access_token, text=edited_reply_text, reply_to_id=comment_id)
+        invalidate_post(fsm_data.get("threads_post_id", ""))
+        forget_reply_draft(fsm_data.get("threads_post_id", ""), comment_id)
         await safe_edit(wait_msg, "✅ Edited reply published successfully!")
 
         # Возвращаемся к списку комментариев (на ту же страницу)
@@ -647,7 +906,7 @@ async def _get_token_for_post(state: FSMContext, user_id: int, post_db_id: int)
     if 'account_id_for_import' in fsm_data:
          # Need to fetch the token again as it might not be in state
          async with async_session() as session:
-              acc = await session.get(Account, fsm_data['account_id_for_import'])
+              acc = await get_account(fsm_data['account_id_for_import'])
               if acc and acc.tg_user_id == user_id:
                    return acc.access_token
          log.warning("Could not refetch access token for imported post context (user %d, acc %s)", user_id, fsm_data.get('account_id_for_import'))
@@ -656,9 +915,9 @@ async def _get_token_for_post(state: FSMContext, user_id: int, post_db_id: int)
 
     # Otherwise, fetch from DB based on the post's account_id
     async with async_session() as session:
-        post = await session.get(PublishedPost, post_db_id)
+        post = await get_archived_post(session, post_db_id)
         if post and post.tg_user_id == user_id:
-            acc = await session.get(Account, post.account_id)
+            acc = await get_account(post.account_id)
             if acc:
                 return acc.access_token
     log.warning("Could not find access token for user %d and post %d", user_id, post_db_id)
@@ -690,12 +949,11 @@ async def archive_select_import_account(cb: CallbackQuery, state: FSMContext):
     """Handles account selection for import."""
     try: acc_id = int(cb.data.split(":", 1)[1])
     except: await cb.answer("Invalid account.", show_alert=True); return
-    async with async_session() as session:
-        acc = await session.get(Account, acc_id)
-        if not acc or acc.tg_user_id != cb.from_user.id:
-            await cb.answer("Account not found.", show_alert=True); return
-        await state.set_state(ArchiveFSM.importing_post)
-        await state.update_data(account_id_for_import=acc.id, access_token_for_import=acc.access_token)
+    acc = await get_account(acc_id)
+    if not acc or acc.tg_user_id != cb.from_user.id:
+        await cb.answer("Account not found.", show_alert=True); return
+    await state.set_state(ArchiveFSM.importing_post)
+    await state.update_data(account_id_for_import=acc.id, access_token_for_import=acc.access_token)
     await _fetch_and_show_posts(cb, state)
 
 async def _fetch_and_show_posts(cb: CallbackQuery, state: FSMContext):
@@ -709,13 +967,13 @@ async def _fetch_and_show_posts(cb: CallbackQuery, state: FSMContext):
         posts_data = await get_user_media(access_token, limit=10) # Get latest 10 posts
         posts = posts_data.get("data", [])
         if not posts:
-            await safe_edit(cb.message, "No recent posts found on this account.", reply_markup=archive_dates_kb([])); await state.clear(); return
+            await safe_edit(cb.message, "No recent posts found on this account.", reply_markup=archive_years_kb([])); await state.clear(); return
 
         # Store fetched posts in state to use when user selects one
         await state.update_data(fetched_posts=posts)
-        await safe_edit(cb.message, "📥 **Import Post**\n\nSelect a post to add to archive:", reply_markup=archive_import_list_kb(posts))
+        await safe_edit(cb.message, "📥 **Import Post**\n\nSelect a post to add to archive:", reply_markup=archive_import_list_kb(posts, fsm_data.get("account_id_for_import")))
     except Exception as e:
-        log.warning("Failed to get user media: %s", e); await safe_edit(cb.message, f"❌ Failed: {escape(str(e))}", reply_markup=archive_dates_kb([])); await state.clear()
+        log.warning("Failed to get user media: %s", e); await safe_edit(cb.message, f"❌ Failed: {escape(str(e))}", reply_markup=archive_years_kb([])); await state.clear()
 
 @router.callback_query(ArchiveFSM.importing_post, F.data.startswith("archive_import_select:"))
 async def archive_import_select(cb: CallbackQuery, state: FSMContext):
@@ -731,34 +989,37 @@ async def archive_import_select(cb: CallbackQuery, state: FSMContext):
     if not post_to_import:
         await cb.answer("Error: Post details not found in session.", show_alert=True); return
 
-    async with async_session() as session:
-        exists = (await session.execute(select(PublishedPost.id).where(and_(PublishedPost.tg_user_id == user_id, PublishedPost.threads_post_id == threads_post_id)))).scalars().first()
-        if exists:
-            await cb.answer("This post is already in the archive.", show_alert=True); return
-
-        try:
-            published_dt_str = post_to_import.get('timestamp')
-            # Ensure timestamp is timezone-aware (assuming UTC from API) before saving
-            published_dt = parser.parse(published_dt_str).replace(tzinfo=None) if published_dt_str else datetime.utcnow()
-        except Exception:
-            log.warning("Could not parse timestamp %s", post_to_import.get('timestamp')); published_dt = datetime.utcnow()
-
-        media_type = post_to_import.get('media_type');
-        has_media = media_type in ('IMAGE', 'CAROUSEL', 'VIDEO')
-
-        new_post = PublishedPost(
-            tg_user_id=user_id,
-            account_id=account_id,
-            threads_post_id=threads_post_id,
-            text=post_to_import.get('text'),
-            published_at=published_dt,
-            has_media=has_media
-        )
-        session.add(new_post); await session.commit()
-        await cb.answer("✅ Post imported!", show_alert=True)
+    # Upsert по (account_id, threads_post_id): дубликат просто не вставится
+    if not await upsert_posts([post_row(post_to_import, user_id, account_id)]):
+        await cb.answer("This post is already in the archive.", show_alert=True); return
+    await cb.answer("✅ Post imported!", show_alert=True)
 
-        # Go back to the main archive view
-        await state.clear()
-        # Need to call archive_list_dates again to show the updated list
-        await archive_list_dates(cb, state)
+    # Go back to the main archive view
+    await state.clear()
+    # Need to call archive_list_dates again to show the updated list
+    await archive_list_dates(cb, state)
+
+
+@router.callback_query(F.data.startswith("archive_sync_acc:"))
+async def archive_sync_account(cb: CallbackQuery, state: FSMContext):
+    """Imports the account's full post history (only new posts since the last sync)."""
+    try: acc_id = int(cb.data.split(":", 1)[1])
+    except: await cb.answer("Invalid account.", show_alert=True); return
+    acc = await get_account(acc_id)
+    if not acc or acc.tg_user_id != cb.from_user.id:
+        await cb.answer("Account not found.", show_alert=True); return
+    title = acc.title
+
+    await cb.answer("Syncing posts, this may take a while...")
+    await safe_edit(cb.message, f"🔄 Syncing posts of **{escape(title or f'Account {acc_id}')}**...")
+    try:
+        imported = await sync_account_archive(acc_id)
+    except Exception as e:
+        log.warning("Archive sync failed for account %s: %s", acc_id, e)
+        await safe_edit(cb.message, f"❌ Sync failed: {escape(str(e))}", reply_markup=back_button("archive_list:0"))
+        return
+
+    await state.clear()
+    text = f"✅ Sync complete: {imported} new post(s) added to the archive." if imported else "✅ Archive is already up to date."
+    await safe_edit(cb.message, text, reply_markup=back_button("archive_list:0"))
 
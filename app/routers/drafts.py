@@ -26,6 +26,7 @@ from sqlalchemy.orm import selectinload
 from app.database.models import async_session, Draft, DraftMedia
 from app.services.safe_edit import safe_edit
 from app.services.ai_assistant import suggest_hashtags
+from app.services.local_hashtags import suggest_local_hashtags
 from app.keyboards import (
     drafts_menu_kb, draft_view_kb, draft_manage_media_kb,
     draft_copy_kb, draft_delete_confirm_kb, main_menu_kb, back_button
@@ -34,6 +35,19 @@ from app.keyboards import (
 log = logging.getLogger(__name__)
 router = Router()
 
+def _draft_view_text(draft_id: int, text: str, media_count: int, hashtags: str, note: str = "") -> str:
+    """Текст экрана просмотра черновика."""
+    display_text = (
+        f"📄 **Draft #{draft_id}**\n\n"
+        f"📝 **Text:**\n{escape(text)}\n\n"
+        f"🖼️ **Media Attached:** {media_count}/10"
+    )
+    if hashtags:
+        display_text += f"\n\n✨ **Suggested Hashtags:**\n{escape(hashtags)}"
+    if note:
+        display_text += f"\n\n{note}"
+    return display_text
+
 # ---------------------- FSM ---------------------- #
 
 class DraftFSM(StatesGroup):
@@ -46,8 +60,57 @@ class DraftFSM(StatesGroup):
 
 # -------------------- СПИСОК ЧЕРНОВИКОВ ----------------------- #
 
-async def drafts_list_menu(evt: Union[CallbackQuery, Message], state: FSMContext):
-    """Отображает список черновиков."""
+DRAFTS_PAGE_SIZE = 20
+
+
+async def _drafts_page(user_id: int, cursor: Optional[int] = None, direction: str = "next"):
+    """
+    Страница списка черновиков (новые сверху) и клавиатура к ней.
+    Keyset-пагинация по id: next — черновики старше cursor, prev — новее.
+    Грузим DRAFTS_PAGE_SIZE + 1 строк (лишняя — признак следующей страницы),
+    медиа считаем подзапросом, от текста берём только начало.
+    """
+    media_count = (
+        select(func.count(DraftMedia.id)).where(DraftMedia.draft_id == Draft.id).correlate(Draft).scalar_subquery()
+    )
+    stmt = select(
+        Draft.id, func.substr(Draft.text, 1, 41).label("text"), media_count.label("media_count")
+    ).where(Draft.tg_user_id == user_id)
+    backwards = cursor is not None and direction == "prev"
+    if backwards:
+        stmt = stmt.where(Draft.id > cursor).order_by(Draft.id)
+    else:
+        if cursor is not None:
+            stmt = stmt.where(Draft.id < cursor)
+        stmt = stmt.order_by(desc(Draft.id)) # Сортируем по убыванию ID (новые сверху)
+
+    async with async_session() as session:
+        drafts = (await session.execute(stmt.limit(DRAFTS_PAGE_SIZE + 1))).all()
+        total = (await session.execute(
+            select(func.count()).select_from(Draft).where(Draft.tg_user_id == user_id)
+        )).scalar_one()
+
+    more = len(drafts) > DRAFTS_PAGE_SIZE
+    drafts = drafts[:DRAFTS_PAGE_SIZE]
+    if backwards:
+        drafts.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = cursor is not None, more
+
+    if not total:
+        return "📄 **Drafts**\n\n_You have no drafts yet._", drafts_menu_kb([])
+    if not drafts:
+        # Курсор устарел (черновики удалены) — первая страница
+        return await _drafts_page(user_id)
+    text = f"📄 **Drafts** ({total})\n\nSelect a draft to view/edit or create a new one:"
+    return text, drafts_menu_kb(drafts, has_prev=has_prev, has_next=has_next)
+
+
+async def drafts_list_menu(
+    evt: Union[CallbackQuery, Message], state: FSMContext, cursor: Optional[int] = None, direction: str = "next",
+):
+    """Отображает список черновиков (страница от курсора)."""
     await state.clear()
     user_id = evt.from_user.id
 
@@ -66,21 +129,20 @@ async def drafts_list_menu(evt: Union[CallbackQuery, Message], state: FSMContext
     else: # Если это Message
         target_message = evt
 
-    async with async_session() as session:
-        drafts = (await session.execute(
-            select(Draft)
-            .where(Draft.tg_user_id == user_id)
-            .order_by(desc(Draft.id)) # Сортируем по убыванию ID (новые сверху)
-            .limit(20) # Ограничим для производительности
-            .options(selectinload(Draft.media))
-        )).scalars().all()
-
-    text = "📄 **Drafts**\n\nSelect a draft to view/edit or create a new one:"
-    if not drafts:
-        text = "📄 **Drafts**\n\n_You have no drafts yet._"
-
+    text, kb = await _drafts_page(user_id, cursor, direction)
     # Используем target_message
-    await safe_edit(target_message, text, reply_markup=drafts_menu_kb(drafts))
+    await safe_edit(target_message, text, reply_markup=kb)
+
+
+@router.callback_query(F.data.startswith("drafts_page:"))
+async def drafts_page_cb(cb: CallbackQuery, state: FSMContext):
+    """drafts_page:{prev|next}:{id} — соседняя страница списка."""
+    try:
+        _, direction, cursor = cb.data.split(":", 2)
+        cursor = int(cursor)
+    except ValueError:
+        await cb.answer("Invalid page.", show_alert=True); return
+    await drafts_list_menu(cb, state, cursor, direction)
 
 
 # -------------------- СОЗДАНИЕ ЧЕРНОВИКА --------------------- #
@@ -154,19 +216,13 @@ async def draft_view(cb: CallbackQuery, state: FSMContext):
         text = draft.text or "(No text)"
         hashtags = draft.suggested_hashtags or ""
 
-    display_text = (
-        f"📄 **Draft #{draft_id}**\n\n"
-        f"📝 **Text:**\n{escape(text)}\n\n"
-        f"🖼️ **Media Attached:** {media_count}/10"
-    )
-    if hashtags:
-        display_text += f"\n\n✨ **Suggested Hashtags:**\n{escape(hashtags)}"
+    display_text = _draft_view_text(draft_id, text, media_count, hashtags)
 
     # Устанавливаем состояние просмотра, чтобы кнопки работали
     await state.set_state(DraftFSM.viewing)
     await state.update_data(current_draft_id=draft_id)
 
-    await safe_edit(cb.message, display_text, reply_markup=draft_view_kb(draft_id))
+    await safe_edit(cb.message, display_text, reply_markup=draft_view_kb(draft_id, has_hashtags=bool(hashtags)))
     # --- (ИСПРАВЛЕНИЕ) Удаляем cb.answer(), так как он не нужен при вызове через fake_cb ---
     # await cb.answer() # <--- ЭТА СТРОКА УДАЛЕНА
     # ---
@@ -385,25 +441,42 @@ async def draft_manage_media_clear(cb: CallbackQuery, state: FSMContext):
 
 # --- Генерация хэштегов ---
 @router.callback_query(DraftFSM.viewing, F.data.startswith("draft_suggest_hashtags:"))
+@router.callback_query(DraftFSM.viewing, F.data.startswith("draft_regen_hashtags:"))
 async def draft_suggest_hashtags_handler(cb: CallbackQuery, state: FSMContext): # Переименовано во избежание конфликта
-    """Генерирует хэштеги для текста черновика."""
+    """Генерирует хэштеги для текста черновика (Regenerate — в обход кеша)."""
+    regenerate = cb.data.startswith("draft_regen_hashtags:")
     fsm_data = await state.get_data()
     draft_id = fsm_data.get("current_draft_id")
     if not draft_id:
         await cb.answer("Error: Draft context lost.", show_alert=True); return
 
     user_id = cb.from_user.id
+    media_count_sq = (
+        select(func.count(DraftMedia.id)).where(DraftMedia.draft_id == Draft.id).scalar_subquery()
+    )
     async with async_session() as session:
-        draft_text = (await session.execute(
-            select(Draft.text).where(Draft.id == draft_id, Draft.tg_user_id == user_id)
-        )).scalar_one_or_none()
+        row = (await session.execute(
+            select(Draft.text, media_count_sq).where(Draft.id == draft_id, Draft.tg_user_id == user_id)
+        )).first()
+    draft_text, media_count = (row[0], row[1]) if row else (None, 0)
 
     if not draft_text:
         await cb.answer("Draft text is empty, cannot suggest hashtags.", show_alert=True)
         return
 
     await cb.answer("✨ Generating hashtags with AI...")
-    suggested_tags_text = await suggest_hashtags(draft_text) # Используем импортированную функцию
+    # Мгновенная подсказка по корпусу пользователя, пока отвечает ИИ
+    local_tags_text = await suggest_local_hashtags(user_id, draft_text)
+    if local_tags_text:
+        await safe_edit(
+            cb.message,
+            _draft_view_text(draft_id, draft_text, media_count, local_tags_text, note="⏳ Asking AI for better hashtags..."),
+            reply_markup=draft_view_kb(draft_id, has_hashtags=True),
+        )
+    suggested_tags_text = await suggest_hashtags(draft_text, tg_user_id=user_id, use_cache=not regenerate) # Используем импортированную функцию
+    if not suggested_tags_text:
+        # ИИ недоступен / заблокирован / упёрся в лимит — оставляем локальные теги
+        suggested_tags_text = local_tags_text
 
     # Сохраняем теги в базу
     async with async_session() as session:
@@ -426,15 +499,9 @@ async def draft_suggest_hashtags_handler(cb: CallbackQuery, state: FSMContext):
         text = draft.text or "(No text)"
         hashtags = draft.suggested_hashtags or "" # Теперь они должны быть
 
-    display_text = (
-        f"📄 **Draft #{draft_id}**\n\n"
-        f"📝 **Text:**\n{escape(text)}\n\n"
-        f"🖼️ **Media Attached:** {media_count}/10"
-    )
-    if hashtags:
-        display_text += f"\n\n✨ **Suggested Hashtags:**\n{escape(hashtags)}"
+    display_text = _draft_view_text(draft_id, text, media_count, hashtags)
 
-    await safe_edit(cb.message, display_text, reply_markup=draft_view_kb(draft_id))
+    await safe_edit(cb.message, display_text, reply_markup=draft_view_kb(draft_id, has_hashtags=bool(hashtags)))
     # await cb.answer() # Ответ уже был ("Generating...")
 
 
@@ -517,22 +584,11 @@ async def draft_delete_confirm_finish(cb: CallbackQuery, state: FSMContext):
 
     # Возвращаемся к списку черновиков, отправляя НОВОЕ сообщение
     await state.clear()
-    user_id = cb.from_user.id
-    async with async_session() as session:
-        drafts = (await session.execute(
-            select(Draft)
-            .where(Draft.tg_user_id == user_id)
-            .order_by(desc(Draft.id))
-            .limit(20)
-            .options(selectinload(Draft.media))
-        )).scalars().all()
-    text = "📄 **Drafts**\n\nSelect a draft to view/edit or create a new one:"
-    if not drafts:
-        text = "📄 **Drafts**\n\n_You have no drafts yet._"
+    text, kb = await _drafts_page(cb.from_user.id)
 
     # Отправляем новое сообщение вместо редактирования старого
     try:
-         await cb.message.answer(text, reply_markup=drafts_menu_kb(drafts))
+         await cb.message.answer(text, reply_markup=kb)
          # Попытаемся удалить сообщение с подтверждением, если получится
          await cb.message.delete()
     except Exception as e:
@@ -13,6 +13,7 @@ HELP_TEXT = (
     "<b>Help & Commands</b>\n\n"
     "• <b>📝 Post now</b> — publish immediately (text + up to 10 photos).\n"
     "• <b>⏱ Schedule</b> — set timers for auto-posting.\n"
+    "• <b>🔍 Search</b> — find old posts, drafts and scheduled texts.\n"
     "• <b>🔑 Accounts</b> — manage your Threads accounts.\n"
     "• <b>⚙️ Settings</b> — configure notifications and your time zone.\n"
     "\n"
@@ -20,6 +21,7 @@ HELP_TEXT = (
     "/start — show main menu\n"
     "/menu — show main inline menu\n"
     "/help — show this message\n"
+    "/search &lt;words&gt; — search your archive, drafts and schedule\n"
     "/recheck_all — revalidate all your tokens\n"
     "/cancel — cancel current action (like adding a token or post)"
 )
@@ -13,7 +13,7 @@ from aiogram.filters import CommandStart, Command
 from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton # Добавлен KeyboardButton
 from aiogram.fsm.context import FSMContext
 
-from app.keyboards import main_menu_kb, settings_menu_kb # Инлайн-клавиатуры
+from app.keyboards import main_menu_kb, settings_menu_kb, memo_keyboard # Инлайн-клавиатуры
 # Импорты для обработки кнопок Drafts и Archive
 from .drafts import drafts_list_menu
 from .archive import archive_list_dates
@@ -36,20 +36,24 @@ main_reply_kb_layout = [
 ]
 
 
+@memo_keyboard()
+def main_reply_kb() -> ReplyKeyboardMarkup:
+    """Нижняя клавиатура (собирается один раз)."""
+    keyboard_buttons = [
+        [KeyboardButton(text=text) for text in row]
+        for row in main_reply_kb_layout
+    ]
+    return ReplyKeyboardMarkup(keyboard=keyboard_buttons, resize_keyboard=True)
+
+
 # --- Обработчики команд ---
 @router.message(CommandStart())
 async def cmd_start(message: Message, state: FSMContext):
     """Обработчик команды /start."""
     await state.clear()
-    # (ИСПРАВЛЕНИЕ) Создаем кнопки здесь
-    keyboard_buttons = [
-        [KeyboardButton(text=text) for text in row]
-        for row in main_reply_kb_layout
-    ]
-    kb = types.ReplyKeyboardMarkup(keyboard=keyboard_buttons, resize_keyboard=True)
     await message.answer(
         "Welcome! 👋\nI can help you schedule posts or post directly to Threads.",
-        reply_markup=kb,
+        reply_markup=main_reply_kb(),
     )
     # Сразу покажем инлайн-меню тоже
     await message.answer("Choose an action:", reply_markup=main_menu_kb())
@@ -11,13 +11,16 @@ from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
-from sqlalchemy import select
+from sqlalchemy import select, func
 
-from app.keyboards import notify_menu, tz_menu
+from app.config import settings
+from app.keyboards import notify_menu, tz_menu, digest_mode_kb
 from app.database.models import async_session, BotSettings, Job
 from app.services.notifications import notify_user
 from app.services.safe_edit import safe_edit
 from app.services.scheduler import reload_schedule
+from app.services.row_cache import invalidate_bot_settings, get_bot_settings
+from app.services.digest import DIGEST_MODES, DIGEST_OFF, digest_mode_of, flush_user_digest
 
 router = Router()
 log = logging.getLogger(__name__)
@@ -48,6 +51,7 @@ async def notify_here_cb(callback: CallbackQuery) -> None:
         else:
             st.notify_chat_id = chat_id
         await session.commit()
+    invalidate_bot_settings(user_id)
 
     await safe_edit(callback.message, f"✅ I will send reports here: <code>{chat_id}</code>", reply_markup=notify_menu())
     await callback.answer()
@@ -59,14 +63,14 @@ async def notify_status_cb(callback: CallbackQuery) -> None:
 
     async with async_session() as session:
         st = await session.get(BotSettings, user_id)
-        jobs = (await session.execute(
-            select(Job).where(Job.tg_user_id == user_id)
-        )).scalars().all()
+        jobs_count = (await session.execute(
+            select(func.count()).select_from(Job).where(Job.tg_user_id == user_id)
+        )).scalar_one()
 
     if st and st.notify_chat_id:
-        text = f"🔔 Enabled\nChat: <code>{st.notify_chat_id}</code>\nYour active timers: <b>{len(jobs)}</b>"
+        text = f"🔔 Enabled\nChat: <code>{st.notify_chat_id}</code>\nYour active timers: <b>{jobs_count}</b>"
     else:
-        text = f"🔕 Disabled\nYour active timers: <b>{len(jobs)}</b>\nEnable via “📍 Send reports here”"
+        text = f"🔕 Disabled\nYour active timers: <b>{jobs_count}</b>\nEnable via “📍 Send reports here”"
 
     await safe_edit(callback.message, text, reply_markup=notify_menu())
     await callback.answer()
@@ -88,10 +92,58 @@ async def notify_off_cb(callback: CallbackQuery) -> None:
         if st:
             st.notify_chat_id = None
             await session.commit()
+    invalidate_bot_settings(user_id)
 
     await safe_edit(callback.message, "🔕 Notifications disabled.", reply_markup=notify_menu())
     await callback.answer()
 
+# ---------- Сводки (digest) ----------
+
+DIGEST_HELP = (
+    "🗞 <b>Publish notifications</b>\n\n"
+    "Instant — a message for every published post.\n"
+    "Hourly / Daily — successes are collected into one summary "
+    "(daily at {hour}:00 your time). Errors are always sent immediately."
+)
+
+@router.callback_query(F.data == "digest_menu")
+async def digest_menu_open(callback: CallbackQuery) -> None:
+    st = await get_bot_settings(callback.from_user.id)
+    await safe_edit(
+        callback.message,
+        DIGEST_HELP.format(hour=int(settings.DIGEST_DAILY_HOUR) % 24),
+        reply_markup=digest_mode_kb(digest_mode_of(st)),
+    )
+    await callback.answer()
+
+@router.callback_query(F.data.startswith("digest_set:"))
+async def digest_set_cb(callback: CallbackQuery) -> None:
+    user_id = callback.from_user.id
+    mode = callback.data.split(":", 1)[1]
+    if mode not in DIGEST_MODES:
+        await callback.answer("Unknown mode.", show_alert=True); return
+    log.info("digest_set: user %s -> %s", user_id, mode)
+
+    async with async_session() as session:
+        st = await session.get(BotSettings, user_id)
+        if st is None:
+            st = BotSettings(tg_user_id=user_id, digest_mode=mode)
+            session.add(st)
+        else:
+            st.digest_mode = mode
+        await session.commit()
+    invalidate_bot_settings(user_id)
+
+    if mode == DIGEST_OFF:
+        await flush_user_digest(user_id)  # досылаем то, что успело накопиться
+
+    await safe_edit(
+        callback.message,
+        DIGEST_HELP.format(hour=int(settings.DIGEST_DAILY_HOUR) % 24),
+        reply_markup=digest_mode_kb(mode),
+    )
+    await callback.answer()
+
 # ---------- Time Zone ----------
 
 async def get_user_tz(user_id: int, session: async_session) -> str:
@@ -134,6 +186,7 @@ async def tz_enter_handler(message: Message, state: FSMContext):
         else:
             st.tz = tz_name
         await session.commit()
+    invalidate_bot_settings(user_id)
     
     await reload_schedule()
     await state.clear()
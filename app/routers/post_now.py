@@ -23,10 +23,11 @@ from aiogram.fsm.context import FSMContext
 from sqlalchemy import select
 
 # (ИЗМЕНЕНИЕ) Импортируем новую модель PublishedPost
-from app.database.models import async_session, Account, BotSettings, PublishedPost
+from app.database.models import async_session, Account, PublishedPost
 from app.services.safe_edit import safe_edit
 from app.services.tg_io import get_file_public_url
 from app.services.threads_client import publish_auto, ThreadsError
+from app.services.row_cache import get_bot_settings, get_account
 
 log = logging.getLogger(__name__)
 router = Router()
@@ -82,7 +83,7 @@ async def post_now_start(evt, state: FSMContext):
             return
 
         # если несколько — смотрим дефолт в настройках
-        st = await session.get(BotSettings, user_id)
+        st = await get_bot_settings(user_id)
         if st and st.default_account_id:
             await state.update_data(account_id=st.default_account_id, images=[])
             await state.set_state(PostNowFSM.waiting_text)
@@ -215,7 +216,7 @@ async def post_now_publish(cb: CallbackQuery, state: FSMContext):
 
     async with async_session() as session:
         if not account_id:
-            st = await session.get(BotSettings, user_id)
+            st = await get_bot_settings(user_id)
             if st and st.default_account_id:
                 account_id = st.default_account_id
             else:
@@ -229,7 +230,7 @@ async def post_now_publish(cb: CallbackQuery, state: FSMContext):
             await state.clear()
             return
 
-        acc = await session.get(Account, account_id)
+        acc = await get_account(account_id)
         if not acc or not acc.access_token:
             await safe_edit(cb.message, "Account has no token. Set token and try again.")
             await state.clear()
@@ -5,35 +5,42 @@
 
 from __future__ import annotations
 
-import io
-import csv
 import logging
 from html import escape
 from datetime import datetime, timedelta
-from zoneinfo import ZoneInfo
 
 from aiogram import Router, F
 from aiogram.filters import Command, StateFilter
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
-from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton, BufferedInputFile
+from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, func, tuple_
 from sqlalchemy.orm import selectinload
 
-from app.database.models import async_session, Job, Account, BotSettings, JobMedia
+from app.database.models import async_session, Job, Account, JobMedia
 from app.keyboards import (
     schedule_menu, dow_picker_kb, weekly_view_kb, day_view_kb,
-    job_list_kb, job_actions_kb, job_delete_confirm_kb
+    job_list_kb, job_list_filter_kb, job_actions_kb, job_delete_confirm_kb
 )
 from app.services.safe_edit import safe_edit
 from app.services.scheduler import reload_schedule
+from app.services.row_cache import get_account, get_user_tz
+from app.services.schedule_projection import get_zone
 # (ИЗМЕНЕНО) Импорт _parse_hhmm теперь отсюда
-from app.services.schedule_utils import mask_to_human, mask_to_days_label, parse_days_to_mask, _parse_hhmm
+from app.services.schedule_utils import mask_to_human, mask_to_days_label, _parse_hhmm
 
 log = logging.getLogger(__name__)
 router = Router()
 
+DAY_VIEW_TEXT_LEN = 40
+JOB_LIST_PAGE_SIZE = 10
+
+
+def _dow_flag(dow: int):
+    """SQL: 1, если задача срабатывает в день недели dow (0=Mon..6=Sun), иначе 0."""
+    return func.coalesce(Job.dow_mask, 127).bitwise_rshift(dow).bitwise_and(1)
+
 
 # ---------- FSMs ----------
 class AddTimesFSM(StatesGroup):
@@ -50,9 +57,6 @@ class ClearAllFSM(StatesGroup):
     waiting_account = State()
     waiting_confirm = State()
 
-class ImportCSVFSM(StatesGroup): # ВОССТАНОВЛЕНО
-    waiting_doc = State()
-
 
 # ---------- Вход в раздел ----------
 @router.message(F.text == "⏱ Schedule")
@@ -114,8 +118,7 @@ async def sched_account_picked(cb: CallbackQuery, state: FSMContext) -> None:
     except Exception:
         await cb.answer("Invalid account.", show_alert=True); return
 
-    async with async_session() as session:
-        acc = await session.get(Account, acc_id)
+    acc = await get_account(acc_id)
 
     if not acc or acc.tg_user_id != user_id:
         await cb.answer("Account not found.", show_alert=True); return
@@ -295,7 +298,7 @@ async def sched_waiting_media_wrong(message: Message, state: FSMContext) -> None
     await message.answer("Please send a *photo* (not a document). Or press Publish.")
 
 
-@router.message(Command("cancel"), F.state.in_([AddTimesFSM, EditJobFSM, ImportCSVFSM]))
+@router.message(Command("cancel"), F.state.in_([AddTimesFSM, EditJobFSM]))
 async def sched_cancel_any(message: Message, state: FSMContext) -> None:
     await state.clear()
     await message.answer("Canceled.", reply_markup=schedule_menu())
@@ -304,28 +307,131 @@ async def sched_cancel_any(message: Message, state: FSMContext) -> None:
 # ===============================================
 #   LIST & УПРАВЛЕНИЕ КОНКРЕТНОЙ ЗАДАЧЕЙ
 # ===============================================
-@router.callback_query(F.data == "sched_list")
-async def sched_list(cb: CallbackQuery) -> None:
-    """Вместо текста, выводит задачи в виде кнопок."""
+def _job_filter(filter_code: str):
+    """'' — все задачи, 'a<id>' — по аккаунту, 'd<0..6>' — по дню недели; None, если код неверный."""
+    if not filter_code:
+        return []
+    kind, value = filter_code[0], filter_code[1:]
+    if not value.isdigit():
+        return None
+    if kind == "a":
+        return [Job.account_id == int(value)]
+    if kind == "d" and int(value) < 7:
+        return [_dow_flag(int(value)) == 1]
+    return None
+
+
+def _job_filter_label(filter_code: str, account_title: str | None = None) -> str:
+    if not filter_code:
+        return ""
+    if filter_code[0] == "d":
+        return f" (filter: {mask_to_days_label(1 << int(filter_code[1:]))})"
+    return f" (filter: {escape(account_title or 'id=' + filter_code[1:])})"
+
+
+async def _render_job_list(
+    cb: CallbackQuery, filter_code: str = "", cursor: tuple[str, int] | None = None, direction: str = "n",
+) -> None:
+    """
+    Страница списка задач. Keyset-пагинация по (time_str, id): грузим только
+    JOB_LIST_PAGE_SIZE + 1 строк (лишняя — признак следующей страницы), кол-во медиа — подзапросом.
+    """
     user_id = cb.from_user.id
+    conditions = _job_filter(filter_code)
+    if conditions is None:
+        await cb.answer("Invalid filter.", show_alert=True)
+        return
+
+    media_count = (
+        select(func.count(JobMedia.id)).where(JobMedia.job_id == Job.id).correlate(Job).scalar_subquery()
+    )
+    stmt = (
+        select(Job.id, Job.time_str, Job.dow_mask, func.substr(Job.text, 1, 26).label("text"),
+               media_count.label("media_count"))
+        .where(Job.tg_user_id == user_id, *conditions)
+    )
+    backwards = cursor is not None and direction == "p"
+    if cursor is not None:
+        key = tuple_(Job.time_str, Job.id)
+        stmt = stmt.where(key < tuple_(*cursor) if backwards else key > tuple_(*cursor))
+    if backwards:
+        stmt = stmt.order_by(Job.time_str.desc(), Job.id.desc())
+    else:
+        stmt = stmt.order_by(Job.time_str, Job.id)
+
     async with async_session() as session:
-        # (ИЗМЕНЕНИЕ) Используем selectinload для "жадной" загрузки связанных медиа-файлов,
-        # чтобы избежать дополнительных запросов к БД в цикле.
-        jobs = (await session.execute(
-            select(Job)
-            .where(Job.tg_user_id == user_id)
-            .options(selectinload(Job.media)) # <-- Вот это изменение
-            .order_by(Job.time_str, Job.id)
-        )).scalars().all()
+        jobs = (await session.execute(stmt.limit(JOB_LIST_PAGE_SIZE + 1))).all()
+        total = (await session.execute(
+            select(func.count()).select_from(Job).where(Job.tg_user_id == user_id, *conditions)
+        )).scalar_one()
+        account_title = None
+        if filter_code.startswith("a"):
+            account_title = (await session.execute(
+                select(Account.title).where(Account.id == int(filter_code[1:]), Account.tg_user_id == user_id)
+            )).scalar_one_or_none()
+
+    more = len(jobs) > JOB_LIST_PAGE_SIZE
+    jobs = jobs[:JOB_LIST_PAGE_SIZE]
+    if backwards:
+        jobs.reverse()
+        has_prev, has_next = more, True
+    else:
+        has_prev, has_next = cursor is not None, more
+
+    if not total:
+        if filter_code:
+            await safe_edit(cb.message, f"No tasks match the filter{_job_filter_label(filter_code, account_title)}.",
+                            reply_markup=job_list_kb([], filter_code=filter_code))
+        else:
+            await safe_edit(cb.message, "Your schedule is empty.", reply_markup=schedule_menu())
+        await cb.answer(); return
 
     if not jobs:
-        await safe_edit(cb.message, "Your schedule is empty.", reply_markup=schedule_menu())
-        await cb.answer(); return
+        # Курсор устарел (задачи удалены) — начинаем сначала
+        await _render_job_list(cb, filter_code)
+        return
 
-    await safe_edit(cb.message, "Select a task to view or edit:", reply_markup=job_list_kb(jobs))
+    await safe_edit(
+        cb.message,
+        f"Select a task to view or edit{_job_filter_label(filter_code, account_title)}. Tasks: <b>{total}</b>",
+        reply_markup=job_list_kb(jobs, has_prev=has_prev, has_next=has_next, filter_code=filter_code),
+    )
     await cb.answer()
 
 
+@router.callback_query(F.data == "sched_list")
+async def sched_list(cb: CallbackQuery) -> None:
+    """Вместо текста, выводит задачи в виде кнопок (первая страница)."""
+    await _render_job_list(cb)
+
+
+@router.callback_query(F.data.startswith("sched_lp:"))
+async def sched_list_page(cb: CallbackQuery) -> None:
+    """sched_lp:{p|n}:{HHMM}:{id}:{фильтр} — соседняя страница от курсора."""
+    try:
+        _, direction, hhmm, job_id, filter_code = cb.data.split(":", 4)
+        cursor = (f"{hhmm[:-2]}:{hhmm[-2:]}", int(job_id))
+    except ValueError:
+        await cb.answer("Invalid page.", show_alert=True)
+        return
+    await _render_job_list(cb, filter_code, cursor, direction)
+
+
+@router.callback_query(F.data == "sched_lfilter")
+async def sched_list_filter(cb: CallbackQuery) -> None:
+    async with async_session() as session:
+        accounts = (await session.execute(
+            select(Account.id, Account.title).where(Account.tg_user_id == cb.from_user.id).order_by(Account.id)
+        )).all()
+    await safe_edit(cb.message, "Show tasks for an account or a weekday:", reply_markup=job_list_filter_kb(accounts))
+    await cb.answer()
+
+
+@router.callback_query(F.data.startswith("sched_lf:"))
+async def sched_list_filtered(cb: CallbackQuery) -> None:
+    await _render_job_list(cb, cb.data.split(":", 1)[1])
+
+
 @router.callback_query(F.data.startswith("sched_job_view:"))
 async def sched_job_view(cb: CallbackQuery, state: FSMContext):
     """Показывает детали задачи и кнопки действий."""
@@ -435,31 +541,24 @@ async def sched_job_edit_text_finish(message: Message, state: FSMContext):
 @router.callback_query(F.data == "sched_weekly_view")
 async def sched_weekly_view(cb: CallbackQuery) -> None:
     user_id = cb.from_user.id
-    async with async_session() as session:
-        st = await session.get(BotSettings, user_id)
-        jobs = (await session.execute(
-            select(Job).where(Job.tg_user_id == user_id)
-        )).scalars().all()
-
-    tz = ZoneInfo(st.tz) if st and getattr(st, "tz", None) else ZoneInfo("Europe/Berlin")
+    tz = get_zone(await get_user_tz(user_id))
     now = datetime.now(tz)
+
+    # Одна агрегирующая строка: всего задач + кол-во задач на каждый день недели (Mon..Sun)
+    async with async_session() as session:
+        total, *per_weekday = (await session.execute(
+            select(func.count(), *(func.coalesce(func.sum(_dow_flag(d)), 0) for d in range(7)))
+            .where(Job.tg_user_id == user_id)
+        )).one()
     
     days_info = []
     
-    if jobs:
+    if total:
         for i in range(7):
             current_day = now.date() + timedelta(days=i)
-            dow = current_day.weekday()
-            
-            day_posts = 0
-            for j in jobs:
-                mask = getattr(j, "dow_mask", 127)
-                if ((mask >> dow) & 1):
-                    day_posts += 1
-            
             date_str = current_day.strftime('%Y-%m-%d')
             label = current_day.strftime('%a, %b %d')
-            days_info.append((label, date_str, day_posts))
+            days_info.append((label, date_str, per_weekday[current_day.weekday()]))
 
     await safe_edit(
         cb.message,
@@ -479,36 +578,25 @@ async def sched_day_view(cb: CallbackQuery) -> None:
         await cb.answer("Invalid date format.", show_alert=True)
         return
 
+    # Фильтр по дню недели — в SQL; текст — только первые 41 символ (40 + признак обрезки)
     async with async_session() as session:
-        jobs = (await session.execute(
-            select(Job).where(Job.tg_user_id == user_id).order_by(Job.time_str)
-        )).scalars().all()
-        
-        acc_ids = {j.account_id for j in jobs}
-        acc_map = {}
-        if acc_ids:
-            accs = (await session.execute(
-                select(Account).where(Account.id.in_(acc_ids))
-            )).scalars().all()
-            acc_map = {a.id: (a.title or f"id={a.id}") for a in accs}
-
-    dow = selected_date.weekday()
-    
+        day_jobs = (await session.execute(
+            select(Job.time_str, Job.account_id, Account.title,
+                   func.substr(Job.text, 1, DAY_VIEW_TEXT_LEN + 1).label("text"))
+            .outerjoin(Account, Account.id == Job.account_id)
+            .where(Job.tg_user_id == user_id, _dow_flag(selected_date.weekday()) == 1)
+            .order_by(Job.time_str, Job.id)
+        )).all()
+
     lines = [f"🗓️ Posts for <b>{selected_date.strftime('%a, %b %d')}</b>:"]
-    
-    day_jobs = []
-    for j in jobs:
-        mask = getattr(j, "dow_mask", 127)
-        if ((mask >> dow) & 1):
-            day_jobs.append(j)
 
     if not day_jobs:
         lines.append("\nNo posts scheduled for this day.")
     else:
         for j in day_jobs:
-            acc_label = acc_map.get(j.account_id, f"id={j.account_id}")
-            short_text = (j.text or "")[:40]
-            if len(j.text or "") > 40:
+            acc_label = j.title or f"id={j.account_id}"
+            short_text = (j.text or "")[:DAY_VIEW_TEXT_LEN]
+            if len(j.text or "") > DAY_VIEW_TEXT_LEN:
                 short_text += "…"
             lines.append(f"• <b>{j.time_str}</b> - <i>{escape(short_text)}</i> (acc: {escape(acc_label)})")
 
@@ -577,144 +665,3 @@ async def sched_clear_do(cb: CallbackQuery, state: FSMContext) -> None:
     await safe_edit(cb.message, f"🧹 Removed your timers: <b>{count_before}</b> (scope: <b>{escape(scope_text)}</b>).\n"
                                 f"Active timers now (all users): <b>{active}</b>", reply_markup=schedule_menu())
     await cb.answer()
-
-
-# ===============================================
-#   (ВОССТАНОВЛЕНО) EXPORT & IMPORT
-# ===============================================
-
-def _uid_from_message(message_or_cb) -> int:
-    """Корректно извлекает ID пользователя из Message или CallbackQuery."""
-    event_from = getattr(message_or_cb, 'from_user', None)
-    event_chat = getattr(message_or_cb, 'chat', None)
-    
-    if hasattr(message_or_cb, 'message') and message_or_cb.message: # Is CallbackQuery
-        event_chat = getattr(message_or_cb.message, 'chat', None)
-        
-    try:
-        if getattr(event_from, "is_bot", False):
-            return event_chat.id
-        return event_from.id
-    except Exception:
-        return event_chat.id
-
-
-@router.callback_query(F.data == "sched_export")
-async def export_schedule_cb(cb: CallbackQuery, state: FSMContext):
-    await state.clear()
-    await export_schedule_cmd(cb.message)
-    await cb.answer()
-
-
-@router.message(Command("export_schedule"))
-async def export_schedule_cmd_msg(message: Message):
-    await export_schedule_cmd(message)
-
-
-async def export_schedule_cmd(message: Message) -> None:
-    uid = _uid_from_message(message)
-
-    async with async_session() as session:
-        jobs = (await session.execute(select(Job).where(Job.tg_user_id == uid))).scalars().all()
-        if not jobs:
-            await message.answer("Your schedule is empty.")
-            return
-        acc_ids = {j.account_id for j in jobs}
-        acc_map = {
-            a.id: (a.title or "")
-            for a in (await session.execute(select(Account).where(Account.id.in_(acc_ids)))).scalars().all()
-        }
-
-    buf = io.StringIO()
-    w = csv.writer(buf)
-    w.writerow(["time_str", "account_id", "account_title", "text", "dow_mask", "days"])
-    for j in jobs:
-        mask = getattr(j, "dow_mask", 127)
-        w.writerow([j.time_str, j.account_id, acc_map.get(j.account_id, ""), j.text, mask, mask_to_days_label(mask)])
-    data = buf.getvalue().encode("utf-8")
-
-    await message.answer_document(
-        BufferedInputFile(data, filename="schedule_export.csv"),
-        caption="📤 Exported your schedule."
-    )
-
-
-@router.callback_query(F.data == "sched_import")
-async def import_schedule_cb(cb: CallbackQuery, state: FSMContext):
-    await state.clear()
-    await safe_edit(
-        cb.message,
-        "📥 Send a CSV file with header at least: <code>time_str,account_id,text</code>\n"
-        "Optional: <code>dow_mask</code> or <code>days</code> (Daily/Weekdays/Mon,Wed,...)",
-        reply_markup=schedule_menu()
-    )
-    await state.set_state(ImportCSVFSM.waiting_doc)
-    await cb.answer()
-
-@router.message(Command("import_schedule"))
-async def import_schedule_cmd_msg(message: Message, state: FSMContext):
-    await state.clear()
-    await message.answer(
-        "📥 Send a CSV file with header at least: <code>time_str,account_id,text</code>\n"
-        "Optional: <code>dow_mask</code> or <code>days</code> (Daily/Weekdays/Mon,Wed,...)"
-    )
-    await state.set_state(ImportCSVFSM.waiting_doc)
-
-
-@router.message(ImportCSVFSM.waiting_doc, F.document)
-async def import_schedule_receive_doc(message: Message, state: FSMContext) -> None:
-    file = message.document
-    if not file.file_name.lower().endswith(".csv"):
-        await message.answer("File must be .csv")
-        return
-
-    uid = _uid_from_message(message)
-    async with async_session() as session:
-        accs = (await session.execute(select(Account).where(Account.tg_user_id == uid))).scalars().all()
-        if not accs:
-            await state.clear()
-            await message.answer("You have no accounts. Add a token first.")
-            return
-        default_acc_id = accs[0].id
-
-    try:
-        file_bytes = await message.bot.download(file)
-        content = (await file_bytes.read()).decode("utf-8", errors="replace")
-    except Exception:
-        await message.answer("Failed to read the file. Try again.")
-        return
-
-    added, errors = 0, 0
-    async with async_session() as session:
-        reader = csv.DictReader(io.StringIO(content))
-        fieldnames = [f.strip().lower() for f in (reader.fieldnames or [])]
-        has_mask, has_days = "dow_mask" in fieldnames, "days" in fieldnames
-
-        for row in reader:
-            ts = (row.get("time_str") or "").strip()
-            ok, _ = _parse_hhmm(ts)
-            if not ok: errors += 1; continue
-            
-            text = (row.get("text") or "").strip()
-            if not text: errors += 1; continue
-            
-            acc_id = (row.get("account_id") or "").strip()
-            acc_id = int(acc_id) if acc_id.isdigit() else default_acc_id
-
-            mask = 127
-            if has_mask and (raw_mask := (row.get("dow_mask") or "").strip()).isdigit():
-                mask = int(raw_mask)
-            elif has_days and (parsed_mask := parse_days_to_mask(row.get("days"))) is not None:
-                mask = parsed_mask
-            
-            session.add(Job(tg_user_id=uid, time_str=ts, text=text, account_id=acc_id, dow_mask=mask))
-            added += 1
-
-        await session.commit()
-
-    await state.clear()
-    active = await reload_schedule()
-    await message.answer(
-        f"📥 Imported {added} row(s), skipped {errors}. Active timers: {active}",
-        reply_markup=schedule_menu()
-    )
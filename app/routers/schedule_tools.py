@@ -7,10 +7,10 @@
 
 from __future__ import annotations
 
-import io
-import csv
+import tempfile
+from html import escape
 from datetime import datetime, timedelta
-from typing import Tuple, Iterable
+from typing import Tuple
 
 from aiogram import Router, F
 from aiogram.filters import Command, StateFilter
@@ -19,16 +19,22 @@ from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import StatesGroup, State
 from sqlalchemy import select
 
-from app.database.models import async_session, Account, Job, BotSettings
-from app.services.scheduler import reload_schedule
+from app.database.models import async_session, Job
+from app.services.scheduler import schedule_jobs
+from app.services.schedule_import import import_schedule_csv, ImportFileError
+from app.services.schedule_export import export_schedule, EXPORT_FORMATS
 from app.services.safe_edit import safe_edit
-from app.keyboards import schedule_menu
+from app.services.row_cache import get_user_tz
+from app.services.schedule_projection import expand_fire_times
+from app.keyboards import schedule_menu, schedule_export_format_kb
 from app.services.schedule_utils import (
     all_days_mask, weekdays_mask, weekends_mask,
 )
 
 router = Router(name="schedule_tools")
 
+IMPORT_SPOOL_BYTES = 1024 * 1024  # до 1 МБ файл держим в памяти, дальше — на диске
+
 
 # ---------- ВСПОМОГАТЕЛЬНОЕ ----------
 
@@ -44,11 +50,7 @@ def _parse_hhmm(s: str) -> Tuple[bool, str | None]:
 
 
 async def _get_tz_for_user(tg_user_id: int) -> str:
-    async with async_session() as session:
-        st = (await session.execute(
-            select(BotSettings).where(BotSettings.tg_user_id == tg_user_id)
-        )).scalars().first()
-        return (st.tz if st and st.tz else "Europe/Berlin")
+    return await get_user_tz(tg_user_id)
 
 
 def _next_run_from_time_str(time_str: str, tz_name: str) -> datetime:
@@ -138,34 +140,39 @@ def _uid_from_message(message) -> int:
 @router.message(Command("export_schedule"), StateFilter("*"))
 async def export_schedule_cmd(message: Message, state: FSMContext) -> None:
     """
-    Экспорт расписания в CSV со столбцами:
-    time_str,account_id,account_title,text,dow_mask,days
+    Экспорт расписания: /export_schedule [csv|jsonl|csv_gz|jsonl_gz].
+    Без аргумента — выбор формата кнопками.
+    Колонки: time_str,account_id,account_title,text,dow_mask,days,media
     """
     await state.clear()
     uid = _uid_from_message(message)
-
-    async with async_session() as session:
-        rows = (await session.execute(select(Job).where(Job.tg_user_id == uid))).scalars().all()
-        if not rows:
-            await message.answer("Your schedule is empty.")
-            return
-        acc_ids = {r.account_id for r in rows}
-        acc_map = {
-            a.id: (a.title or "")
-            for a in (await session.execute(select(Account).where(Account.id.in_(acc_ids)))).scalars().all()
-        }
-
-    buf = io.StringIO()
-    w = csv.writer(buf)
-    w.writerow(["time_str", "account_id", "account_title", "text", "dow_mask", "days"])
-    for j in rows:
-        mask = getattr(j, "dow_mask", 127)
-        w.writerow([j.time_str, j.account_id, acc_map.get(j.account_id, ""), j.text, mask, mask_to_days_label(mask)])
-    data = buf.getvalue().encode("utf-8")
-
+    parts = (message.text or "").split(maxsplit=1)
+    fmt = parts[1].strip().lower() if len(parts) > 1 and not getattr(message.from_user, "is_bot", False) else ""
+    if fmt in EXPORT_FORMATS:
+        await send_schedule_export(message, uid, fmt)
+    else:
+        await ask_export_format(message)
+
+
+async def ask_export_format(message: Message, edit: bool = False) -> None:
+    text = "📤 Choose export format:"
+    kb = schedule_export_format_kb((fmt, label) for fmt, (label, _) in EXPORT_FORMATS.items())
+    if edit:
+        await safe_edit(message, text, reply_markup=kb)
+    else:
+        await message.answer(text, reply_markup=kb)
+
+
+async def send_schedule_export(message: Message, uid: int, fmt: str) -> None:
+    """Общая отправка файла экспорта (команда и кнопки меню расписания)."""
+    exported = await export_schedule(uid, fmt)
+    if exported is None:
+        await message.answer("Your schedule is empty.")
+        return
+    data, filename, count = exported
     await message.answer_document(
-        BufferedInputFile(data, filename="schedule_export.csv"),
-        caption="📤 Exported your schedule."
+        BufferedInputFile(data, filename=filename),
+        caption=f"📤 Exported your schedule ({count} job(s))."
     )
 
 
@@ -179,6 +186,7 @@ async def import_schedule_cmd(message: Message, state: FSMContext) -> None:
         "Optional columns:\n"
         "• <code>dow_mask</code> — integer bitmask (127=daily)\n"
         "• <code>days</code> — e.g. <i>Daily</i>, <i>Weekdays</i>, <i>Weekends</i>, <i>Mon,Wed,Fri</i>\n"
+        "• <code>media</code> — <i>tg:&lt;file_id&gt;</i> or image URLs separated by <code>|</code>\n"
         "If both present, <b>dow_mask</b> wins."
     )
     await state.set_state(ImportCSV.waiting_doc)
@@ -190,82 +198,48 @@ async def import_schedule_receive_doc(message: Message, state: FSMContext) -> No
     Принимаем CSV, создаём Job:
       • time_str: HH:MM
       • text: not empty
-      • account_id: если пусто — берём первый аккаунт пользователя
+      • account_id: один из аккаунтов пользователя; если пусто — первый аккаунт
       • dow_mask: из колонки dow_mask (int) или days (строка)
     """
+    await receive_import_document(message, state, message.from_user.id)
+
+
+async def receive_import_document(message: Message, state: FSMContext, uid: int) -> None:
+    """Общий приём CSV для импорта (и из /import_schedule, и из меню расписания)."""
     file = message.document
-    if not file.file_name.lower().endswith(".csv"):
+    if not (file.file_name or "").lower().endswith(".csv"):
         await message.answer("File must be .csv")
         return
 
-    uid = message.from_user.id
-    async with async_session() as session:
-        accs = (await session.execute(select(Account).where(Account.tg_user_id == uid))).scalars().all()
-        if not accs:
+    wait_msg = await message.answer("⏳ Importing your schedule...")
+    # Файл скачивается частями во временный файл (в памяти — только небольшие)
+    with tempfile.SpooledTemporaryFile(max_size=IMPORT_SPOOL_BYTES) as tmp:
+        try:
+            await message.bot.download(file, destination=tmp)
+            tmp.seek(0)
+        except Exception:
+            await safe_edit(wait_msg, "Failed to read the file. Try again.")
+            return
+        try:
+            report = await import_schedule_csv(uid, tmp)
+        except ImportFileError as e:
             await state.clear()
-            await message.answer("You have no accounts. Add a token first.")
+            await safe_edit(wait_msg, f"❌ {escape(str(e))}")
             return
-        default_acc_id = accs[0].id
-
-    # читаем файл
-    try:
-        file_bytes = await message.bot.download(file)
-        content = (await file_bytes.read()).decode("utf-8", errors="replace")
-    except Exception:
-        await message.answer("Failed to read the file. Try again.")
-        return
-
-    added = 0
-    errors = 0
-    async with async_session() as session:
-        reader = csv.DictReader(io.StringIO(content))
-        # нормализуем имена колонок
-        fieldnames = [f.strip().lower() for f in (reader.fieldnames or [])]
-        has_mask = "dow_mask" in fieldnames
-        has_days = "days" in fieldnames
-
-        for row in reader:
-            # базовые поля
-            ts = (row.get("time_str") or row.get("Time") or "").strip()
-            ok, _ = _parse_hhmm(ts)
-            if not ok:
-                errors += 1
-                continue
-
-            text = (row.get("text") or row.get("Text") or "").strip()
-            if not text:
-                errors += 1
-                continue
-
-            # account_id
-            acc_id_str = (row.get("account_id") or row.get("Account") or "").strip()
-            acc_id = int(acc_id_str) if acc_id_str.isdigit() else default_acc_id
-
-            # mask: приоритет dow_mask → days → default(127)
-            mask = 127
-            if has_mask:
-                raw = (row.get("dow_mask") or "").strip()
-                if raw.isdigit():
-                    try:
-                        mask = int(raw)
-                    except Exception:
-                        pass
-            if has_days and (not has_mask or mask == 127):
-                parsed = parse_days_to_mask(row.get("days"))
-                if parsed is not None:
-                    mask = parsed
-
-            session.add(Job(tg_user_id=uid, time_str=ts, text=text, account_id=acc_id, dow_mask=mask))
-            added += 1
-
-        await session.commit()
 
     await state.clear()
-    active = await reload_schedule()
-    await message.answer(
-        f"📥 Imported {added} row(s), skipped {errors}. Active timers: {active}",
+    # Новые задачи — только их триггеры, без полной пересборки расписания
+    scheduled = await schedule_jobs(report.job_ids)
+    await safe_edit(
+        wait_msg,
+        f"📥 Imported {report.added} row(s), skipped {report.skipped}. New timers: {scheduled}",
         reply_markup=schedule_menu()
     )
+    if report.errors:
+        await message.answer_document(
+            BufferedInputFile(report.error_report_csv(), filename="schedule_import_errors.csv"),
+            caption="⚠️ Skipped rows with the reason for each."
+        )
 
 
 # ---------- NEXT RUNS (7 дней вперёд, с учётом маски) ----------
@@ -279,46 +253,18 @@ async def next_runs_cmd(message: Message, state: FSMContext) -> None:
     await state.clear()
     uid = _uid_from_message(message)
 
-    # tz + все задачи пользователя
+    # tz + все задачи пользователя (только нужные для вывода колонки)
+    tz_name = await get_user_tz(uid)
     async with async_session() as session:
-        st = (await session.execute(select(BotSettings).where(BotSettings.tg_user_id == uid))).scalars().first()
-        tz_name = (st.tz if st and st.tz else "Europe/Berlin")
-        rows = (await session.execute(select(Job).where(Job.tg_user_id == uid))).scalars().all()
+        rows = (await session.execute(
+            select(Job.id, Job.time_str, Job.dow_mask, Job.account_id).where(Job.tg_user_id == uid)
+        )).all()
 
     if not rows:
         await message.answer("Your schedule is empty.")
         return
 
-    def next_dates_for_job(time_str: str, mask: int, tz: str, days: int = 7) -> Iterable[datetime]:
-        try:
-            import zoneinfo
-            zone = zoneinfo.ZoneInfo(tz)
-        except Exception:
-            from pytz import timezone as _tz
-            zone = _tz(tz)
-        hh, mm = map(int, time_str.split(":"))
-        now = datetime.now(zone).replace(second=0, microsecond=0)
-        cur = now
-        for _ in range(days):
-            dt = cur.replace(hour=hh, minute=mm)
-            if dt < cur:
-                dt += timedelta(days=1)
-            # ищем ближайший разрешённый день
-            while True:
-                wd = dt.weekday()  # Mon=0..Sun=6
-                if (mask >> wd) & 1:
-                    yield dt
-                    break
-                dt += timedelta(days=1)
-            cur += timedelta(days=1)
-
-    upcoming: list[tuple[datetime, Job]] = []
-    for j in rows:
-        m = getattr(j, "dow_mask", 127)
-        upcoming.extend((dt, j) for dt in next_dates_for_job(j.time_str, m, tz_name, days=7))
-
-    upcoming.sort(key=lambda x: x[0])
-    upcoming = upcoming[:20]
+    upcoming = expand_fire_times(rows, tz_name, days=7, limit=20)
 
     lines = [f"Timezone: <b>{tz_name}</b>", "Next triggers (7 days):"]
     for dt, j in upcoming:
@@ -332,9 +278,19 @@ async def next_runs_cmd(message: Message, state: FSMContext) -> None:
 @router.callback_query(F.data == "sched_export")
 async def sched_export_cb(cb: CallbackQuery, state: FSMContext) -> None:
     await state.clear()
-    await export_schedule_cmd(cb.message, state)  # шлём документ отдельным сообщением
+    await ask_export_format(cb.message, edit=True)
     await cb.answer()
 
+
+@router.callback_query(F.data.startswith("sched_export_fmt:"))
+async def sched_export_fmt_cb(cb: CallbackQuery, state: FSMContext) -> None:
+    fmt = cb.data.split(":", 1)[1]
+    if fmt not in EXPORT_FORMATS:
+        await cb.answer("Unknown format.", show_alert=True)
+        return
+    await cb.answer("⏳ Exporting...")
+    await send_schedule_export(cb.message, cb.from_user.id, fmt)  # шлём документ отдельным сообщением
+
 @router.callback_query(F.data == "sched_import")
 async def sched_import_cb(cb: CallbackQuery, state: FSMContext) -> None:
     await state.clear()
@@ -0,0 +1,93 @@
+# app/routers/search.py
+# ------------------------------------------------------------
+# Поиск по архиву, черновикам и задачам: /search <слова> или кнопка 🔍 Search.
+# Запрос хранится в FSM, страницы листаются колбеком search_page:{n}.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+from html import escape
+
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import StatesGroup, State
+from aiogram.types import Message, CallbackQuery
+
+from app.keyboards import search_results_kb, back_button
+from app.services.safe_edit import safe_edit
+from app.services.search import search
+
+log = logging.getLogger(__name__)
+router = Router()
+
+SEARCH_PAGE_SIZE = 8
+
+
+class SearchFSM(StatesGroup):
+    waiting_query = State()
+    browsing = State()
+
+
+async def _render_results(user_id: int, query: str, page: int):
+    hits, has_next = await search(user_id, query, limit=SEARCH_PAGE_SIZE, offset=page * SEARCH_PAGE_SIZE)
+    if not hits and page == 0:
+        text = f"🔍 Nothing found for <b>{escape(query)}</b>."
+    else:
+        text = f"🔍 Results for <b>{escape(query)}</b> (page {page + 1}):"
+    return text, search_results_kb(hits, page, has_next)
+
+
+async def _start_search(message: Message, state: FSMContext, user_id: int, query: str):
+    await state.set_state(SearchFSM.browsing)
+    await state.update_data(search_query=query)
+    text, kb = await _render_results(user_id, query, 0)
+    await message.answer(text, reply_markup=kb)
+
+
+@router.message(Command("search"))
+async def search_cmd(message: Message, command: CommandObject, state: FSMContext):
+    """/search <words> — сразу ищет; без аргументов спрашивает запрос."""
+    query = (command.args or "").strip()
+    if not query:
+        await state.set_state(SearchFSM.waiting_query)
+        await message.answer("🔍 Send words to search in your archive, drafts and schedule.\n/cancel to abort.")
+        return
+    await _start_search(message, state, message.from_user.id, query)
+
+
+@router.callback_query(F.data == "search_start")
+async def search_start_cb(cb: CallbackQuery, state: FSMContext):
+    await state.set_state(SearchFSM.waiting_query)
+    await safe_edit(
+        cb.message,
+        "🔍 Send words to search in your archive, drafts and schedule.",
+        reply_markup=back_button("back_main"),
+    )
+    await cb.answer()
+
+
+@router.message(SearchFSM.waiting_query, F.text)
+async def search_receive_query(message: Message, state: FSMContext):
+    query = (message.text or "").strip()
+    if not query or query.startswith("/"):
+        await message.answer("Please send some words to search for, or /cancel.")
+        return
+    await _start_search(message, state, message.from_user.id, query)
+
+
+@router.callback_query(F.data.startswith("search_page:"))
+async def search_page_cb(cb: CallbackQuery, state: FSMContext):
+    try:
+        page = max(int(cb.data.split(":", 1)[1]), 0)
+    except (ValueError, IndexError):
+        await cb.answer("Invalid page.", show_alert=True); return
+
+    query = (await state.get_data()).get("search_query")
+    if not query:
+        await cb.answer("Search expired, please search again.", show_alert=True); return
+
+    text, kb = await _render_results(cb.from_user.id, query, page)
+    await safe_edit(cb.message, text, reply_markup=kb)
+    await cb.answer()
@@ -14,9 +14,10 @@ from aiogram.types import CallbackQuery, Message
 from sqlalchemy import select
 
 from app.database.models import async_session, BotSettings
-from app.keyboards import notify_menu
+from app.keyboards import notify_menu, tz_menu
 from app.services.safe_edit import safe_edit
 from app.services.scheduler import reload_schedule
+from app.services.row_cache import invalidate_bot_settings
 
 log = logging.getLogger(__name__)
 router = Router(name="timezone")
@@ -39,7 +40,7 @@ async def tz_menu_open(cb: CallbackQuery, state: FSMContext) -> None:
         cb.message,
         f"Your current time zone is: <b>{current_tz}</b>\n\n"
         "This affects when your scheduled posts are published.",
-        reply_markup=tz_menu_kb(current_tz)
+        reply_markup=tz_menu(current_tz)
     )
     await cb.answer()
 
@@ -79,6 +80,7 @@ async def tz_set_handler(message: Message, state: FSMContext) -> None:
         else:
             st.tz = tz_name
         await session.commit()
+    invalidate_bot_settings(user_id)
 
     # Перезагружаем планировщик с учётом нового TZ
     await reload_schedule()
@@ -0,0 +1,102 @@
+# app/services/ai_cache.py
+# ------------------------------------------------------------
+# Персистентный кеш ответов Gemini (таблица ai_cache).
+# • ключ — sha256 от модели, system prompt, нормализованного запроса и параметров;
+# • запись живёт AI_CACHE_TTL_HOURS, сверх AI_CACHE_MAX_ROWS вытесняются
+#   давно не использованные (LRU по last_used_at);
+# • кешируются только успешные ответы; «Regenerate» кеш обходит и перезаписывает.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, update, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.config import settings
+from app.database.models import async_session, AiCacheEntry
+
+log = logging.getLogger(__name__)
+
+_WS_RE = re.compile(r"\s+")
+
+
+def cache_enabled() -> bool:
+    return int(settings.AI_CACHE_TTL_HOURS or 0) > 0
+
+
+def normalize_prompt(value: str) -> str:
+    """Лишние пробелы/переводы строк не должны давать разные ключи."""
+    return _WS_RE.sub(" ", value or "").strip()
+
+
+def make_key(model: str, system_prompt: str, user_query: str, params: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        [model, normalize_prompt(system_prompt), normalize_prompt(user_query), params],
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def get_cached(key: str) -> Optional[str]:
+    """Ответ из кеша (если не протух); отмечает использование для LRU."""
+    if not cache_enabled():
+        return None
+    now = datetime.utcnow()
+    fresh_since = now - timedelta(hours=int(settings.AI_CACHE_TTL_HOURS))
+    async with async_session() as session:
+        response = (await session.execute(
+            select(AiCacheEntry.response)
+            .where(AiCacheEntry.key == key, AiCacheEntry.created_at >= fresh_since)
+        )).scalar_one_or_none()
+        if response is None:
+            return None
+        await session.execute(
+            update(AiCacheEntry)
+            .where(AiCacheEntry.key == key)
+            .values(last_used_at=now, hits=AiCacheEntry.hits + 1)
+        )
+        await session.commit()
+    return response
+
+
+async def put_cached(key: str, model: str, response: str) -> None:
+    if not cache_enabled():
+        return
+    now = datetime.utcnow()
+    stmt = sqlite_insert(AiCacheEntry.__table__).values(
+        key=key, model=model, response=response, created_at=now, last_used_at=now, hits=0,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["key"],
+        set_={"response": response, "model": model, "created_at": now, "last_used_at": now},
+    )
+    async with async_session() as session:
+        await session.execute(stmt)
+        await _evict(session, now)
+        await session.commit()
+
+
+async def _evict(session, now: datetime) -> None:
+    """Удаляет протухшие записи и всё, что не влезает в AI_CACHE_MAX_ROWS (по давности использования)."""
+    expired_before = now - timedelta(hours=int(settings.AI_CACHE_TTL_HOURS))
+    await session.execute(delete(AiCacheEntry).where(AiCacheEntry.created_at < expired_before))
+
+    max_rows = int(settings.AI_CACHE_MAX_ROWS or 0)
+    if max_rows <= 0:
+        return
+    overflow = (
+        select(AiCacheEntry.key)
+        .order_by(AiCacheEntry.last_used_at.desc())
+        .offset(max_rows)
+        .scalar_subquery()
+    )
+    res = await session.execute(delete(AiCacheEntry).where(AiCacheEntry.key.in_(overflow)))
+    if res.rowcount:
+        log.debug("ai_cache: evicted %s least recently used entr(ies)", res.rowcount)
@@ -0,0 +1,195 @@
+# app/services/archive_retention.py
+# ------------------------------------------------------------
+# Политика хранения архива.
+# • посты старше ARCHIVE_RETENTION_MONTHS переносятся из published_posts
+#   в сжатую таблицу published_posts_cold (пачками, вместе с последними метриками);
+# • горячая таблица остаётся маленькой, снимки метрик перенесённых постов удаляются;
+# • снимки метрик старше METRICS_SNAPSHOT_RAW_DAYS прореживаются до одного в сутки;
+# • в «тихий» час освобождаем место через PRAGMA incremental_vacuum;
+# • архив читает холодные посты прозрачно: отрицательный id -> published_posts_cold.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+import zlib
+from datetime import datetime
+from typing import Optional
+
+from dateutil.relativedelta import relativedelta
+from sqlalchemy import select, delete, func, and_, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database.models import (
+    async_session, async_engine, DATABASE_URL,
+    PublishedPost, PublishedPostCold, PostMetricsSnapshot,
+    SEARCH_FTS_TABLE, SEARCH_KIND_COLD_POST,
+)
+from app.services.search import fts_available
+from app.services.metrics_collector import compact_metrics_snapshots
+
+log = logging.getLogger(__name__)
+
+RETENTION_BATCH_SIZE = 500
+PREVIEW_LENGTH = 80
+
+
+def compress_text(value: Optional[str]) -> Optional[bytes]:
+    return zlib.compress(value.encode("utf-8"), 9) if value else None
+
+
+def decompress_text(value: Optional[bytes]) -> Optional[str]:
+    return zlib.decompress(value).decode("utf-8") if value else None
+
+
+def cold_to_post(cold: PublishedPostCold, *, full_text: bool = True) -> PublishedPost:
+    """
+    Холодная запись -> несвязанный с сессией PublishedPost с отрицательным id,
+    чтобы экраны архива работали с ней как с обычным постом.
+    """
+    return PublishedPost(
+        id=-cold.id,
+        tg_user_id=cold.tg_user_id,
+        account_id=cold.account_id,
+        threads_post_id=cold.threads_post_id,
+        text=decompress_text(cold.text_z) if full_text else cold.preview,
+        published_at=cold.published_at,
+        has_media=cold.has_media,
+    )
+
+
+async def get_archived_post(session: AsyncSession, post_id: int) -> Optional[PublishedPost]:
+    """Пост архива по id: положительный — горячая таблица, отрицательный — холодная."""
+    if post_id >= 0:
+        return await session.get(PublishedPost, post_id)
+    cold = await session.get(PublishedPostCold, -post_id)
+    return cold_to_post(cold) if cold else None
+
+
+async def archive_old_posts(now: Optional[datetime] = None) -> int:
+    """Переносит посты старше срока хранения в холодную таблицу. Возвращает кол-во перенесённых."""
+    months = int(settings.ARCHIVE_RETENTION_MONTHS or 0)
+    if months <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - relativedelta(months=months)
+    with_fts = await fts_available()
+    moved = 0
+
+    while True:
+        async with async_session() as session:
+            posts = (await session.execute(
+                select(PublishedPost)
+                .where(PublishedPost.published_at < cutoff)
+                .order_by(PublishedPost.id)
+                .limit(RETENTION_BATCH_SIZE)
+            )).scalars().all()
+            if not posts:
+                break
+            ids = [p.id for p in posts]
+
+            # Последний снимок метрик каждого поста
+            last = (
+                select(PostMetricsSnapshot.post_id, func.max(PostMetricsSnapshot.taken_at).label("last_at"))
+                .where(PostMetricsSnapshot.post_id.in_(ids))
+                .group_by(PostMetricsSnapshot.post_id)
+                .subquery()
+            )
+            metrics = {
+                pid: (likes, replies, taken_at)
+                for pid, likes, replies, taken_at in (await session.execute(
+                    select(PostMetricsSnapshot.post_id, PostMetricsSnapshot.likes,
+                           PostMetricsSnapshot.replies, PostMetricsSnapshot.taken_at)
+                    .join(last, and_(PostMetricsSnapshot.post_id == last.c.post_id,
+                                     PostMetricsSnapshot.taken_at == last.c.last_at))
+                )).all()
+            }
+
+            archived_at = datetime.utcnow()
+            cold_rows = []
+            for p in posts:
+                likes, replies, metrics_at = metrics.get(p.id, (None, None, None))
+                cold_rows.append({
+                    "original_id": p.id,
+                    "tg_user_id": p.tg_user_id,
+                    "account_id": p.account_id,
+                    "threads_post_id": p.threads_post_id,
+                    "text_z": compress_text(p.text),
+                    "preview": (p.text or "")[:PREVIEW_LENGTH] or None,
+                    "published_at": p.published_at,
+                    "has_media": p.has_media,
+                    "likes": likes,
+                    "replies": replies,
+                    "metrics_at": metrics_at,
+                    "archived_at": archived_at,
+                })
+            # Повторный перенос (или дубль по threads_post_id) просто пропускается
+            await session.execute(sqlite_insert(PublishedPostCold.__table__).on_conflict_do_nothing(), cold_rows)
+
+            if with_fts:
+                texts = {p.id: p.text or "" for p in posts}
+                cold_ids = (await session.execute(
+                    select(PublishedPostCold.id, PublishedPostCold.original_id, PublishedPostCold.tg_user_id)
+                    .where(PublishedPostCold.original_id.in_(ids))
+                )).all()
+                await session.execute(
+                    text(f"INSERT OR REPLACE INTO {SEARCH_FTS_TABLE}(rowid, text, tg_user_id) VALUES (:rowid, :text, :uid)"),
+                    [{"rowid": cid * 4 + SEARCH_KIND_COLD_POST, "text": texts[oid], "uid": uid}
+                     for cid, oid, uid in cold_ids],
+                )
+
+            # Горячие строки удаляются; FTS-триггер published_posts уберёт их из индекса
+            await session.execute(delete(PostMetricsSnapshot).where(PostMetricsSnapshot.post_id.in_(ids)))
+            await session.execute(delete(PublishedPost).where(PublishedPost.id.in_(ids)))
+            await session.commit()
+        moved += len(ids)
+
+    if moved:
+        log.info("archive_retention: moved %s post(s) older than %s to cold storage", moved, cutoff)
+    return moved
+
+
+async def incremental_vacuum(pages: Optional[int] = None) -> None:
+    """
+    Возвращает ОС освободившиеся страницы SQLite-файла.
+    Если база ещё не в режиме auto_vacuum=INCREMENTAL, один раз переводит её (полный VACUUM).
+    """
+    if not DATABASE_URL.startswith("sqlite"):
+        return
+    pages = int(pages if pages is not None else settings.ARCHIVE_VACUUM_PAGES)
+
+    async with async_engine.connect() as conn:
+        # VACUUM нельзя выполнять внутри транзакции
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        mode = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+        if mode != 2:  # 2 == INCREMENTAL
+            log.info("archive_retention: switching database to auto_vacuum=INCREMENTAL (one-time VACUUM)")
+            await conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            await conn.execute(text("VACUUM"))
+        free_before = (await conn.execute(text("PRAGMA freelist_count"))).scalar()
+        res = await conn.execute(text(f"PRAGMA incremental_vacuum({max(pages, 0)})"))
+        if res.returns_rows:
+            res.fetchall()  # pysqlite выполняет прагму по шагам — дочитываем до конца
+        free_after = (await conn.execute(text("PRAGMA freelist_count"))).scalar()
+    log.info("archive_retention: incremental_vacuum freed %s page(s)", (free_before or 0) - (free_after or 0))
+
+
+async def run_archive_maintenance() -> int:
+    """
+    Вызывается планировщиком в «тихий» час: перенос старых постов, прореживание
+    снимков метрик, incremental VACUUM (при включённом холодном архиве — всегда,
+    иначе — если что-то удалено).
+    """
+    moved = await archive_old_posts()
+    try:
+        compacted = await compact_metrics_snapshots()
+    except Exception as e:
+        log.warning("archive_retention: snapshot compaction failed: %s", e)
+        compacted = 0
+    if moved or compacted or int(settings.ARCHIVE_RETENTION_MONTHS or 0) > 0:
+        try:
+            await incremental_vacuum()
+        except Exception as e:
+            log.warning("archive_retention: vacuum failed: %s", e)
+    return moved
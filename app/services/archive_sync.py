@@ -0,0 +1,160 @@
+# app/services/archive_sync.py
+# ------------------------------------------------------------
+# Полная синхронизация архива с Threads (/me/threads).
+# • обходим все страницы ленты аккаунта (новые -> старые);
+# • останавливаемся на отметке прошлой синхронизации (Account.archive_synced_until);
+# • пишем пачками через upsert по (account_id, threads_post_id) —
+#   уже известные посты просто пропускаются.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, Optional
+
+from dateutil import parser
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from app.database.models import async_session, Account, PublishedPost, PublishedPostCold
+from app.services.threads_client import get_user_media
+from app.services.row_cache import invalidate_account
+
+log = logging.getLogger(__name__)
+
+SYNC_PAGE_LIMIT = 100     # максимум, который отдаёт /me/threads за раз
+UPSERT_BATCH_SIZE = 200
+MAX_PAGES_PER_RUN = 500   # страховка от бесконечного курсора
+
+MEDIA_TYPES_WITH_MEDIA = ("IMAGE", "VIDEO", "CAROUSEL", "CAROUSEL_ALBUM")
+
+
+def _parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """ISO-время из API -> naive UTC (как остальные даты в БД)."""
+    if not value:
+        return None
+    try:
+        dt = parser.parse(value)
+    except (ValueError, OverflowError):
+        log.warning("archive_sync: could not parse timestamp %r", value)
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+
+def post_row(post: Dict[str, Any], tg_user_id: int, account_id: int) -> Dict[str, Any]:
+    """Пост из ответа /me/threads -> словарь для вставки в published_posts."""
+    return {
+        "tg_user_id": tg_user_id,
+        "account_id": account_id,
+        "threads_post_id": str(post.get("id")),
+        "text": post.get("text"),
+        "published_at": _parse_timestamp(post.get("timestamp")) or datetime.utcnow(),
+        "has_media": post.get("media_type") in MEDIA_TYPES_WITH_MEDIA,
+    }
+
+
+async def upsert_posts(rows: Iterable[Dict[str, Any]]) -> int:
+    """
+    Вставляет посты, пропуская уже существующие (в том числе перенесённые
+    в холодный архив). Возвращает кол-во новых строк.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    stmt = sqlite_insert(PublishedPost.__table__).on_conflict_do_nothing(
+        index_elements=["account_id", "threads_post_id"]
+    )
+    async with async_session() as session:
+        cold = set((await session.execute(
+            select(PublishedPostCold.account_id, PublishedPostCold.threads_post_id)
+            .where(
+                PublishedPostCold.account_id.in_({r["account_id"] for r in rows}),
+                PublishedPostCold.threads_post_id.in_({r["threads_post_id"] for r in rows}),
+            )
+        )).all())
+        rows = [r for r in rows if (r["account_id"], r["threads_post_id"]) not in cold]
+        if not rows:
+            return 0
+        res = await session.execute(stmt, rows)
+        await session.commit()
+    return max(res.rowcount or 0, 0)
+
+
+async def sync_account_archive(account_id: int) -> int:
+    """
+    Догружает в архив все посты аккаунта, опубликованные после прошлой синхронизации
+    (при первом запуске — всю историю). Возвращает кол-во новых постов.
+    Ошибки Threads API пробрасываются; отметка синхронизации двигается только при успехе,
+    поэтому прерванный обход просто повторится (upsert идемпотентен).
+    """
+    async with async_session() as session:
+        acc = await session.get(Account, account_id)
+        if not acc or not acc.access_token:
+            return 0
+        tg_user_id, token, synced_until = acc.tg_user_id, acc.access_token, acc.archive_synced_until
+
+    # since — грубый фильтр на стороне API; точная граница проверяется ниже
+    since = int(synced_until.replace(tzinfo=timezone.utc).timestamp()) if synced_until else None
+    newest = synced_until
+    imported = 0
+    batch: list[Dict[str, Any]] = []
+    after: Optional[str] = None
+    complete = False
+
+    for _ in range(MAX_PAGES_PER_RUN):
+        page = await get_user_media(token, limit=SYNC_PAGE_LIMIT, after=after, since=since)
+        reached_mark = False
+        for post in page.get("data", []):
+            row = post_row(post, tg_user_id, account_id)
+            ts = row["published_at"]
+            # Посты с тем же временем, что и отметка, перечитываем — upsert их отбросит
+            if synced_until and ts < synced_until:
+                reached_mark = True
+                break
+            batch.append(row)
+            if newest is None or ts > newest:
+                newest = ts
+            if len(batch) >= UPSERT_BATCH_SIZE:
+                imported += await upsert_posts(batch)
+                batch = []
+
+        after = ((page.get("paging") or {}).get("cursors") or {}).get("after")
+        # Пустая страница или нет курсора — дошли до конца ленты
+        if reached_mark or not after or not page.get("data"):
+            complete = True
+            break
+    else:
+        # Отметку не двигаем: иначе следующий запуск остановится на новых постах и не дойдёт до старых
+        log.warning("archive_sync: account %s hit MAX_PAGES_PER_RUN, will rescan next run", account_id)
+
+    imported += await upsert_posts(batch)
+
+    if complete and newest != synced_until:
+        async with async_session() as session:
+            acc = await session.get(Account, account_id)
+            if acc:
+                acc.archive_synced_until = newest
+                await session.commit()
+        invalidate_account(account_id)
+
+    log.info("archive_sync: account %s -> %s new post(s), synced until %s", account_id, imported, newest)
+    return imported
+
+
+async def sync_all_archives() -> int:
+    """Вызывается планировщиком: синхронизирует архив всех аккаунтов по очереди."""
+    async with async_session() as session:
+        account_ids = (await session.execute(select(Account.id).order_by(Account.id))).scalars().all()
+
+    total = 0
+    for account_id in account_ids:
+        try:
+            total += await sync_account_archive(account_id)
+        except Exception as e:
+            log.warning("archive_sync: account %s failed: %s", account_id, e)
+        await asyncio.sleep(0.5)  # не долбим API подряд
+    return total
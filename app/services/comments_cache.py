@@ -0,0 +1,125 @@
+# app/services/comments_cache.py
+# ------------------------------------------------------------
+# Кеш страниц комментариев (replies) для архива.
+# Ключ — (post_id, cursor, limit), запись живёт COMMENTS_CACHE_TTL_SECONDS.
+# Пока пользователь читает страницу, следующая подгружается в фоне,
+# поэтому листание вперёд/назад обычно не ходит в Threads.
+# Здесь же живут черновики ИИ-ответов, сгенерированные пачкой на страницу.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set, Tuple
+
+from cachetools import TTLCache
+
+from app.config import settings
+from app.services.threads_client import get_post_comments
+
+log = logging.getLogger(__name__)
+
+_PageKey = Tuple[str, str, int]
+
+_pages: TTLCache = TTLCache(maxsize=2_000, ttl=max(1, settings.COMMENTS_CACHE_TTL_SECONDS))
+# Запросы «в полёте»: обычный показ и префетч одной страницы не дублируют друг друга
+_inflight: Dict[_PageKey, asyncio.Task] = {}
+# (post_id, comment_id) -> черновик ответа от ИИ
+REPLY_DRAFT_TTL_SECONDS = 3600
+_reply_drafts: TTLCache = TTLCache(maxsize=5_000, ttl=REPLY_DRAFT_TTL_SECONDS)
+
+
+def _key(post_id: str, after: Optional[str], limit: int) -> _PageKey:
+    return str(post_id), after or "", int(limit)
+
+
+def next_cursor(page: Dict[str, Any]) -> Optional[str]:
+    return ((page.get("paging") or {}).get("cursors") or {}).get("after")
+
+
+async def _load(access_token: str, key: _PageKey) -> Dict[str, Any]:
+    post_id, after, limit = key
+    data = await get_post_comments(access_token, post_id, limit=limit, after=after or None)
+    _pages[key] = data
+    return data
+
+
+def _start_load(access_token: str, key: _PageKey) -> asyncio.Task:
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.create_task(_load(access_token, key))
+        _inflight[key] = task
+        task.add_done_callback(lambda _t, k=key: _inflight.pop(k, None))
+    return task
+
+
+async def get_comments_page(
+    access_token: str,
+    post_id: str,
+    *,
+    limit: int,
+    after: Optional[str] = None,
+    force: bool = False,
+) -> Dict[str, Any]:
+    """Страница комментариев: из кеша, из уже идущего запроса или из API."""
+    key = _key(post_id, after, limit)
+    if not force:
+        cached = _pages.get(key)
+        if cached is not None:
+            return cached
+    # shield: если хендлер отменят, загрузка всё равно долетит до кеша
+    return await asyncio.shield(_start_load(access_token, key))
+
+
+def prefetch_next_page(access_token: str, post_id: str, *, limit: int, page: Dict[str, Any]) -> None:
+    """Фоновая подгрузка страницы, следующей за `page` (если она есть и ещё не в кеше)."""
+    after = next_cursor(page)
+    if not after:
+        return
+    key = _key(post_id, after, limit)
+    if key in _pages or key in _inflight:
+        return
+
+    def _log_failure(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            log.debug("comments prefetch failed for post %s: %s", post_id, task.exception())
+
+    _start_load(access_token, key).add_done_callback(_log_failure)
+
+
+def find_comment(post_id: str, comment_id: str) -> Optional[Dict[str, Any]]:
+    """Ищет комментарий среди закешированных страниц поста."""
+    post_id = str(post_id)
+    for (pid, _, _), page in list(_pages.items()):
+        if pid != post_id:
+            continue
+        for comment in page.get("data", []):
+            if comment.get("id") == comment_id:
+                return comment
+    return None
+
+
+def invalidate_post(post_id: str) -> None:
+    """Сбросить все страницы поста (например, после публикации ответа)."""
+    post_id = str(post_id)
+    for key in [k for k in list(_pages.keys()) if k[0] == post_id]:
+        _pages.pop(key, None)
+
+
+def remember_reply_drafts(post_id: str, drafts: Dict[str, str]) -> None:
+    for comment_id, reply in drafts.items():
+        _reply_drafts[(str(post_id), comment_id)] = reply
+
+
+def get_reply_draft(post_id: str, comment_id: str) -> Optional[str]:
+    return _reply_drafts.get((str(post_id), comment_id))
+
+
+def drafted_comment_ids(post_id: str) -> Set[str]:
+    post_id = str(post_id)
+    return {cid for pid, cid in list(_reply_drafts.keys()) if pid == post_id}
+
+
+def forget_reply_draft(post_id: str, comment_id: str) -> None:
+    _reply_drafts.pop((str(post_id), comment_id), None)
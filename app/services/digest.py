@@ -0,0 +1,127 @@
+# app/services/digest.py
+# ------------------------------------------------------------
+# Сводки (digest) об успешных публикациях.
+# BotSettings.digest_mode:
+#   'off'    — каждое «published» уходит сразу (как раньше);
+#   'hourly' — копим в digest_items, раз в час отправляем одной сводкой;
+#   'daily'  — раз в сутки, в DIGEST_DAILY_HOUR по часовому поясу пользователя.
+# Ошибки публикации в сводку не попадают — они отправляются сразу через notify_user.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import select, delete
+
+from app.config import settings
+from app.database.models import async_session, DigestItem
+from app.services.notifications import notify_user
+from app.services.row_cache import get_bot_settings
+
+log = logging.getLogger(__name__)
+
+DIGEST_MODES = ("off", "hourly", "daily")
+DIGEST_OFF, DIGEST_HOURLY, DIGEST_DAILY = DIGEST_MODES
+# Страховка: сводку не держим дольше суток, даже если часовой пояс/час не совпали
+DIGEST_MAX_AGE = timedelta(hours=25)
+
+
+def digest_mode_of(st) -> str:
+    mode = getattr(st, "digest_mode", None) if st else None
+    return mode if mode in DIGEST_MODES else DIGEST_OFF
+
+
+async def notify_publish_success(tg_user_id: int, text: str, digest_line: Optional[str] = None) -> None:
+    """
+    Уведомление об успешной публикации: сразу или в сводку — по настройке пользователя.
+    text и digest_line — HTML, пользовательский текст в них уже экранирован.
+    digest_line — короткая строка для сводки (по умолчанию первая строка text).
+    """
+    st = await get_bot_settings(tg_user_id)
+    if digest_mode_of(st) == DIGEST_OFF:
+        await notify_user(tg_user_id, text)
+        return
+
+    line = digest_line or text.splitlines()[0]
+    async with async_session() as session:
+        session.add(DigestItem(tg_user_id=tg_user_id, text=line))
+        await session.commit()
+
+
+def _format_digest(items: List[DigestItem]) -> str:
+    lines = [f"🗞 Digest: {len(items)} post(s) published"]
+    lines.extend(f"• {item.text}" for item in items)
+    return "\n".join(lines)
+
+
+def _is_due(mode: str, tz_name: Optional[str], oldest: datetime, now_utc: datetime) -> bool:
+    if mode == DIGEST_OFF:
+        return True  # режим выключили — досылаем накопленное
+    if mode == DIGEST_HOURLY:
+        return True
+    if now_utc - oldest >= DIGEST_MAX_AGE:
+        return True
+    try:
+        tz = ZoneInfo(tz_name or "Europe/Berlin")
+    except Exception:
+        tz = ZoneInfo("Europe/Berlin")
+    local_hour = now_utc.replace(tzinfo=ZoneInfo("UTC")).astimezone(tz).hour
+    return local_hour == int(settings.DIGEST_DAILY_HOUR) % 24
+
+
+async def flush_user_digest(tg_user_id: int) -> int:
+    """
+    Отправить накопленную сводку пользователя немедленно. Возвращает кол-во пунктов.
+    Пункты удаляются только после того, как сводка принята в очередь отправки;
+    иначе они остаются до следующего запуска.
+    """
+    async with async_session() as session:
+        items = (await session.execute(
+            select(DigestItem).where(DigestItem.tg_user_id == tg_user_id).order_by(DigestItem.id)
+        )).scalars().all()
+    if not items:
+        return 0
+
+    if not await notify_user(tg_user_id, _format_digest(items)):
+        log.warning("digest: digest for user=%s not queued, keeping %s item(s)", tg_user_id, len(items))
+        return 0
+
+    async with async_session() as session:
+        await session.execute(delete(DigestItem).where(DigestItem.id.in_([i.id for i in items])))
+        await session.commit()
+    return len(items)
+
+
+async def flush_digests() -> int:
+    """
+    Вызывается планировщиком раз в час: отправляет сводки тем, у кого подошёл срок.
+    Возвращает кол-во отправленных сводок.
+    """
+    now_utc = datetime.utcnow()
+    async with async_session() as session:
+        items = (await session.execute(select(DigestItem).order_by(DigestItem.id))).scalars().all()
+
+    by_user: Dict[int, List[DigestItem]] = defaultdict(list)
+    for item in items:
+        by_user[item.tg_user_id].append(item)
+
+    sent = 0
+    for tg_user_id, user_items in by_user.items():
+        st = await get_bot_settings(tg_user_id)
+        mode = digest_mode_of(st)
+        if not _is_due(mode, getattr(st, "tz", None), user_items[0].created_at, now_utc):
+            continue
+        try:
+            if await flush_user_digest(tg_user_id):
+                sent += 1
+        except Exception as e:
+            log.warning("digest: flush failed for user=%s: %s", tg_user_id, e)
+
+    if sent:
+        log.info("digest: sent %s digest(s)", sent)
+    return sent
@@ -0,0 +1,165 @@
+# app/services/local_hashtags.py
+# ------------------------------------------------------------
+# Локальный подбор хэштегов без обращения к Gemini.
+# Индекс строится только по текстам, которые написал сам пользователь
+# (published_posts.text + drafts.text). drafts.suggested_hashtags в индекс не идут:
+# туда пишутся и наши же подсказки, и движок учился бы на собственном выводе.
+# • TF-IDF — ключевые слова текста, редкие для корпуса, весят больше;
+# • совместная встречаемость слово -> хэштег — какие теги пользователь
+#   уже ставил рядом с этими словами.
+# Индекс живёт INDEX_TTL_SECONDS, новые посты/черновики попадают в него после истечения.
+# Ответ за миллисекунды: используется как мгновенная подсказка и как запасной
+# вариант, если ИИ недоступен / упёрся в лимит.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Tuple
+
+from cachetools import TTLCache
+from sqlalchemy import select
+
+from app.database.models import async_session, PublishedPost, Draft
+
+log = logging.getLogger(__name__)
+
+CORPUS_LIMIT = 2000            # последних постов/черновиков в индексе
+INDEX_TTL_SECONDS = 600
+DEFAULT_LIMIT = 8
+TOP_TERMS = 12                 # сколько ключевых слов текста учитывать
+
+_HASHTAG_RE = re.compile(r"#(\w+)")
+_WORD_RE = re.compile(r"[^\W\d_]\w{2,}")
+
+_STOPWORDS = frozenset("""
+the and for with that this from your you are was were have has had not but all any can its our out
+just about into than then them they what when where which who will would there their been more most
+some such only also very how why let get got one two new now here over
+это как что так его она они оно для или при про над под без уже еще ещё все всё вот быть был была были
+если чтобы когда где кто мне меня мой моя мои наш наша наши ваш ваша ваши тут там даже только очень
+""".split())
+
+
+@dataclass
+class _UserIndex:
+    docs: int = 0
+    df: Counter = field(default_factory=Counter)                   # слово -> в скольких документах
+    tags: Counter = field(default_factory=Counter)                 # хэштег -> сколько раз использован
+    cooc: Dict[str, Counter] = field(default_factory=lambda: defaultdict(Counter))  # слово -> хэштеги рядом
+    tag_case: Dict[str, str] = field(default_factory=dict)         # нижний регистр -> как писал пользователь
+
+
+_indexes: TTLCache = TTLCache(maxsize=1000, ttl=INDEX_TTL_SECONDS)
+
+
+def _split(text: str) -> Tuple[List[str], List[str]]:
+    """Текст -> (слова без стоп-слов, хэштеги без '#')."""
+    tags = _HASHTAG_RE.findall(text or "")
+    body = _HASHTAG_RE.sub(" ", text or "").lower()
+    words = [w for w in _WORD_RE.findall(body) if w not in _STOPWORDS]
+    return words, tags
+
+
+def build_index(documents: Iterable[str]) -> _UserIndex:
+    index = _UserIndex()
+    for doc in documents:
+        words, tags = _split(doc)
+        if not words and not tags:
+            continue
+        index.docs += 1
+        unique_words = set(words)
+        index.df.update(unique_words)
+        lowered_tags = set()
+        for tag in tags:
+            low = tag.lower()
+            index.tag_case.setdefault(low, tag)
+            lowered_tags.add(low)
+        index.tags.update(lowered_tags)
+        for word in unique_words:
+            index.cooc[word].update(lowered_tags)
+    return index
+
+
+async def _load_corpus(tg_user_id: int) -> List[str]:
+    async with async_session() as session:
+        posts = (await session.execute(
+            select(PublishedPost.text)
+            .where(PublishedPost.tg_user_id == tg_user_id, PublishedPost.text.is_not(None))
+            .order_by(PublishedPost.published_at.desc())
+            .limit(CORPUS_LIMIT)
+        )).scalars().all()
+        drafts = (await session.execute(
+            select(Draft.text)
+            .where(Draft.tg_user_id == tg_user_id, Draft.text.is_not(None))
+            .order_by(Draft.id.desc())
+            .limit(CORPUS_LIMIT)
+        )).scalars().all()
+    return list(posts) + list(drafts)
+
+
+async def get_index(tg_user_id: int) -> _UserIndex:
+    index = _indexes.get(tg_user_id)
+    if index is None:
+        index = build_index(await _load_corpus(tg_user_id))
+        _indexes[tg_user_id] = index
+        log.debug("local_hashtags: built index for user=%s (%s docs)", tg_user_id, index.docs)
+    return index
+
+
+def rank_hashtags(index: _UserIndex, text: str, limit: int = DEFAULT_LIMIT) -> List[str]:
+    """
+    Сначала — хэштеги, которые пользователь ставил рядом с ключевыми словами текста
+    (вес слова TF-IDF * P(тег | слово)); оставшиеся места — сами ключевые слова как теги.
+    """
+    words, present = _split(text)
+    if not words:
+        return []
+    already = {t.lower() for t in present}
+
+    tf = Counter(words)
+    term_scores = {
+        w: count * (math.log((index.docs + 1) / (index.df.get(w, 0) + 1)) + 1.0)
+        for w, count in tf.items()
+    }
+    top_terms = sorted(term_scores.items(), key=lambda kv: (-kv[1], kv[0]))[:TOP_TERMS]
+
+    tag_scores: Counter = Counter()
+    for word, score in top_terms:
+        seen_in = index.df.get(word, 0)
+        if not seen_in:
+            continue
+        for tag, together in index.cooc.get(word, {}).items():
+            tag_scores[tag] += score * together / seen_in
+
+    result: List[str] = []
+    taken = set(already)
+    for tag, _ in sorted(tag_scores.items(), key=lambda kv: (-kv[1], -index.tags[kv[0]], kv[0])):
+        if tag not in taken:
+            result.append("#" + index.tag_case.get(tag, tag))
+            taken.add(tag)
+        if len(result) >= limit:
+            return result
+    for word, _ in top_terms:
+        if word not in taken:
+            result.append("#" + word)
+            taken.add(word)
+        if len(result) >= limit:
+            break
+    return result
+
+
+async def suggest_local_hashtags(tg_user_id: int, text: str, limit: int = DEFAULT_LIMIT) -> str:
+    """Хэштеги через пробел (формат как у ai_assistant.suggest_hashtags); "" если нечего предложить."""
+    if not text:
+        return ""
+    try:
+        index = await get_index(tg_user_id)
+    except Exception as e:
+        log.warning("local_hashtags: failed to build index for user=%s: %s", tg_user_id, e)
+        index = build_index([])
+    return " ".join(rank_hashtags(index, text, limit))
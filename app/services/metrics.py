@@ -0,0 +1,151 @@
+# app/services/metrics.py
+# ------------------------------------------------------------
+# Статистика постов Threads для архива.
+# • короткий TTL-кеш, чтобы повторные нажатия не били в API;
+# • пакетная загрузка по многим threads_post_id с ограничением параллелизма;
+# • запоминаем поля, которых нет в режиме приложения аккаунта
+#   (например like_count в dev mode), и больше их не запрашиваем.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Set, Tuple
+
+from cachetools import TTLCache
+
+from app.config import settings
+from app.services.threads_client import ThreadsError, ThreadsAPIError, get_post_fields
+
+log = logging.getLogger(__name__)
+
+# Поле API -> ключ в нашем словаре метрик
+METRIC_FIELDS: Dict[str, str] = {"like_count": "likes", "replies_count": "replies"}
+
+_NONEXISTING_FIELD_RE = re.compile(r"nonexisting field \((?P<field>\w+)\)")
+
+# post_id -> метрики
+_cache: TTLCache = TTLCache(maxsize=10_000, ttl=max(1, settings.METRICS_CACHE_TTL_SECONDS))
+# account_id -> поля, которые API отверг для этого аккаунта
+_unsupported_fields: Dict[int, Set[str]] = defaultdict(set)
+# Общий лимит одновременных запросов к Threads со стороны сервиса метрик
+_semaphore = asyncio.Semaphore(max(1, settings.METRICS_CONCURRENCY))
+
+
+def _empty_metrics(post_id: str) -> Dict[str, Any]:
+    return {"id": post_id, "likes": "N/A", "replies": "N/A"}
+
+
+async def _fetch_one(account_id: int, access_token: str, post_id: str) -> Tuple[Dict[str, Any], bool]:
+    """
+    Один запрос (или несколько, если API отверг поле) без кеша.
+    Возвращает (метрики, полные ли они). Если поле отверглось в этом же вызове и
+    упал fallback-запрос — как и раньше, отдаём частичный результат с N/A, а не ошибку.
+    Любая другая ошибка (токен, 5xx, сеть) пробрасывается.
+    """
+    metrics = _empty_metrics(post_id)
+    skip = _unsupported_fields[account_id]
+    fields = [f for f in METRIC_FIELDS if f not in skip]
+    dropped_field = False
+
+    while fields:
+        try:
+            async with _semaphore:
+                data = await get_post_fields(access_token, post_id, ["id", *fields])
+        except Exception as e:
+            m = _NONEXISTING_FIELD_RE.search(e.message or "") if isinstance(e, ThreadsAPIError) else None
+            field = m.group("field") if m else None
+            if field in fields:
+                # Запоминаем для аккаунта — fallback-запрос больше не понадобится
+                log.info("metrics: field %s is unsupported for account %s, skipping it from now on",
+                         field, account_id)
+                skip.add(field)
+                fields.remove(field)
+                dropped_field = True
+                continue
+            if dropped_field:
+                log.warning("metrics: fallback request failed for post %s: %s", post_id, e)
+                return metrics, False
+            raise
+
+        for f in fields:
+            if f in data:
+                metrics[METRIC_FIELDS[f]] = data[f]
+        break
+
+    return metrics, True
+
+
+async def get_metrics(account_id: int, access_token: str, post_id: str, *, force: bool = False) -> Dict[str, Any]:
+    """
+    Метрики одного поста (likes / replies). Берёт из кеша, если он свежий.
+    Ошибки API пробрасываются (ThreadsAPIError / ThreadsError); если упал только
+    fallback-запрос — частичный результат с N/A (он не кешируется).
+    """
+    if not force:
+        cached = _cache.get(post_id)
+        if cached is not None:
+            return dict(cached)
+
+    try:
+        metrics, complete = await _fetch_one(account_id, access_token, post_id)
+    except ThreadsError:
+        raise
+    except Exception as e:
+        log.exception("metrics: unexpected error for post %s: %s", post_id, e)
+        raise ThreadsError(f"Unexpected error getting metrics: {e}") from e
+
+    if complete:
+        _cache[post_id] = metrics
+    return dict(metrics)
+
+
+async def get_metrics_batch(
+    account_id: int,
+    access_token: str,
+    post_ids: Iterable[str],
+    *,
+    force: bool = False,
+    complete_only: bool = False,
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Метрики для многих постов одного аккаунта.
+    Параллельность ограничена METRICS_CONCURRENCY; посты, для которых
+    запрос упал, в результат не попадают (ошибка пишется в лог).
+    complete_only=True — частичные результаты (упал fallback-запрос) тоже отбрасываются.
+    """
+    result: Dict[str, Dict[str, Any]] = {}
+    missing: list[str] = []
+    for pid in dict.fromkeys(str(p) for p in post_ids):
+        cached = None if force else _cache.get(pid)
+        if cached is not None:
+            result[pid] = dict(cached)
+        else:
+            missing.append(pid)
+
+    async def _one(pid: str) -> None:
+        try:
+            metrics, complete = await _fetch_one(account_id, access_token, pid)
+        except Exception as e:
+            log.warning("metrics: batch lookup failed for post %s (account %s): %s", pid, account_id, e)
+            return
+        if complete:
+            _cache[pid] = metrics
+        elif complete_only:
+            return
+        result[pid] = dict(metrics)
+
+    if missing:
+        cached_count = len(result)
+        await asyncio.gather(*(_one(pid) for pid in missing))
+        log.debug("metrics: batch account=%s cached=%s requested=%s ok=%s",
+                  account_id, cached_count, len(missing), len(result) - cached_count)
+    return result
+
+
+def invalidate(post_id: str) -> None:
+    """Сбросить кеш метрик поста."""
+    _cache.pop(str(post_id), None)
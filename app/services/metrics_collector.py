@@ -0,0 +1,222 @@
+# app/services/metrics_collector.py
+# ------------------------------------------------------------
+# Фоновый сборщик снимков статистики (likes / replies) для архива.
+# Частота адаптивная: свежие посты опрашиваем часто, старые — редко,
+# совсем старые (старше SNAPSHOT_MAX_AGE) — не опрашиваем вовсе.
+# Архив читает последний снимок вместо живого запроса к Threads.
+# Хранение: снимки старше METRICS_SNAPSHOT_RAW_DAYS прореживаются до последнего
+# за сутки (последний снимок поста всегда остаётся) — в «тихий» час обслуживания.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, func, insert, delete
+
+from app.config import settings
+from app.database.models import async_session, Account, PublishedPost, PublishedPostCold, PostMetricsSnapshot
+from app.services.metrics import get_metrics_batch
+
+log = logging.getLogger(__name__)
+
+# (возраст поста меньше X) -> (снимок не чаще, чем раз в Y)
+SNAPSHOT_CADENCE: list[tuple[timedelta, timedelta]] = [
+    (timedelta(days=1), timedelta(minutes=15)),
+    (timedelta(days=3), timedelta(hours=1)),
+    (timedelta(days=7), timedelta(hours=6)),
+    (timedelta(days=30), timedelta(days=1)),
+]
+SNAPSHOT_MAX_AGE = SNAPSHOT_CADENCE[-1][0]
+# Для постов старше SNAPSHOT_MAX_AGE снимок, сделанный по запросу, считается свежим сутки
+STALE_AFTER_FOR_OLD_POSTS = timedelta(days=1)
+
+MAX_SNAPSHOTS_PER_RUN = 500
+COMPACT_BATCH_SIZE = 5000
+
+
+def snapshot_interval(age: timedelta) -> timedelta:
+    """Через сколько снимок поста такого возраста считается устаревшим."""
+    for max_age, interval in SNAPSHOT_CADENCE:
+        if age < max_age:
+            return interval
+    return STALE_AFTER_FOR_OLD_POSTS
+
+
+def is_snapshot_fresh(snapshot: Optional[PostMetricsSnapshot], published_at: datetime,
+                      now: Optional[datetime] = None) -> bool:
+    if snapshot is None:
+        return False
+    now = now or datetime.utcnow()
+    return now - snapshot.taken_at < snapshot_interval(now - published_at)
+
+
+def _as_int(value: Any) -> Optional[int]:
+    """"N/A" и прочее нечисловое храним как NULL."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _cold_snapshot(cold: PublishedPostCold) -> Optional[PostMetricsSnapshot]:
+    """Метрики холодного поста хранятся в самой записи — отдаём их как несохранённый снимок."""
+    if cold.metrics_at is None:
+        return None
+    return PostMetricsSnapshot(post_id=-cold.id, taken_at=cold.metrics_at, likes=cold.likes, replies=cold.replies)
+
+
+async def latest_snapshot(post_id: int) -> Optional[PostMetricsSnapshot]:
+    """Последний снимок поста (отрицательный id — пост из холодного архива)."""
+    if post_id < 0:
+        async with async_session() as session:
+            cold = await session.get(PublishedPostCold, -post_id)
+        return _cold_snapshot(cold) if cold else None
+
+    async with async_session() as session:
+        return (await session.execute(
+            select(PostMetricsSnapshot)
+            .where(PostMetricsSnapshot.post_id == post_id)
+            .order_by(PostMetricsSnapshot.taken_at.desc())
+            .limit(1)
+        )).scalars().first()
+
+
+async def record_snapshot(post_id: int, metrics: Dict[str, Any]) -> PostMetricsSnapshot:
+    """
+    Сохраняет снимок из словаря метрик (формат app.services.metrics).
+    Для холодного поста (отрицательный id) временной ряд не ведём — обновляем последние значения.
+    """
+    snap = PostMetricsSnapshot(
+        post_id=post_id,
+        taken_at=datetime.utcnow(),
+        likes=_as_int(metrics.get("likes")),
+        replies=_as_int(metrics.get("replies")),
+    )
+    if post_id < 0:
+        async with async_session() as session:
+            cold = await session.get(PublishedPostCold, -post_id)
+            if cold:
+                cold.likes, cold.replies, cold.metrics_at = snap.likes, snap.replies, snap.taken_at
+                await session.commit()
+        return snap
+
+    async with async_session() as session:
+        session.add(snap)
+        await session.commit()
+    return snap
+
+
+async def collect_metrics_snapshots() -> int:
+    """
+    Вызывается планировщиком. Снимает статистику постов, у которых
+    подошёл срок по адаптивному расписанию. Возвращает кол-во новых снимков.
+    """
+    now = datetime.utcnow()
+
+    last_taken = (
+        select(
+            PostMetricsSnapshot.post_id.label("post_id"),
+            func.max(PostMetricsSnapshot.taken_at).label("last_at"),
+        )
+        .group_by(PostMetricsSnapshot.post_id)
+        .subquery()
+    )
+
+    async with async_session() as session:
+        rows = (await session.execute(
+            select(
+                PublishedPost.id,
+                PublishedPost.account_id,
+                PublishedPost.threads_post_id,
+                PublishedPost.published_at,
+                last_taken.c.last_at,
+            )
+            .outerjoin(last_taken, last_taken.c.post_id == PublishedPost.id)
+            .where(PublishedPost.published_at >= now - SNAPSHOT_MAX_AGE)
+        )).all()
+
+        # Отбираем просроченные, самые «голодные» — первыми
+        due: list[tuple[timedelta, int, int, str]] = []
+        for post_id, account_id, threads_post_id, published_at, last_at in rows:
+            interval = snapshot_interval(now - published_at)
+            overdue = (now - last_at - interval) if last_at else timedelta.max
+            if overdue >= timedelta(0):
+                due.append((overdue, post_id, account_id, threads_post_id))
+        due.sort(key=lambda x: x[0], reverse=True)
+        due = due[:MAX_SNAPSHOTS_PER_RUN]
+        if not due:
+            return 0
+
+        by_account: Dict[int, list[tuple[int, str]]] = defaultdict(list)
+        for _, post_id, account_id, threads_post_id in due:
+            by_account[account_id].append((post_id, threads_post_id))
+
+        tokens = dict((await session.execute(
+            select(Account.id, Account.access_token).where(Account.id.in_(by_account.keys()))
+        )).all())
+
+    snapshots: list[dict] = []
+    for account_id, posts in by_account.items():
+        token = tokens.get(account_id)
+        if not token:
+            continue
+        # Частичный ответ (N/A вместо чисел) снимком не пишем — он стал бы latest_snapshot
+        metrics = await get_metrics_batch(account_id, token, [tp for _, tp in posts],
+                                          force=True, complete_only=True)
+        taken_at = datetime.utcnow()
+        for post_id, threads_post_id in posts:
+            m = metrics.get(threads_post_id)
+            if m is None:
+                continue
+            snapshots.append({
+                "post_id": post_id,
+                "taken_at": taken_at,
+                "likes": _as_int(m.get("likes")),
+                "replies": _as_int(m.get("replies")),
+            })
+
+    if snapshots:
+        async with async_session() as session:
+            await session.execute(insert(PostMetricsSnapshot), snapshots)
+            await session.commit()
+
+    log.info("metrics_collector: %s post(s) due, %s snapshot(s) stored", len(due), len(snapshots))
+    return len(snapshots)
+
+
+async def compact_metrics_snapshots(now: Optional[datetime] = None) -> int:
+    """
+    Прореживание временного ряда: для снимков старше METRICS_SNAPSHOT_RAW_DAYS
+    остаётся последний снимок поста за каждые сутки. Возвращает кол-во удалённых.
+    """
+    raw_days = int(settings.METRICS_SNAPSHOT_RAW_DAYS or 0)
+    if raw_days <= 0:
+        return 0
+    cutoff = (now or datetime.utcnow()) - timedelta(days=raw_days)
+
+    # Снимки пишутся по времени, так что max(id) за сутки — последний снимок этих суток
+    daily_last = (
+        select(func.max(PostMetricsSnapshot.id))
+        .group_by(PostMetricsSnapshot.post_id, func.date(PostMetricsSnapshot.taken_at))
+    )
+    removed = 0
+    while True:
+        async with async_session() as session:
+            ids = list((await session.execute(
+                select(PostMetricsSnapshot.id)
+                .where(PostMetricsSnapshot.taken_at < cutoff, PostMetricsSnapshot.id.not_in(daily_last))
+                .limit(COMPACT_BATCH_SIZE)
+            )).scalars().all())
+            if not ids:
+                break
+            await session.execute(delete(PostMetricsSnapshot).where(PostMetricsSnapshot.id.in_(ids)))
+            await session.commit()
+        removed += len(ids)
+
+    if removed:
+        log.info("metrics_collector: compacted %s snapshot(s) older than %s", removed, cutoff)
+    return removed
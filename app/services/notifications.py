@@ -1,15 +1,36 @@
 # app/services/notifications.py
+# ------------------------------------------------------------
+# Уведомления пользователям из фоновых сервисов.
+# notify_user не шлёт сразу, а ставит сообщение в очередь диспетчера:
+# • сообщения в один чат за NOTIFY_MERGE_WINDOW_SECONDS склеиваются в одно;
+# • соблюдается общий лимит (NOTIFY_GLOBAL_RATE_PER_SEC) и интервал на чат
+#   (личка / группы — по-разному, как требует Telegram);
+# • на 429 (TelegramRetryAfter) ждём указанное время и повторяем;
+# • слишком длинные склейки режутся по 4096 символов;
+# • текст — HTML (parse_mode бота): пользовательский текст вызывающий экранирует сам.
+#   Если Telegram всё же отверг разметку (TelegramBadRequest), часть досылается
+#   простым текстом — иначе терялись бы все склеенные в неё уведомления.
+# ------------------------------------------------------------
 from __future__ import annotations
-from typing import Optional
+from typing import Dict, List, Optional
+import asyncio
 import logging
+import time
 
 from aiogram import Bot
-from app.database.models import async_session, BotSettings
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
+
+from app.config import settings
+from app.services.row_cache import get_bot_settings
 
 logger = logging.getLogger(__name__)  # app.services.notifications
 
 _BOT: Optional[Bot] = None
 
+TELEGRAM_MESSAGE_LIMIT = 4096
+MERGE_SEPARATOR = "\n\n"
+MAX_SEND_ATTEMPTS = 5
+
 
 def bind_bot(bot: Bot) -> None:
     """Сохраняем Bot для отправки уведомлений из сервисов."""
@@ -18,33 +39,213 @@ def bind_bot(bot: Bot) -> None:
     logger.info("notifications.bind_bot: Bot instance bound")
 
 
-async def notify_user(tg_user_id: int, text: str) -> None:
+async def resolve_notify_chat(tg_user_id: int) -> int:
+    """BotSettings.notify_chat_id, если задан, иначе личка пользователя."""
+    try:
+        st = await get_bot_settings(tg_user_id)
+        if st and getattr(st, "notify_chat_id", None):
+            logger.debug("notify_user: using notify_chat_id=%s for user=%s", st.notify_chat_id, tg_user_id)
+            return st.notify_chat_id
+    except Exception as e:
+        logger.exception("notify_user: failed to fetch BotSettings for user=%s: %s", tg_user_id, e)
+    logger.debug("notify_user: fallback to DM user=%s", tg_user_id)
+    return tg_user_id
+
+
+def split_message(text: str, limit: int = TELEGRAM_MESSAGE_LIMIT) -> List[str]:
+    """Режет текст на части <= limit: по границам склеенных сообщений, затем по строкам, затем жёстко."""
+    chunks: List[str] = []
+    current = ""
+    for part in text.split(MERGE_SEPARATOR):
+        candidate = f"{current}{MERGE_SEPARATOR}{part}" if current else part
+        if len(candidate) <= limit:
+            current = candidate
+            continue
+        if current:
+            chunks.append(current)
+            current = ""
+        while len(part) > limit:
+            cut = part.rfind("\n", 0, limit)
+            cut = cut if cut > 0 else limit
+            chunks.append(part[:cut])
+            part = part[cut:].lstrip("\n")
+        current = part
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+class NotificationDispatcher:
+    """Очередь исходящих уведомлений с батчингом по чатам и rate-limit'ами Telegram."""
+
+    def __init__(self) -> None:
+        self._pending: Dict[int, List[str]] = {}   # chat_id -> тексты, ждущие отправки
+        self._ready_at: Dict[int, float] = {}      # chat_id -> когда можно отправлять
+        self._last_sent: Dict[int, float] = {}     # chat_id -> время последней отправки
+        self._next_global_slot = 0.0
+        self._global_pause_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._worker: Optional[asyncio.Task] = None
+        self._sending = False
+        self.sent = 0
+        self.merged = 0
+        self.retry_after_hits = 0
+        self.dropped = 0
+
+    @staticmethod
+    def _chat_interval(chat_id: int) -> float:
+        # Группы/каналы (отрицательный id) — не чаще ~20 сообщений в минуту
+        if chat_id < 0:
+            return float(settings.NOTIFY_GROUP_INTERVAL_SECONDS)
+        return float(settings.NOTIFY_PER_CHAT_INTERVAL_SECONDS)
+
+    def enqueue(self, chat_id: int, text: str) -> None:
+        now = time.monotonic()
+        texts = self._pending.setdefault(chat_id, [])
+        if texts:
+            self.merged += 1
+        else:
+            earliest = self._last_sent.get(chat_id, 0.0) + self._chat_interval(chat_id)
+            self._ready_at[chat_id] = max(now + settings.NOTIFY_MERGE_WINDOW_SECONDS, earliest)
+        texts.append(text)
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def _ensure_worker(self) -> None:
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run(), name="notification-dispatcher")
+
+    async def _run(self) -> None:
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            chat_id = min(self._ready_at, key=self._ready_at.get)
+            delay = self._ready_at[chat_id] - time.monotonic()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            texts = self._pending.pop(chat_id)
+            del self._ready_at[chat_id]
+            self._sending = True
+            try:
+                for chunk in split_message(MERGE_SEPARATOR.join(texts)):
+                    await self._send(chat_id, chunk)
+            except Exception as e:
+                logger.exception("notify_user: dispatcher failed for chat_id=%s: %s", chat_id, e)
+            finally:
+                self._sending = False
+
+    async def _wait_for_slot(self, chat_id: int) -> None:
+        now = time.monotonic()
+        wait_until = max(
+            self._next_global_slot,
+            self._global_pause_until,
+            self._last_sent.get(chat_id, 0.0) + self._chat_interval(chat_id),
+        )
+        if wait_until > now:
+            await asyncio.sleep(wait_until - now)
+        self._next_global_slot = time.monotonic() + 1.0 / max(1, settings.NOTIFY_GLOBAL_RATE_PER_SEC)
+
+    async def _send(self, chat_id: int, text: str) -> None:
+        send_kwargs: Dict[str, object] = {}  # по умолчанию — parse_mode бота (HTML)
+        for attempt in range(1, MAX_SEND_ATTEMPTS + 1):
+            await self._wait_for_slot(chat_id)
+            if _BOT is None:
+                logger.warning("notify_user: BOT is not bound, drop message to chat_id=%s", chat_id)
+                self.dropped += 1
+                return
+            try:
+                await _BOT.send_message(chat_id, text, **send_kwargs)
+                self._last_sent[chat_id] = time.monotonic()
+                self.sent += 1
+                logger.info("notify_user: sent to chat_id=%s", chat_id)
+                return
+            except TelegramRetryAfter as e:
+                # Flood control: Telegram сам говорит, сколько ждать. Притормаживаем всю очередь.
+                self.retry_after_hits += 1
+                self._global_pause_until = time.monotonic() + e.retry_after
+                logger.warning("notify_user: flood limit for chat_id=%s, retry in %ss (attempt %s/%s)",
+                               chat_id, e.retry_after, attempt, MAX_SEND_ATTEMPTS)
+            except TelegramBadRequest as e:
+                if send_kwargs:
+                    logger.warning("notify_user: plain-text send failed to chat_id=%s: %s", chat_id, e)
+                    self.dropped += 1
+                    return
+                logger.warning("notify_user: HTML rejected for chat_id=%s (%s), resending as plain text",
+                               chat_id, e)
+                send_kwargs = {"parse_mode": None}
+            except Exception as e:
+                logger.warning("notify_user: send_message failed to chat_id=%s: %s", chat_id, e)
+                self.dropped += 1
+                return
+        logger.error("notify_user: giving up on chat_id=%s after %s attempts", chat_id, MAX_SEND_ATTEMPTS)
+        self.dropped += 1
+
+    async def drain(self, timeout: float = 10.0) -> None:
+        """Отправить всё накопленное без ожидания окна склейки (при остановке бота)."""
+        now = time.monotonic()
+        for chat_id in self._ready_at:
+            self._ready_at[chat_id] = now
+        self._wakeup.set()
+        deadline = now + timeout
+        while (self._pending or self._sending) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker = None
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "pending_chats": len(self._pending),
+            "sent": self.sent,
+            "merged": self.merged,
+            "retry_after": self.retry_after_hits,
+            "dropped": self.dropped,
+        }
+
+
+_dispatcher = NotificationDispatcher()
+
+
+async def notify_user(tg_user_id: int, text: str) -> bool:
     """
     Отправить сообщение пользователю/в выбранный им чат.
+    text — HTML: пользовательские данные в нём должны быть экранированы (html.escape).
     • если BotSettings.notify_chat_id есть — туда,
     • иначе — в личку пользователю.
-    Ошибки подавляем (сервис фоновый).
+    Сообщение ставится в очередь диспетчера; ошибки подавляем (сервис фоновый).
+    Возвращает True, если сообщение принято в очередь.
     """
     if _BOT is None:
         logger.warning("notify_user: BOT is not bound, skip message")
-        return
+        return False
 
-    target_chat_id = None
-    try:
-        async with async_session() as session:
-            st = await session.get(BotSettings, tg_user_id)
-            if st and getattr(st, "notify_chat_id", None):
-                target_chat_id = st.notify_chat_id
-                logger.debug("notify_user: using notify_chat_id=%s for user=%s", target_chat_id, tg_user_id)
-    except Exception as e:
-        logger.exception("notify_user: failed to fetch BotSettings for user=%s: %s", tg_user_id, e)
+    target_chat_id = await resolve_notify_chat(tg_user_id)
+    _dispatcher.enqueue(target_chat_id, text)
+    return True
 
-    if target_chat_id is None:
-        target_chat_id = tg_user_id
-        logger.debug("notify_user: fallback to DM user=%s", tg_user_id)
 
-    try:
-        await _BOT.send_message(target_chat_id, text)
-        logger.info("notify_user: sent to chat_id=%s (user=%s)", target_chat_id, tg_user_id)
-    except Exception as e:
-        logger.warning("notify_user: send_message failed to chat_id=%s (user=%s): %s", target_chat_id, tg_user_id, e)
+async def shutdown_notifications(timeout: float = 10.0) -> None:
+    await _dispatcher.drain(timeout)
+
+
+def notification_stats() -> Dict[str, int]:
+    return _dispatcher.stats()
+
+
+def log_notification_stats() -> None:
+    """Одна строка в лог: отправлено / склеено / 429 / потеряно / чатов в очереди."""
+    stats = notification_stats()
+    if not any(stats.values()):
+        return
+    logger.info("notifications: sent=%s merged=%s retry_after=%s dropped=%s pending_chats=%s",
+                stats["sent"], stats["merged"], stats["retry_after"], stats["dropped"],
+                stats["pending_chats"])
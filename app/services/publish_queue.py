@@ -0,0 +1,439 @@
+# app/services/publish_queue.py
+# ------------------------------------------------------------
+# Надёжная очередь публикаций (таблица publish_attempts), семантика at-least-once.
+# • срабатывание триггера -> строка (job_id, scheduled_for); ключ уникальный, так что
+#   повторный запуск того же срабатывания (второй процесс, рестарт) ничего не добавит;
+# • попытку выполняет владелец аренды (lease_owner/lease_until); пока она выполняется,
+#   фоновый heartbeat продлевает аренду (шаг может идти дольше PUBLISH_LEASE_SECONDS —
+#   карусель из 10 фото это 11 запросов); все записи — только при живой аренде.
+#   Процесс упал — аренда истекает, и попытку подхватывает process_due_attempts;
+# • scheduled_for — плановое время срабатывания по триггеру, а не момент запуска,
+#   так что опоздавший запуск того же срабатывания попадает в тот же ключ;
+# • шаги queued -> media_ready -> container_created -> published фиксируются сразу,
+#   повтор продолжает с последнего: контейнер Threads повторно не создаётся;
+#   повтор с container_created сначала спрашивает статус контейнера — если процесс
+#   упал уже после публикации, пост не публикуется второй раз (истёкший — создаётся заново);
+# • ошибка -> pending с экспоненциальной паузой; после PUBLISH_MAX_ATTEMPTS — failed
+#   и сообщение пользователю. Некорректный контент и отсутствие токена не повторяются.
+# Запись в архив и статус done — одной транзакцией, уведомление — после неё.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from html import escape
+import os
+import re
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional
+
+from sqlalchemy import select, update, delete, and_, or_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload
+
+from app.config import settings
+from app.database.models import async_session, Job, PublishedPost, PublishAttempt
+from app.services.notifications import notify_user
+from app.services.row_cache import get_account
+from app.services.digest import notify_publish_success
+from app.services.tg_io import get_file_public_url
+from app.services.threads_client import (
+    ThreadsError, create_post_container, publish_container, get_container_status, get_user_media,
+)
+
+log = logging.getLogger(__name__)
+
+STEP_QUEUED = "queued"
+STEP_MEDIA_READY = "media_ready"
+STEP_CONTAINER_CREATED = "container_created"
+STEP_PUBLISHED = "published"
+
+STATUS_RUNNING = "running"
+STATUS_PENDING = "pending"
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+STATUS_CANCELLED = "cancelled"
+
+DUE_BATCH = 50
+MAX_RETRY_DELAY = timedelta(hours=1)
+ATTEMPT_RETENTION = timedelta(days=30)
+PRUNE_EVERY = timedelta(hours=1)
+
+IMG_MARK_RE = re.compile(r"\n\s*\[IMG\]\s+(?P<url>\S+)\s*$", re.IGNORECASE)
+
+_HOST = f"{socket.gethostname()}:{os.getpid()}"
+_next_prune = datetime.min
+
+
+class _LeaseLost(Exception):
+    """Аренду перехватил другой исполнитель — молча прекращаем обработку."""
+
+
+def _split_text_and_image_url(text: str) -> tuple[str, Optional[str]]:
+    """Ищем в конце текста маркер вида: \\n[IMG] https://... → (текст_без_маркера, url|None)"""
+    if not text:
+        return text, None
+    m = IMG_MARK_RE.search(text)
+    if not m:
+        return text, None
+    url = m.group("url")
+    clean = text[: m.start()].rstrip()
+    return clean, url
+
+
+def _lease_token() -> str:
+    # Токен на каждый захват: даже в одном процессе два исполнителя не примут аренду за свою
+    return f"{_HOST}:{uuid.uuid4().hex[:8]}"[-64:]
+
+
+def _lease_until(now: datetime) -> datetime:
+    return now + timedelta(seconds=max(30, int(settings.PUBLISH_LEASE_SECONDS or 300)))
+
+
+def _retry_delay(attempts: int) -> timedelta:
+    base = max(1, int(settings.PUBLISH_RETRY_BASE_SECONDS or 60))
+    return min(MAX_RETRY_DELAY, timedelta(seconds=base * 2 ** max(0, attempts - 1)))
+
+
+# ----------------------- ЗАПИСЬ ПОД АРЕНДОЙ -------------------- #
+
+async def _save(session, attempt_id: int, token: str, **values: Any) -> None:
+    """UPDATE строки попытки, только если аренда всё ещё наша; иначе _LeaseLost."""
+    now = datetime.utcnow()
+    values.setdefault("lease_until", _lease_until(now))
+    res = await session.execute(
+        update(PublishAttempt)
+        .where(PublishAttempt.id == attempt_id,
+               PublishAttempt.lease_owner == token,
+               PublishAttempt.status == STATUS_RUNNING)
+        .values(updated_at=now, **values)
+    )
+    if res.rowcount != 1:
+        await session.rollback()
+        raise _LeaseLost()
+    await session.commit()
+
+
+async def _finish(session, attempt_id: int, token: str, status: str, error: Optional[str] = None, **values: Any) -> None:
+    await _save(session, attempt_id, token, status=status, last_error=error,
+                lease_owner=None, lease_until=None, **values)
+
+
+# ----------------------- ШАГИ -------------------- #
+
+async def _prepare_media(session, attempt: PublishAttempt, token: str) -> Optional[Dict[str, Any]]:
+    """queued -> media_ready: снимок текста и ссылок на медиа. None — задача удалена."""
+    job = (await session.execute(
+        select(Job).options(selectinload(Job.media)).where(Job.id == attempt.job_id)
+    )).scalars().first()
+    if job is None:
+        log.warning("publish_queue: job_id=%s not found, attempt #%s cancelled", attempt.job_id, attempt.id)
+        await _finish(session, attempt.id, token, STATUS_CANCELLED, "job deleted")
+        return None
+
+    media_items = list(job.media or [])
+    text, marker_url = _split_text_and_image_url(job.text or "")
+    image_urls: list[str] = []
+    image_processing_failed = False
+
+    if marker_url:
+        image_urls = [marker_url]
+    else:
+        for m in media_items:
+            try:
+                if getattr(m, "source", "telegram") == "telegram" and getattr(m, "tg_file_id", None):
+                    url = await get_file_public_url(m.tg_file_id)
+                    if url:
+                        image_urls.append(url)
+                elif getattr(m, "source", None) == "url" and getattr(m, "url", None):
+                    image_urls.append(m.url)
+            except Exception as e:
+                log.warning("media url build failed job_id=%s media_id=%s: %s",
+                            job.id, getattr(m, "id", "?"), e)
+                image_processing_failed = True
+
+    data = {
+        "account_id": job.account_id,
+        "time_str": job.time_str,
+        "text": text,
+        "image_urls": image_urls,
+        "media_failed": bool(image_processing_failed and not image_urls and media_items),
+    }
+    await _save(session, attempt.id, token, step=STEP_MEDIA_READY, payload=json.dumps(data))
+    return data
+
+
+async def _complete(session, attempt: PublishAttempt, token: str, data: Dict[str, Any], published_id: str) -> None:
+    """published -> done: запись в архив и статус одной транзакцией, затем уведомление."""
+    text, image_urls = data["text"], data["image_urls"]
+    exists = (await session.execute(
+        select(PublishedPost.id).where(PublishedPost.account_id == data["account_id"],
+                                       PublishedPost.threads_post_id == published_id)
+    )).first()
+    if exists is None:
+        session.add(PublishedPost(
+            threads_post_id=published_id,
+            tg_user_id=attempt.tg_user_id,
+            account_id=data["account_id"],
+            text=text,
+            has_media=bool(image_urls),
+        ))
+    await _finish(session, attempt.id, token, STATUS_DONE)
+
+    time_str = data["time_str"]
+    preview = f"{text[:100]}{'…' if len(text) > 100 else ''}"
+    nowz = datetime.utcnow().isoformat(timespec="seconds") + "Z"
+    success_message_lines = [
+        f"⏰ {time_str} — published",
+        f"🧾 {escape(preview)}",
+        f"🖼️ images: {len(image_urls)}",
+    ]
+    if data.get("media_failed"):
+        success_message_lines.insert(2, "⚠️ (Image failed to process)")
+    success_message_lines.append(f"🕒 {nowz}")
+
+    # Успех — сразу или в сводку (BotSettings.digest_mode); ошибки уходят сразу
+    await notify_publish_success(
+        attempt.tg_user_id,
+        "\n".join(success_message_lines),
+        digest_line=f"⏰ {time_str} — {escape(text[:60])}{'…' if len(text) > 60 else ''}",
+    )
+    log.info("publish_queue: posted job_id=%s user=%s time=%s images=%s attempt=#%s try=%s",
+             attempt.job_id, attempt.tg_user_id, time_str, len(image_urls), attempt.id, attempt.attempts)
+
+
+async def _published_post_id(access_token: str, container_id: str, text: str) -> str:
+    """id поста для уже опубликованного контейнера (ответ threads_publish был потерян)."""
+    try:
+        recent = (await get_user_media(access_token, limit=10)).get("data", [])
+    except ThreadsError as e:
+        log.warning("publish_queue: failed to look up the post of container %s: %s", container_id, e)
+        recent = []
+    for post in recent:
+        if post.get("id") == container_id or (post.get("text") or "").strip() == text.strip():
+            return str(post["id"])
+    # Как и publish_container, когда в ответе нет id
+    return container_id
+
+
+async def _heartbeat(attempt_id: int, token: str) -> None:
+    """Продлевает аренду, пока попытка выполняется (треть срока аренды между продлениями)."""
+    interval = max(10, int(settings.PUBLISH_LEASE_SECONDS or 300) // 3)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with async_session() as session:
+                res = await session.execute(
+                    update(PublishAttempt)
+                    .where(PublishAttempt.id == attempt_id,
+                           PublishAttempt.lease_owner == token,
+                           PublishAttempt.status == STATUS_RUNNING)
+                    .values(lease_until=_lease_until(datetime.utcnow()))
+                )
+                await session.commit()
+            if res.rowcount != 1:
+                return  # попытка завершена или аренду забрали — продлевать нечего
+        except Exception as e:
+            log.warning("publish_queue: lease renewal failed for attempt #%s: %s", attempt_id, e)
+
+
+async def _process(attempt_id: int, token: str) -> None:
+    """Выполняет захваченную попытку, продлевая аренду в фоне."""
+    heartbeat = asyncio.create_task(_heartbeat(attempt_id, token))
+    try:
+        await _run_steps(attempt_id, token)
+    finally:
+        heartbeat.cancel()
+
+
+async def _run_steps(attempt_id: int, token: str) -> None:
+    """Выполняет захваченную попытку с её текущего шага."""
+    async with async_session() as session:
+        attempt = await session.get(PublishAttempt, attempt_id)
+        # Закрываем читающую транзакцию: на время запросов к Threads сессия не держит БД
+        await session.commit()
+        if attempt is None or attempt.lease_owner != token:
+            return
+        data: Dict[str, Any] = json.loads(attempt.payload) if attempt.payload else {}
+        step, container_id, published_id = attempt.step, attempt.container_id, attempt.published_id
+        time_str = data.get("time_str", "?")
+        max_attempts = max(1, int(settings.PUBLISH_MAX_ATTEMPTS or 1))
+        try:
+            if attempt.attempts > max_attempts:
+                # Исполнители падали, не успев записать ошибку (истекала аренда)
+                raise ThreadsError(attempt.last_error or "worker stopped during publishing")
+
+            if step == STEP_QUEUED:
+                data = await _prepare_media(session, attempt, token)
+                if data is None:
+                    return
+                step = STEP_MEDIA_READY
+
+            acc = await get_account(data["account_id"])
+            if acc is None or not acc.access_token:
+                await _finish(session, attempt_id, token, STATUS_FAILED, "no token")
+                await notify_user(attempt.tg_user_id, f"❌ No token is set. Skipped {time_str}")
+                log.warning("publish_queue: no token for job_id=%s user=%s", attempt.job_id, attempt.tg_user_id)
+                return
+
+            if attempt.step == STEP_CONTAINER_CREATED:
+                # Прошлый исполнитель мог упасть между publish_container и записью шага published
+                status = (await get_container_status(acc.access_token, container_id)).get("status")
+                if status == "PUBLISHED":
+                    published_id = await _published_post_id(acc.access_token, container_id, data["text"])
+                    step = STEP_PUBLISHED
+                    log.info("publish_queue: container %s of attempt #%s is already published as %s",
+                             container_id, attempt_id, published_id)
+                    await _save(session, attempt_id, token, step=step, published_id=published_id)
+                elif status == "EXPIRED":
+                    step = STEP_MEDIA_READY
+
+            if step == STEP_MEDIA_READY:
+                container_id = await create_post_container(
+                    acc.access_token, text=data["text"], image_urls=data["image_urls"]
+                )
+                step = STEP_CONTAINER_CREATED
+                await _save(session, attempt_id, token, step=step, container_id=container_id)
+
+            if step == STEP_CONTAINER_CREATED:
+                result = await publish_container(acc.access_token, container_id)
+                published_id, step = str(result["id"]), STEP_PUBLISHED
+                await _save(session, attempt_id, token, step=step, published_id=published_id)
+
+            await _complete(session, attempt, token, data, published_id)
+
+        except _LeaseLost:
+            log.warning("publish_queue: lease lost for attempt #%s job_id=%s", attempt_id, attempt.job_id)
+        except ValueError as e:
+            # Некорректный контент (например, > 10 изображений) — повтор не поможет
+            await _fail(session, attempt, token, f"❌ Publish error at {time_str}: {escape(str(e))}", e)
+        except Exception as e:
+            if attempt.attempts >= max_attempts:
+                kind = "Publish error" if isinstance(e, ThreadsError) else "Unexpected error"
+                await _fail(session, attempt, token, f"❌ {kind} at {time_str}: {escape(str(e))}", e)
+                return
+            if not isinstance(e, ThreadsError):
+                log.exception("publish_queue: unexpected error job_id=%s user=%s: %s",
+                              attempt.job_id, attempt.tg_user_id, e)
+            delay = _retry_delay(attempt.attempts)
+            log.warning("publish_queue: attempt #%s job_id=%s step=%s try %s/%s failed, retry in %ss: %s",
+                        attempt_id, attempt.job_id, step, attempt.attempts, max_attempts,
+                        int(delay.total_seconds()), e)
+            try:
+                await _finish(session, attempt_id, token, STATUS_PENDING, str(e)[:1000],
+                              next_attempt_at=datetime.utcnow() + delay)
+            except _LeaseLost:
+                pass
+
+
+async def _fail(session, attempt: PublishAttempt, token: str, message: str, error: Exception) -> None:
+    try:
+        await _finish(session, attempt.id, token, STATUS_FAILED, str(error)[:1000])
+    except _LeaseLost:
+        return
+    await notify_user(attempt.tg_user_id, message)
+    log.warning("publish_queue: attempt #%s job_id=%s user=%s failed after %s try(s): %s",
+                attempt.id, attempt.job_id, attempt.tg_user_id, attempt.attempts, error)
+
+
+# ----------------------- ВХОДНЫЕ ТОЧКИ -------------------- #
+
+async def enqueue_and_run(job_id: int, scheduled_for: Optional[datetime] = None) -> None:
+    """
+    Срабатывание триггера: ставит попытку в очередь под своей арендой и сразу выполняет.
+    scheduled_for — плановое время срабатывания (naive UTC); по умолчанию — текущая минута.
+    """
+    now = datetime.utcnow()
+    async with async_session() as session:
+        job = (await session.execute(
+            select(Job.tg_user_id, Job.time_str).where(Job.id == job_id)
+        )).first()
+        if job is None:
+            log.warning("publish_queue: job_id=%s not found", job_id)
+            return
+
+        token = _lease_token()
+        attempt = PublishAttempt(
+            job_id=job_id,
+            tg_user_id=job.tg_user_id,
+            scheduled_for=(scheduled_for or now).replace(second=0, microsecond=0),
+            status=STATUS_RUNNING,
+            step=STEP_QUEUED,
+            attempts=1,
+            lease_owner=token,
+            lease_until=_lease_until(now),
+            payload=json.dumps({"time_str": job.time_str}),
+        )
+        session.add(attempt)
+        try:
+            await session.commit()
+        except IntegrityError:
+            log.info("publish_queue: job_id=%s fire %s already enqueued", job_id, attempt.scheduled_for)
+            return
+        attempt_id = attempt.id
+
+    await _process(attempt_id, token)
+
+
+async def _claim(attempt_id: int, now: datetime) -> Optional[str]:
+    """Захват попытки, ждущей повтора или с истёкшей арендой. None — её забрал другой."""
+    token = _lease_token()
+    async with async_session() as session:
+        res = await session.execute(
+            update(PublishAttempt)
+            .where(PublishAttempt.id == attempt_id, _due_condition(now))
+            .values(status=STATUS_RUNNING, lease_owner=token, lease_until=_lease_until(now),
+                    attempts=PublishAttempt.attempts + 1, updated_at=now)
+        )
+        await session.commit()
+    return token if res.rowcount == 1 else None
+
+
+def _due_condition(now: datetime):
+    return or_(
+        and_(PublishAttempt.status == STATUS_PENDING, PublishAttempt.next_attempt_at <= now),
+        and_(PublishAttempt.status == STATUS_RUNNING, PublishAttempt.lease_until < now),
+    )
+
+
+async def process_due_attempts() -> int:
+    """
+    Периодическая задача воркера: повторы по расписанию и попытки, брошенные упавшими
+    процессами. При нескольких воркерах каждый берёт только задачи своего шарда.
+    """
+    global _next_prune
+    now = datetime.utcnow()
+    stmt = select(PublishAttempt.id).where(_due_condition(now)).order_by(PublishAttempt.id).limit(DUE_BATCH)
+    shards = max(1, int(settings.WORKER_SHARDS or 1))
+    if shards > 1:
+        stmt = stmt.where(PublishAttempt.job_id % shards == int(settings.WORKER_SHARD) % shards)
+    async with async_session() as session:
+        ids = list((await session.execute(stmt)).scalars().all())
+
+    processed = 0
+    for attempt_id in ids:
+        token = await _claim(attempt_id, now)
+        if token is None:
+            continue
+        await _process(attempt_id, token)
+        processed += 1
+    if processed:
+        log.info("publish_queue: processed %s due attempt(s)", processed)
+
+    if now >= _next_prune and int(settings.WORKER_SHARD or 0) == 0:
+        _next_prune = now + PRUNE_EVERY
+        async with async_session() as session:
+            res = await session.execute(
+                delete(PublishAttempt).where(
+                    PublishAttempt.status.in_((STATUS_DONE, STATUS_FAILED, STATUS_CANCELLED)),
+                    PublishAttempt.updated_at < now - ATTEMPT_RETENTION,
+                )
+            )
+            await session.commit()
+        if res.rowcount:
+            log.info("publish_queue: pruned %s old attempt(s)", res.rowcount)
+    return processed
@@ -0,0 +1,178 @@
+# app/services/row_cache.py
+# ------------------------------------------------------------
+# Read-through кеш для часто читаемых строк: BotSettings и Account.
+# • чтение: кеш -> (уже идущий запрос) -> БД;
+# • запись: хендлеры, меняющие строку, обязаны вызвать invalidate_*;
+# • TTL — лишь страховка на случай пропущенной инвалидации;
+# • отсутствие строки тоже кешируется (notify_user без настроек — частый случай).
+# Возвращаются отсоединённые от сессии ORM-объекты: только для чтения колонок.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Generic, Hashable, List, Optional, TypeVar
+
+from cachetools import TTLCache
+
+from app.config import settings
+from app.database.models import async_session, Account, BotSettings
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_MISSING = object()  # закешированное «строки нет»
+
+# Подписчики на инвалидацию (cache, key) — например, пересылка в процесс-воркер (worker_events)
+_invalidation_listeners: List[Callable[[str, int], None]] = []
+
+
+class RowCache(Generic[T]):
+    def __init__(self, name: str, loader: Callable[[Hashable], Awaitable[Optional[T]]],
+                 maxsize: int, ttl: int) -> None:
+        self.name = name
+        self._loader = loader
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=max(1, ttl))
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: Hashable) -> Optional[T]:
+        value = self._cache.get(key, None)
+        if value is not None:
+            self.hits += 1
+            return None if value is _MISSING else value
+
+        fut = self._inflight.get(key)
+        if fut is not None:
+            # Ждём уже идущую загрузку — в БД не ходим, считаем попаданием
+            self.hits += 1
+            return await asyncio.shield(fut)
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            row = await self._loader(key)
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # помечаем как полученное, если никто больше не ждёт
+            raise
+        else:
+            # Инвалидация во время загрузки удаляет ключ из _inflight — тогда не кешируем
+            if self._inflight.get(key) is fut:
+                self._cache[key] = _MISSING if row is None else row
+            fut.set_result(row)
+            return row
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    def invalidate(self, key: Hashable) -> None:
+        self._cache.pop(key, None)
+        self._inflight.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Any], bool]) -> None:
+        for key, value in list(self._cache.items()):
+            if value is not _MISSING and predicate(value):
+                self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._inflight.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache)}
+
+
+async def _load_bot_settings(tg_user_id: int) -> Optional[BotSettings]:
+    async with async_session() as session:
+        return await session.get(BotSettings, tg_user_id)
+
+
+async def _load_account(account_id: int) -> Optional[Account]:
+    async with async_session() as session:
+        return await session.get(Account, account_id)
+
+
+_bot_settings: RowCache[BotSettings] = RowCache(
+    "bot_settings", _load_bot_settings, maxsize=10_000, ttl=settings.ROW_CACHE_TTL_SECONDS
+)
+_accounts: RowCache[Account] = RowCache(
+    "accounts", _load_account, maxsize=10_000, ttl=settings.ROW_CACHE_TTL_SECONDS
+)
+
+
+async def get_bot_settings(tg_user_id: int) -> Optional[BotSettings]:
+    return await _bot_settings.get(tg_user_id)
+
+
+async def get_account(account_id: int) -> Optional[Account]:
+    return await _accounts.get(account_id)
+
+
+async def get_user_tz(tg_user_id: int, default: str = "Europe/Berlin") -> str:
+    st = await get_bot_settings(tg_user_id)
+    return st.tz if st and st.tz else default
+
+
+def add_invalidation_listener(listener: Callable[[str, int], None]) -> None:
+    _invalidation_listeners.append(listener)
+
+
+def _notify_listeners(cache: str, key: int) -> None:
+    for listener in _invalidation_listeners:
+        try:
+            listener(cache, key)
+        except Exception as e:
+            log.warning("row_cache: invalidation listener failed for %s:%s: %s", cache, key, e)
+
+
+def apply_invalidation(cache: Optional[str], key: Optional[int]) -> None:
+    """Сброс по событию из другого процесса (без повторной пересылки)."""
+    if key is None:
+        return
+    if cache == "bot_settings":
+        _bot_settings.invalidate(key)
+    elif cache == "accounts":
+        _accounts.invalidate(key)
+    elif cache == "user_accounts":
+        _accounts.invalidate_where(lambda acc: acc.tg_user_id == key)
+
+
+def clear_caches() -> None:
+    _bot_settings.clear()
+    _accounts.clear()
+
+
+def invalidate_bot_settings(tg_user_id: int) -> None:
+    _bot_settings.invalidate(tg_user_id)
+    _notify_listeners("bot_settings", tg_user_id)
+
+
+def invalidate_account(account_id: int) -> None:
+    _accounts.invalidate(account_id)
+    _notify_listeners("accounts", account_id)
+
+
+def invalidate_user_accounts(tg_user_id: int) -> None:
+    """Сбросить все закешированные аккаунты пользователя (массовые UPDATE/DELETE)."""
+    _accounts.invalidate_where(lambda acc: acc.tg_user_id == tg_user_id)
+    _notify_listeners("user_accounts", tg_user_id)
+
+
+def cache_stats() -> Dict[str, Dict[str, int]]:
+    return {c.name: c.stats() for c in (_bot_settings, _accounts)}
+
+
+def log_cache_stats() -> None:
+    """Одна строка в лог: попадания / промахи / размер по каждому кешу строк."""
+    stats = cache_stats()
+    if not any(st["hits"] or st["misses"] for st in stats.values()):
+        return
+    log.info("row_cache: %s", ", ".join(
+        f"{name} hits={st['hits']} misses={st['misses']} size={st['size']}"
+        for name, st in sorted(stats.items())
+    ))
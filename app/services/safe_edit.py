@@ -1,8 +1,17 @@
 # app/services/safe_edit.py
 from __future__ import annotations
-from aiogram.exceptions import TelegramBadRequest
+import logging
+import time
+from typing import Optional
+
+from aiogram.exceptions import TelegramBadRequest, TelegramRetryAfter
 from aiogram.types import Message, ReplyKeyboardMarkup
 
+log = logging.getLogger(__name__)
+
+# Не чаще одной правки сообщения за этот интервал при потоковом выводе
+STREAM_EDIT_INTERVAL_SECONDS = 1.5
+
 async def safe_edit(message: Message, text: str, reply_markup=None) -> None:
     """
     Безопасная замена edit_text:
@@ -31,3 +40,39 @@ async def safe_edit(message: Message, text: str, reply_markup=None) -> None:
         except Exception:
             pass
         await message.answer(text, reply_markup=reply_markup)
+
+
+class ProgressiveEditor:
+    """
+    Постепенное обновление одного сообщения (потоковая генерация ИИ).
+    • update() правит сообщение не чаще min_interval, промежуточный текст
+      между правками просто заменяется последним (coalescing);
+    • на flood control (429) промежуточные правки пропускаются до конца паузы;
+    • finish() всегда выставляет итоговый текст и клавиатуру через safe_edit.
+    """
+
+    def __init__(self, message: Message, min_interval: float = STREAM_EDIT_INTERVAL_SECONDS) -> None:
+        self._message = message
+        self._min_interval = min_interval
+        self._next_edit_at = 0.0
+        self._last_text: Optional[str] = None
+        self.edits = 0
+
+    async def update(self, text: str) -> None:
+        now = time.monotonic()
+        if now < self._next_edit_at or text == self._last_text:
+            return
+        self._next_edit_at = now + self._min_interval
+        try:
+            await self._message.edit_text(text)
+            self._last_text = text
+            self.edits += 1
+        except TelegramRetryAfter as e:
+            self._next_edit_at = time.monotonic() + e.retry_after
+            log.debug("progressive edit: flood control, pause %ss", e.retry_after)
+        except TelegramBadRequest as e:
+            # Промежуточная правка не критична — итог всё равно выставит finish()
+            log.debug("progressive edit skipped: %s", e)
+
+    async def finish(self, text: str, reply_markup=None) -> None:
+        await safe_edit(self._message, text, reply_markup=reply_markup)
@@ -0,0 +1,105 @@
+# app/services/schedule_export.py
+# ------------------------------------------------------------
+# Экспорт расписания пользователя: CSV или JSON Lines, по желанию — gzip.
+# • строки читаются потоково (session.stream, частями по EXPORT_CHUNK_ROWS),
+#   без загрузки всех Job в ORM;
+# • название аккаунта и ссылки на медиа приходят тем же запросом;
+# • файл пишется в буфер по мере чтения (для gzip — сразу сжатым),
+#   так что в памяти только результат, а не строки + результат.
+# Колонка media: ссылки через '|' — tg:<file_id> для файлов Telegram или URL;
+# тот же формат принимает импорт (schedule_import).
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import csv
+import gzip
+import io
+import json
+import logging
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import select, func, case, literal
+
+from app.database.models import async_session, Account, Job, JobMedia
+from app.services.schedule_utils import mask_to_days_label
+
+log = logging.getLogger(__name__)
+
+EXPORT_CHUNK_ROWS = 500
+MEDIA_SEPARATOR = "|"
+TG_MEDIA_PREFIX = "tg:"
+
+# формат -> (подпись кнопки, имя файла)
+EXPORT_FORMATS: Dict[str, Tuple[str, str]] = {
+    "csv": ("CSV", "schedule_export.csv"),
+    "jsonl": ("JSON Lines", "schedule_export.jsonl"),
+    "csv_gz": ("CSV (gzip)", "schedule_export.csv.gz"),
+    "jsonl_gz": ("JSON Lines (gzip)", "schedule_export.jsonl.gz"),
+}
+
+EXPORT_COLUMNS = ["time_str", "account_id", "account_title", "text", "dow_mask", "days", "media"]
+
+
+def _media_refs_subquery():
+    ref = case(
+        (JobMedia.source == "telegram", literal(TG_MEDIA_PREFIX) + JobMedia.tg_file_id),
+        else_=JobMedia.url,
+    )
+    # group_concat склеивает в порядке строк подзапроса: порядок медиа (карусели) — по id
+    ordered = (
+        select(ref.label("ref"))
+        .where(JobMedia.job_id == Job.id)
+        .order_by(JobMedia.id)
+        .correlate(Job)
+        .subquery()
+    )
+    return select(func.group_concat(ordered.c.ref, MEDIA_SEPARATOR)).scalar_subquery()
+
+
+async def export_schedule(tg_user_id: int, fmt: str = "csv") -> Optional[Tuple[bytes, str, int]]:
+    """
+    Возвращает (содержимое файла, имя файла, кол-во задач) или None, если расписание пустое.
+    Бросает ValueError на неизвестный формат.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    filename = EXPORT_FORMATS[fmt][1]
+    as_json = fmt.startswith("jsonl")
+
+    raw = io.BytesIO()
+    # gzip пишет в буфер уже сжатые данные; текстовая обёртка кодирует в UTF-8 по мере записи
+    binary = gzip.GzipFile(fileobj=raw, mode="wb") if fmt.endswith("_gz") else raw
+    out = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+    writer = None if as_json else csv.writer(out)
+    if writer is not None:
+        writer.writerow(EXPORT_COLUMNS)
+
+    stmt = (
+        select(Job.time_str, Job.account_id, Account.title, Job.text, Job.dow_mask,
+               _media_refs_subquery().label("media"))
+        .outerjoin(Account, Account.id == Job.account_id)
+        .where(Job.tg_user_id == tg_user_id)
+        .order_by(Job.time_str, Job.id)
+    )
+    count = 0
+    async with async_session() as session:
+        result = await session.stream(stmt)
+        async for chunk in result.partitions(EXPORT_CHUNK_ROWS):
+            for time_str, account_id, title, text, mask, media in chunk:
+                mask = 127 if mask is None else mask
+                values = [time_str, account_id, title or "", text, mask, mask_to_days_label(mask), media or ""]
+                if writer is not None:
+                    writer.writerow(values)
+                else:
+                    out.write(json.dumps(dict(zip(EXPORT_COLUMNS, values)), ensure_ascii=False) + "\n")
+            count += len(chunk)
+
+    if not count:
+        return None
+    out.flush()
+    out.detach()  # не закрываем BytesIO вместе с обёрткой
+    if binary is not raw:
+        binary.close()  # дописывает gzip-трейлер
+    log.info("schedule_export: user=%s format=%s rows=%s size=%s", tg_user_id, fmt, count, raw.tell())
+    return raw.getvalue(), filename, count
@@ -0,0 +1,208 @@
+# app/services/schedule_import.py
+# ------------------------------------------------------------
+# Импорт расписания из CSV.
+# • файл читается потоково (TextIOWrapper поверх временного файла),
+#   а не декодируется целиком в строку;
+# • account_id проверяется по заранее загруженному набору аккаунтов пользователя;
+# • строки пишутся пачками через INSERT ... executemany (RETURNING id),
+#   после чего планировщику добавляются триггеры только новых задач;
+# • по каждой отклонённой строке — причина, отчёт отдаётся CSV-файлом.
+# Колонки: time_str, account_id, text (+ dow_mask или days, media).
+# media — ссылки через '|': tg:<file_id> или http(s)-URL (как в экспорте).
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import csv
+import io
+import logging
+from dataclasses import dataclass, field
+from typing import IO, Dict, List, Optional, Tuple
+
+from sqlalchemy import select, insert
+
+from app.database.models import async_session, Account, Job, JobMedia
+from app.services.schedule_utils import parse_days_to_mask
+from app.services.schedule_export import MEDIA_SEPARATOR, TG_MEDIA_PREFIX
+
+log = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 1000
+MAX_REPORT_ERRORS = 10_000  # отчёт об ошибках тоже не должен расти бесконечно
+MAX_MEDIA_PER_JOB = 10
+
+# Имя колонки в файле (в нижнем регистре) -> поле задачи
+_COLUMN_ALIASES = {
+    "time_str": "time_str", "time": "time_str",
+    "account_id": "account_id", "account": "account_id",
+    "text": "text",
+    "dow_mask": "dow_mask",
+    "days": "days",
+    "media": "media",
+}
+
+
+class ImportFileError(ValueError):
+    """Файл целиком непригоден для импорта (нет заголовка / обязательных колонок)."""
+
+
+@dataclass
+class ImportReport:
+    added: int = 0
+    skipped: int = 0
+    job_ids: List[int] = field(default_factory=list)
+    errors: List[Tuple[int, str, Dict[str, str]]] = field(default_factory=list)  # (строка, причина, данные)
+
+    def error_report_csv(self) -> bytes:
+        """CSV: line, error + исходные колонки отклонённой строки."""
+        columns: List[str] = []
+        for _, _, row in self.errors:
+            for name in row:
+                if name not in columns:
+                    columns.append(name)
+        buf = io.StringIO()
+        w = csv.writer(buf)
+        w.writerow(["line", "error", *columns])
+        for line_no, reason, row in self.errors:
+            w.writerow([line_no, reason, *(row.get(c, "") for c in columns)])
+        if self.skipped > len(self.errors):
+            w.writerow(["", f"... and {self.skipped - len(self.errors)} more error(s)"])
+        return buf.getvalue().encode("utf-8")
+
+
+def _normalize_time(value: str) -> Optional[str]:
+    """'9:05' / '09:05' -> '09:05'; None, если время некорректно."""
+    try:
+        hh, mm = value.strip().split(":")
+        h, m = int(hh), int(mm)
+    except (ValueError, AttributeError):
+        return None
+    if 0 <= h <= 23 and 0 <= m <= 59:
+        return f"{h:02d}:{m:02d}"
+    return None
+
+
+def _parse_media(value: str) -> Tuple[Optional[List[dict]], Optional[str]]:
+    """'tg:<file_id>|https://...' -> строки job_media (без job_id) или причина отказа."""
+    media: List[dict] = []
+    for ref in (r.strip() for r in value.split(MEDIA_SEPARATOR)):
+        if not ref:
+            continue
+        if ref.startswith(TG_MEDIA_PREFIX) and len(ref) > len(TG_MEDIA_PREFIX):
+            media.append({"source": "telegram", "tg_file_id": ref[len(TG_MEDIA_PREFIX):], "url": None})
+        elif ref.startswith(("http://", "https://")):
+            media.append({"source": "url", "tg_file_id": None, "url": ref})
+        else:
+            return None, f"unknown media reference '{ref[:40]}'"
+    if len(media) > MAX_MEDIA_PER_JOB:
+        return None, f"too many media items (max {MAX_MEDIA_PER_JOB})"
+    return media, None
+
+
+def _validate_row(
+    row: Dict[str, str], tg_user_id: int, account_ids: set, default_account_id: int
+) -> Tuple[Optional[Tuple[dict, List[dict]]], Optional[str]]:
+    """Строка CSV -> ((значения для INSERT, медиа), None) или (None, причина отказа)."""
+    time_str = _normalize_time(row.get("time_str", ""))
+    if time_str is None:
+        return None, "time_str must be HH:MM (00-23:00-59)"
+
+    text = (row.get("text") or "").strip()
+    if not text:
+        return None, "text is empty"
+
+    raw_acc = (row.get("account_id") or "").strip()
+    if not raw_acc:
+        account_id = default_account_id
+    elif raw_acc.isdigit() and int(raw_acc) in account_ids:
+        account_id = int(raw_acc)
+    else:
+        return None, f"account_id {raw_acc} is not one of your accounts"
+
+    # mask: приоритет dow_mask → days → default(127)
+    mask = 127
+    raw_mask = (row.get("dow_mask") or "").strip()
+    raw_days = (row.get("days") or "").strip()
+    if raw_mask:
+        if not raw_mask.isdigit() or not (1 <= int(raw_mask) <= 127):
+            return None, "dow_mask must be an integer 1..127"
+        mask = int(raw_mask)
+    elif raw_days:
+        parsed = parse_days_to_mask(raw_days)
+        if parsed is None:
+            return None, f"unknown days value '{raw_days}'"
+        mask = parsed
+
+    media, error = _parse_media(row.get("media") or "")
+    if error:
+        return None, error
+
+    return ({"tg_user_id": tg_user_id, "time_str": time_str, "text": text,
+             "account_id": account_id, "dow_mask": mask}, media), None
+
+
+async def import_schedule_csv(tg_user_id: int, source: IO[bytes]) -> ImportReport:
+    """
+    Импортирует задачи из бинарного CSV-потока (читается по частям).
+    Бросает ImportFileError, если у пользователя нет аккаунтов или нет нужных колонок.
+    """
+    async with async_session() as session:
+        account_ids = list((await session.execute(
+            select(Account.id).where(Account.tg_user_id == tg_user_id).order_by(Account.id)
+        )).scalars().all())
+    if not account_ids:
+        raise ImportFileError("You have no accounts. Add a token first.")
+    owned, default_account_id = set(account_ids), account_ids[0]
+
+    # utf-8-sig: Excel любит дописывать BOM перед заголовком
+    text_stream = io.TextIOWrapper(source, encoding="utf-8-sig", errors="replace", newline="")
+    reader = csv.reader(text_stream)
+    header = next(reader, None)
+    if not header:
+        raise ImportFileError("The file is empty.")
+    columns = [_COLUMN_ALIASES.get(h.strip().lower(), h.strip().lower()) for h in header]
+    missing = {"time_str", "text"} - set(columns)
+    if missing:
+        raise ImportFileError(f"Missing required column(s): {', '.join(sorted(missing))}.")
+
+    report = ImportReport()
+    batch: List[Tuple[dict, List[dict]]] = []
+    async with async_session() as session:
+        for values in reader:
+            if not any(v.strip() for v in values):
+                continue  # пустые строки не считаем ошибкой
+            row = dict(zip(columns, values))
+            job, error = _validate_row(row, tg_user_id, owned, default_account_id)
+            if error:
+                report.skipped += 1
+                if len(report.errors) < MAX_REPORT_ERRORS:
+                    report.errors.append((reader.line_num, error, dict(zip(header, values))))
+                continue
+            batch.append(job)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                report.job_ids.extend(await _insert_batch(session, batch))
+                batch = []
+        if batch:
+            report.job_ids.extend(await _insert_batch(session, batch))
+        await session.commit()
+
+    report.added = len(report.job_ids)
+    log.info("schedule_import: user=%s added=%s skipped=%s", tg_user_id, report.added, report.skipped)
+    return report
+
+
+async def _insert_batch(session, batch: List[Tuple[dict, List[dict]]]) -> List[int]:
+    # executemany с RETURNING (SQLAlchemy «insertmanyvalues»): один запрос на пачку;
+    # порядок id совпадает с порядком строк — по нему привязываем медиа
+    job_ids = list((await session.execute(
+        insert(Job.__table__).returning(Job.__table__.c.id, sort_by_parameter_order=True),
+        [job for job, _ in batch],
+    )).scalars().all())
+    media_rows = [
+        {"job_id": job_id, **item}
+        for job_id, (_, media) in zip(job_ids, batch)
+        for item in media
+    ]
+    if media_rows:
+        await session.execute(insert(JobMedia.__table__), media_rows)
+    return job_ids
@@ -0,0 +1,115 @@
+# app/services/schedule_projection.py
+# ------------------------------------------------------------
+# Проекция расписания: (time_str, dow_mask) задач + часовой пояс пользователя
+# -> ближайшие моменты срабатывания, одним пакетным проходом.
+# • ZoneInfo создаётся один раз на пояс (lru_cache);
+# • время суток разбирается один раз на уникальный time_str,
+#   локальное время считается один раз на пару (дата, time_str), а не на задачу;
+# • переходы на летнее/зимнее время — как у CronTrigger:
+#   несуществующее время (весной) сдвигается вперёд на величину перехода,
+#   неоднозначное (осенью) срабатывает один раз — по первому наступлению.
+# Используется в /next_runs (Weekly/Day View считают по маске прямо в SQL).
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TZ = "Europe/Berlin"
+ALL_DAYS_MASK = 127
+
+
+@lru_cache(maxsize=256)
+def get_zone(tz_name: Optional[str]) -> ZoneInfo:
+    """ZoneInfo по имени (кешируется); неизвестный пояс -> DEFAULT_TZ."""
+    try:
+        return ZoneInfo(tz_name or DEFAULT_TZ)
+    except Exception:
+        log.warning("schedule_projection: invalid tz=%s, fallback=%s", tz_name, DEFAULT_TZ)
+        return ZoneInfo(DEFAULT_TZ)
+
+
+@lru_cache(maxsize=2048)
+def _parse_time(time_str: str) -> Optional[time]:
+    try:
+        hh, mm = time_str.strip().split(":")
+        return time(int(hh), int(mm))
+    except (ValueError, AttributeError):
+        return None
+
+
+@lru_cache(maxsize=8192)
+def local_fire_time(day: date, at: time, zone: ZoneInfo) -> datetime:
+    """
+    Момент срабатывания в дату day в поясе zone с учётом перехода на летнее/зимнее время.
+    fold=0 — первое наступление неоднозначного времени; несуществующее время
+    после нормализации через UTC сдвигается вперёд.
+    """
+    naive = datetime.combine(day, at)
+    aware = naive.replace(tzinfo=zone, fold=0)
+    return aware.astimezone(timezone.utc).astimezone(zone)
+
+
+def _group_jobs(jobs: Iterable[Any]) -> Dict[Tuple[time, int], List[Any]]:
+    """(время суток, маска) -> задачи; задачи с некорректным time_str пропускаются."""
+    groups: Dict[Tuple[time, int], List[Any]] = defaultdict(list)
+    for job in jobs:
+        at = _parse_time(job.time_str)
+        if at is None:
+            continue
+        mask = ALL_DAYS_MASK if job.dow_mask is None else int(job.dow_mask)
+        groups[(at, mask)].append(job)
+    return groups
+
+
+def _group_fires(
+    groups: Dict[Tuple[time, int], List[Any]], zone: ZoneInfo, start: datetime, end: datetime
+) -> List[Tuple[datetime, List[Any]]]:
+    """Срабатывания групп в окне [start, end), по времени; задачи группы срабатывают вместе."""
+    times = {at for at, _ in groups}
+    fires: List[Tuple[datetime, List[Any]]] = []
+    # +1 день: окно может захватить часть следующей локальной даты
+    for offset in range((end.date() - start.date()).days + 1):
+        day = start.date() + timedelta(days=offset)
+        bit = 1 << day.weekday()
+        fire_at = {at: local_fire_time(day, at, zone) for at in times}
+        for (at, mask), members in groups.items():
+            if mask & bit and start <= fire_at[at] < end:
+                fires.append((fire_at[at], members))
+    fires.sort(key=lambda item: item[0])
+    return fires
+
+
+def expand_fire_times(
+    jobs: Iterable[Any],
+    tz_name: Optional[str],
+    *,
+    start: Optional[datetime] = None,
+    days: int = 7,
+    limit: Optional[int] = None,
+) -> List[Tuple[datetime, Any]]:
+    """
+    Срабатывания задач в окне [start, start + days), отсортированные по времени.
+    jobs — объекты/строки с атрибутами time_str и dow_mask (Job или Row из select).
+    start — aware datetime (по умолчанию «сейчас» в поясе пользователя, до минуты).
+    """
+    zone = get_zone(tz_name)
+    start = (start or datetime.now(zone).replace(second=0, microsecond=0)).astimezone(zone)
+    end = start + timedelta(days=days)
+    groups = _group_jobs(jobs)
+    if not groups:
+        return []
+
+    result: List[Tuple[datetime, Any]] = []
+    for dt, members in _group_fires(groups, zone, start, end):
+        result.extend((dt, job) for job in members)
+        if limit is not None and len(result) >= limit:
+            return result[:limit]
+    return result
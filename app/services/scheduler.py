@@ -1,38 +1,46 @@
 # app/services/scheduler.py
 # ------------------------------------------------------------
 # (ИЗМЕНЕНИЕ) Теперь сохраняет опубликованные посты в архив.
+# Публикация идёт через очередь publish_attempts (app/services/publish_queue.py):
+# триггер ставит попытку и выполняет её, publish_queue_job добирает повторы.
 # ------------------------------------------------------------
 
 from __future__ import annotations
 
 import asyncio
 import logging
-import re
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Optional
 
 from zoneinfo import ZoneInfo
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.interval import IntervalTrigger
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func
 
 from app.config import settings
-# (ИЗМЕНЕНИЕ) Импортируем новую модель PublishedPost
-from app.database.models import async_session, Job, Account, BotSettings, PublishedPost
-from app.services.notifications import notify_user, bind_bot
+from app.database.models import async_session, Job
+from app.services.notifications import bind_bot
+from app.services.row_cache import get_user_tz
+from app.services.digest import flush_digests
 from app.services.schedule_utils import mask_to_cron
 from app.services.token_health import periodic_token_health
-from app.services.tg_io import get_file_public_url
-from app.services.threads_client import ThreadsError, publish_auto
+from app.services.metrics_collector import collect_metrics_snapshots
+from app.services.archive_sync import sync_all_archives
+from app.services.archive_retention import run_archive_maintenance
+from app.services.publish_queue import enqueue_and_run, process_due_attempts
+from app.services import worker_events
 
 logger = logging.getLogger(__name__)
 _scheduler: Optional[AsyncIOScheduler] = None
 
 DEFAULT_TZ = "Europe/Berlin"
 
-IMG_MARK_RE = re.compile(r"\n\s*\[IMG\]\s+(?P<url>\S+)\s*$", re.IGNORECASE)
+# Служебные задачи планировщика, которые reload_schedule() не трогает
+SERVICE_JOB_IDS = {
+    "token_health_job", "metrics_snapshot_job", "archive_sync_job",
+    "archive_maintenance_job", "digest_flush_job", "publish_queue_job",
+}
 
 
 def _parse_hhmm(hhmm: str) -> tuple[int, int]:
@@ -47,105 +55,33 @@ def _parse_hhmm(hhmm: str) -> tuple[int, int]:
     return h, m
 
 
-def _split_text_and_image_url(text: str) -> tuple[str, Optional[str]]:
-    """Ищем в конце текста маркер вида: \\n[IMG] https://... → (текст_без_маркера, url|None)"""
-    if not text:
-        return text, None
-    m = IMG_MARK_RE.search(text)
-    if not m:
-        return text, None
-    url = m.group("url")
-    clean = text[: m.start()].rstrip()
-    return clean, url
+# ----------------------- ИСПОЛНЕНИЕ JOB -------------------- #
 
+def _scheduled_fire_time(job_id: int) -> Optional[datetime]:
+    """
+    Плановое время текущего срабатывания post:{id} (naive UTC): последнее время триггера,
+    не позже «сейчас», в пределах misfire_grace_time. APScheduler 3 не передаёт его в функцию,
+    а next_run_time к этому моменту уже указывает на следующее срабатывание.
+    """
+    aps_job = _scheduler.get_job(f"post:{job_id}") if _scheduler is not None else None
+    if aps_job is None:
+        return None
+    now = datetime.now(timezone.utc)
+    grace = timedelta(seconds=(aps_job.misfire_grace_time or 600) + 60)
+    fire_time = None
+    candidate = aps_job.trigger.get_next_fire_time(None, now - grace)
+    while candidate is not None and candidate <= now:
+        fire_time = candidate
+        candidate = aps_job.trigger.get_next_fire_time(candidate, candidate + timedelta(seconds=1))
+    if fire_time is None:
+        return None
+    return fire_time.astimezone(timezone.utc).replace(tzinfo=None)
 
-# ----------------------- ИСПОЛНЕНИЕ JOB -------------------- #
 
 async def _run_job(job_id: int) -> None:
+    """Срабатывание триггера: попытка публикации ставится в очередь и сразу выполняется."""
     logger.debug("_run_job: start job_id=%s", job_id)
-
-    async with async_session() as session:
-        res = await session.execute(
-            select(Job)
-            .options(selectinload(Job.media))
-            .where(Job.id == job_id)
-        )
-        job = res.scalars().first()
-        if job is None:
-            logger.warning("_run_job: job_id=%s not found", job_id)
-            return
-
-        acc = await session.get(Account, job.account_id)
-        if acc is None or not acc.access_token:
-            await notify_user(job.tg_user_id, f"❌ No token is set. Skipped {job.time_str}")
-            logger.warning("_run_job: no token for job_id=%s user=%s", job_id, job.tg_user_id)
-            return
-
-        orig_text = job.text or ""
-        time_str = job.time_str
-        media_items = list(job.media or [])
-
-        text, marker_url = _split_text_and_image_url(orig_text)
-        image_urls: list[str] = []
-        image_processing_failed = False
-
-        if marker_url:
-            image_urls = [marker_url]
-        else:
-            for m in media_items:
-                try:
-                    if getattr(m, "source", "telegram") == "telegram" and getattr(m, "tg_file_id", None):
-                        url = await get_file_public_url(m.tg_file_id)
-                        if url:
-                            image_urls.append(url)
-                except Exception as e:
-                    logger.warning("media url build failed job_id=%s media_id=%s: %s",
-                                   job_id, getattr(m, "id", "?"), e)
-                    image_processing_failed = True
-
-        try:
-            result = await publish_auto(
-                acc.access_token,
-                text=text,
-                image_urls=image_urls,
-            )
-            
-            # (ИЗМЕНЕНИЕ) Сохранение в архив
-            post_id = result.get("id") or (result.get("published") or {}).get("id")
-            if post_id:
-                archive_entry = PublishedPost(
-                    threads_post_id=str(post_id),
-                    tg_user_id=job.tg_user_id,
-                    account_id=job.account_id,
-                    text=text,
-                    has_media=bool(image_urls or marker_url) # <-- Сохраняем информацию о медиа
-                )
-                session.add(archive_entry)
-                await session.commit()
-            
-            preview = f"{text[:100]}{'…' if len(text) > 100 else ''}"
-            nowz = datetime.utcnow().isoformat(timespec="seconds") + "Z"
-            
-            success_message_lines = [
-                f"⏰ {time_str} — published",
-                f"🧾 {preview}",
-                f"🖼️ images: {len(image_urls)}",
-            ]
-            if image_processing_failed and not image_urls and media_items:
-                success_message_lines.insert(2, "⚠️ (Image failed to process)")
-            success_message_lines.append(f"🕒 {nowz}")
-            
-            await notify_user(job.tg_user_id, "\n".join(success_message_lines))
-
-            logger.info("_run_job: posted job_id=%s user=%s time=%s images=%s",
-                        job_id, job.tg_user_id, time_str, len(image_urls))
-
-        except ThreadsError as e:
-            await notify_user(job.tg_user_id, f"❌ Publish error at {time_str}: {e}")
-            logger.warning("_run_job: ThreadsError job_id=%s user=%s: %s", job_id, job.tg_user_id, e)
-        except Exception as e:
-            await notify_user(job.tg_user_id, f"❌ Unexpected error at {time_str}: {e}")
-            logger.exception("_run_job: unexpected error job_id=%s user=%s: %s", job_id, job.tg_user_id, e)
+    await enqueue_and_run(job_id, scheduled_for=_scheduled_fire_time(job_id))
 
 
 # ----------------------- ЖИЗНЕННЫЙ ЦИКЛ -------------------- #
@@ -159,93 +95,192 @@ async def init_scheduler(bot, tz: str = DEFAULT_TZ) -> AsyncIOScheduler:
         _scheduler.start()
         logger.info("[scheduler] started TZ=%s", tz)
 
-    if not _scheduler.get_job("token_health_job"):
-        hours = int(getattr(settings, "TOKEN_HEALTH_INTERVAL_HOURS", 24) or 24)
+    # Повторы и брошенные попытки публикации — у каждого воркера по своему шарду
+    if not _scheduler.get_job("publish_queue_job"):
         _scheduler.add_job(
-            periodic_token_health,
-            trigger=IntervalTrigger(hours=hours, jitter=60),
-            id="token_health_job",
+            process_due_attempts,
+            trigger=IntervalTrigger(seconds=max(5, int(settings.PUBLISH_QUEUE_POLL_SECONDS or 30))),
+            id="publish_queue_job",
             max_instances=1,
             coalesce=True,
-            misfire_grace_time=300,
+            misfire_grace_time=60,
             replace_existing=True,
         )
 
+    # Служебные задачи — в одном процессе (при нескольких воркерах — у шарда 0)
+    if worker_events.runs_service_jobs():
+        if not _scheduler.get_job("token_health_job"):
+            hours = int(getattr(settings, "TOKEN_HEALTH_INTERVAL_HOURS", 24) or 24)
+            _scheduler.add_job(
+                periodic_token_health,
+                trigger=IntervalTrigger(hours=hours, jitter=60),
+                id="token_health_job",
+                max_instances=1,
+                coalesce=True,
+                misfire_grace_time=300,
+                replace_existing=True,
+            )
+
+        if not _scheduler.get_job("metrics_snapshot_job"):
+            minutes = int(getattr(settings, "METRICS_SNAPSHOT_INTERVAL_MINUTES", 15) or 15)
+            _scheduler.add_job(
+                collect_metrics_snapshots,
+                trigger=IntervalTrigger(minutes=minutes, jitter=30),
+                id="metrics_snapshot_job",
+                max_instances=1,
+                coalesce=True,
+                misfire_grace_time=300,
+                replace_existing=True,
+            )
+
+        sync_hours = int(getattr(settings, "ARCHIVE_SYNC_INTERVAL_HOURS", 6) or 0)
+        if sync_hours > 0 and not _scheduler.get_job("archive_sync_job"):
+            _scheduler.add_job(
+                sync_all_archives,
+                trigger=IntervalTrigger(hours=sync_hours, jitter=120),
+                id="archive_sync_job",
+                max_instances=1,
+                coalesce=True,
+                misfire_grace_time=600,
+                replace_existing=True,
+            )
+
+        if not _scheduler.get_job("digest_flush_job"):
+            _scheduler.add_job(
+                flush_digests,
+                trigger=CronTrigger(minute=0),
+                id="digest_flush_job",
+                max_instances=1,
+                coalesce=True,
+                misfire_grace_time=600,
+                replace_existing=True,
+            )
+
+        # Холодный архив, прореживание снимков метрик + VACUUM — раз в сутки в «тихий» час
+        if not _scheduler.get_job("archive_maintenance_job"):
+            _scheduler.add_job(
+                run_archive_maintenance,
+                trigger=CronTrigger(hour=int(settings.ARCHIVE_MAINTENANCE_HOUR) % 24, minute=15),
+                id="archive_maintenance_job",
+                max_instances=1,
+                coalesce=True,
+                misfire_grace_time=3600,
+                replace_existing=True,
+            )
+
     await reload_schedule()
     return _scheduler
 
 
 async def reload_schedule() -> int:
     global _scheduler
+    if worker_events.is_ui_only():
+        # Планировщик живёт в процессе-воркере: просим его пересобрать расписание
+        await worker_events.publish_event(worker_events.EVENT_RELOAD)
+        async with async_session() as session:
+            return (await session.execute(select(func.count()).select_from(Job))).scalar_one()
     if _scheduler is None:
         logger.warning("reload_schedule: called before init")
         return 0
 
-    keep_ids = {"token_health_job"}
     for job in list(_scheduler.get_jobs()):
-        if job.id not in keep_ids:
+        if job.id not in SERVICE_JOB_IDS:
             _scheduler.remove_job(job.id)
 
     total = 0
 
     async with async_session() as session:
-        rows = (await session.execute(select(Job))).scalars().all()
-        logger.debug("reload_schedule: fetched %s Job row(s)", len(rows))
+        rows = (await session.execute(
+            select(Job.id, Job.tg_user_id, Job.time_str, Job.dow_mask)
+        )).all()
+    logger.debug("reload_schedule: fetched %s Job row(s)", len(rows))
 
-        for j in rows:
-            st = await session.get(BotSettings, j.tg_user_id)
-            tz_name = (st.tz if st and getattr(st, "tz", None) else DEFAULT_TZ)
-            try:
-                user_tz = ZoneInfo(tz_name)
-            except Exception:
-                logger.warning("reload_schedule: invalid tz=%s for user=%s, fallback=%s",
-                               tz_name, j.tg_user_id, DEFAULT_TZ)
-                user_tz = ZoneInfo(DEFAULT_TZ)
-
-            try:
-                hour, minute = _parse_hhmm(j.time_str)
-            except Exception:
-                logger.warning("reload_schedule: skip job_id=%s invalid time '%s'", j.id, j.time_str)
-                continue
-
-            cron_dow = mask_to_cron(getattr(j, "dow_mask", 127))
-            trigger = CronTrigger(hour=hour, minute=minute, timezone=user_tz, day_of_week=cron_dow)
-
-            aps_id = f"post:{j.id}"
-
-            try:
-                _scheduler.add_job(
-                    _run_job,
-                    trigger=trigger,
-                    kwargs={"job_id": j.id},
-                    id=aps_id,
-                    replace_existing=True,
-                    misfire_grace_time=600,
-                    coalesce=True,
-                    max_instances=1,
-                )
-            except TypeError:
-                _scheduler.add_job(
-                    (lambda job_id=j.id: asyncio.create_task(_run_job(job_id))),
-                    trigger=trigger,
-                    id=aps_id,
-                    replace_existing=True,
-                    misfire_grace_time=600,
-                    coalesce=True,
-                    max_instances=1,
-                )
-            except Exception as e:
-                logger.exception("reload_schedule: failed add job id=%s: %s", j.id, e)
-                continue
-
-            logger.info("reload_schedule: add job id=%s user=%s time=%s tz=%s dow=%s",
-                        j.id, j.tg_user_id, j.time_str, tz_name, (cron_dow or "daily"))
+    for j in rows:
+        if worker_events.owns_job(j.id) and await _register_job(j.id, j.tg_user_id, j.time_str, j.dow_mask):
             total += 1
 
     logger.info("reload_schedule: scheduled %s job(s)", total)
     return total
 
 
+async def schedule_jobs(job_ids: Iterable[int]) -> int:
+    """
+    Регистрирует триггеры только для указанных задач (например, после импорта),
+    не пересобирая всё расписание. Возвращает кол-во добавленных триггеров.
+    """
+    if worker_events.is_ui_only():
+        return await worker_events.publish_schedule_jobs(job_ids)
+    if _scheduler is None:
+        logger.warning("schedule_jobs: called before init")
+        return 0
+    ids = [job_id for job_id in job_ids if worker_events.owns_job(job_id)]
+    total = 0
+    for start in range(0, len(ids), 500):
+        async with async_session() as session:
+            rows = (await session.execute(
+                select(Job.id, Job.tg_user_id, Job.time_str, Job.dow_mask)
+                .where(Job.id.in_(ids[start:start + 500]))
+            )).all()
+        for j in rows:
+            if await _register_job(j.id, j.tg_user_id, j.time_str, j.dow_mask, verbose=False):
+                total += 1
+    logger.info("schedule_jobs: scheduled %s of %s job(s)", total, len(ids))
+    return total
+
+
+async def _register_job(job_id: int, tg_user_id: int, time_str: str, dow_mask: Optional[int],
+                        *, verbose: bool = True) -> bool:
+    """Добавляет (или заменяет) CronTrigger задачи post:{id}. False — задача пропущена."""
+    tz_name = await get_user_tz(tg_user_id, DEFAULT_TZ)
+    try:
+        user_tz = ZoneInfo(tz_name)
+    except Exception:
+        logger.warning("reload_schedule: invalid tz=%s for user=%s, fallback=%s",
+                       tz_name, tg_user_id, DEFAULT_TZ)
+        user_tz = ZoneInfo(DEFAULT_TZ)
+
+    try:
+        hour, minute = _parse_hhmm(time_str)
+    except Exception:
+        logger.warning("reload_schedule: skip job_id=%s invalid time '%s'", job_id, time_str)
+        return False
+
+    cron_dow = mask_to_cron(127 if dow_mask is None else dow_mask)
+    trigger = CronTrigger(hour=hour, minute=minute, timezone=user_tz, day_of_week=cron_dow)
+
+    aps_id = f"post:{job_id}"
+
+    try:
+        _scheduler.add_job(
+            _run_job,
+            trigger=trigger,
+            kwargs={"job_id": job_id},
+            id=aps_id,
+            replace_existing=True,
+            misfire_grace_time=600,
+            coalesce=True,
+            max_instances=1,
+        )
+    except TypeError:
+        _scheduler.add_job(
+            (lambda job_id=job_id: asyncio.create_task(_run_job(job_id))),
+            trigger=trigger,
+            id=aps_id,
+            replace_existing=True,
+            misfire_grace_time=600,
+            coalesce=True,
+            max_instances=1,
+        )
+    except Exception as e:
+        logger.exception("reload_schedule: failed add job id=%s: %s", job_id, e)
+        return False
+
+    log_fn = logger.info if verbose else logger.debug
+    log_fn("reload_schedule: add job id=%s user=%s time=%s tz=%s dow=%s",
+           job_id, tg_user_id, time_str, tz_name, (cron_dow or "daily"))
+    return True
+
+
 # Backward-compat
 async def init_schedule(bot, tz: str = DEFAULT_TZ):
     return await init_scheduler(bot, tz)
@@ -0,0 +1,160 @@
+# app/services/search.py
+# ------------------------------------------------------------
+# Поиск по архиву (включая холодный), черновикам и задачам расписания.
+# Основной путь — FTS5-индекс search_fts (см. init_db.ensure_search_index),
+# запасной — LIKE по таблицам (если FTS5 в SQLite не собран).
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import logging
+import re
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+
+from app.database.models import (
+    async_session, PublishedPost, PublishedPostCold, Draft, Job,
+    SEARCH_FTS_TABLE, SEARCH_KIND_COLD_POST, SEARCH_KIND_POST, SEARCH_KIND_DRAFT, SEARCH_KIND_JOB,
+)
+
+log = logging.getLogger(__name__)
+
+SNIPPET_TOKENS = 8
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+_fts_available: Optional[bool] = None
+
+
+@dataclass
+class SearchHit:
+    kind: int            # SEARCH_KIND_*
+    item_id: int         # id в исходной таблице
+    snippet: str
+    when: Optional[datetime] = None  # дата поста
+    time_str: Optional[str] = None   # время задачи
+
+
+def build_fts_query(query: str) -> Optional[str]:
+    """
+    Пользовательский ввод -> безопасный FTS5-запрос:
+    каждое слово в кавычках с префиксным поиском, все слова обязательны.
+    """
+    tokens = _TOKEN_RE.findall(query or "")
+    if not tokens:
+        return None
+    return " ".join(f'"{t}"*' for t in tokens[:10])
+
+
+async def fts_available() -> bool:
+    """Есть ли в базе FTS5-индекс (проверяется один раз)."""
+    global _fts_available
+    if _fts_available is None:
+        try:
+            async with async_session() as session:
+                _fts_available = (await session.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {"name": SEARCH_FTS_TABLE},
+                )).first() is not None
+        except OperationalError:
+            _fts_available = False
+    return _fts_available
+
+
+async def _search_fts(tg_user_id: int, fts_query: str, limit: int, offset: int) -> List[SearchHit]:
+    async with async_session() as session:
+        rows = (await session.execute(
+            text(
+                f"SELECT rowid, snippet({SEARCH_FTS_TABLE}, 0, '', '', '…', {SNIPPET_TOKENS}) "
+                f"FROM {SEARCH_FTS_TABLE} "
+                f"WHERE {SEARCH_FTS_TABLE} MATCH :q AND tg_user_id = :uid "
+                "ORDER BY rank LIMIT :limit OFFSET :offset"
+            ),
+            {"q": fts_query, "uid": tg_user_id, "limit": limit, "offset": offset},
+        )).all()
+    return [SearchHit(kind=rowid % 4, item_id=rowid // 4, snippet=snip or "") for rowid, snip in rows]
+
+
+def _like_snippet(text_value: Optional[str], query: str) -> str:
+    value = (text_value or "").replace("\n", " ")
+    pos = value.lower().find(query.lower())
+    start = max(pos - 20, 0) if pos >= 0 else 0
+    return ("…" if start else "") + value[start:start + 60]
+
+
+async def _search_like(tg_user_id: int, query: str, limit: int, offset: int) -> List[SearchHit]:
+    """Запасной вариант без FTS5: линейный LIKE по всем трём таблицам."""
+    pattern = f"%{query}%"
+    need = offset + limit
+    hits: List[SearchHit] = []
+    async with async_session() as session:
+        for kind, model in ((SEARCH_KIND_POST, PublishedPost), (SEARCH_KIND_DRAFT, Draft), (SEARCH_KIND_JOB, Job)):
+            rows = (await session.execute(
+                select(model.id, model.text)
+                .where(model.tg_user_id == tg_user_id, model.text.ilike(pattern))
+                .order_by(model.id.desc())
+                .limit(need)
+            )).all()
+            hits.extend(SearchHit(kind=kind, item_id=i, snippet=_like_snippet(t, query)) for i, t in rows)
+        # Текст холодного архива сжат — ищем только по preview
+        rows = (await session.execute(
+            select(PublishedPostCold.id, PublishedPostCold.preview)
+            .where(PublishedPostCold.tg_user_id == tg_user_id, PublishedPostCold.preview.ilike(pattern))
+            .order_by(PublishedPostCold.id.desc())
+            .limit(need)
+        )).all()
+        hits.extend(SearchHit(kind=SEARCH_KIND_COLD_POST, item_id=i, snippet=_like_snippet(t, query)) for i, t in rows)
+    return hits[offset:need]
+
+
+async def _attach_details(hits: List[SearchHit]) -> None:
+    """Дата для постов и время для задач — для подписи кнопок."""
+    post_ids = [h.item_id for h in hits if h.kind == SEARCH_KIND_POST]
+    cold_ids = [h.item_id for h in hits if h.kind == SEARCH_KIND_COLD_POST]
+    job_ids = [h.item_id for h in hits if h.kind == SEARCH_KIND_JOB]
+    async with async_session() as session:
+        posts = dict((await session.execute(
+            select(PublishedPost.id, PublishedPost.published_at).where(PublishedPost.id.in_(post_ids))
+        )).all()) if post_ids else {}
+        cold = dict((await session.execute(
+            select(PublishedPostCold.id, PublishedPostCold.published_at).where(PublishedPostCold.id.in_(cold_ids))
+        )).all()) if cold_ids else {}
+        jobs = dict((await session.execute(
+            select(Job.id, Job.time_str).where(Job.id.in_(job_ids))
+        )).all()) if job_ids else {}
+    for h in hits:
+        if h.kind == SEARCH_KIND_POST:
+            h.when = posts.get(h.item_id)
+        elif h.kind == SEARCH_KIND_COLD_POST:
+            h.when = cold.get(h.item_id)
+        elif h.kind == SEARCH_KIND_JOB:
+            h.time_str = jobs.get(h.item_id)
+
+
+async def search(tg_user_id: int, query: str, *, limit: int = 10, offset: int = 0) -> Tuple[List[SearchHit], bool]:
+    """
+    Ищет query среди постов архива, черновиков и задач пользователя.
+    Возвращает (результаты страницы, есть ли следующая страница).
+    """
+    query = (query or "").strip()
+    if not query:
+        return [], False
+
+    hits: List[SearchHit] = []
+    fts_query = build_fts_query(query)
+    if fts_query and await fts_available():
+        try:
+            hits = await _search_fts(tg_user_id, fts_query, limit + 1, offset)
+        except OperationalError as e:
+            log.warning("search: FTS query %r failed, falling back to LIKE: %s", fts_query, e)
+            hits = await _search_like(tg_user_id, query, limit + 1, offset)
+    else:
+        hits = await _search_like(tg_user_id, query, limit + 1, offset)
+
+    has_next = len(hits) > limit
+    hits = hits[:limit]
+    await _attach_details(hits)
+    return hits, has_next
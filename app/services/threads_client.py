@@ -209,6 +209,16 @@ async def get_post_metrics(access_token: str, post_id: str) -> Dict[str, Any]:
         raise ThreadsError(f"Unexpected error getting metrics: {e_unexp}") from e_unexp
 
 
+async def get_post_fields(access_token: str, post_id: str, fields: Iterable[str]) -> Dict[str, Any]:
+    """
+    Raw lookup of arbitrary fields for a post (no fallback logic).
+    Used by the metrics service, which handles unsupported fields itself.
+    """
+    url = f"{THREADS_BASE}/{post_id}"
+    params = {"access_token": access_token, "fields": ",".join(fields)}
+    return await _get_json(url, params)
+
+
 # ==== Комментарии к посту =========================================
 
 async def get_post_comments(access_token: str, post_id: str, limit: int = 25, after: Optional[str] = None) -> Dict[str, Any]:
@@ -245,10 +255,17 @@ async def get_post_comments(access_token: str, post_id: str, limit: int = 25, af
 
 # ==== (НОВАЯ ФУНКЦИЯ) Посты пользователя ==========================
 
-async def get_user_media(access_token: str, limit: int = 10) -> Dict[str, Any]:
+async def get_user_media(
+    access_token: str,
+    limit: int = 10,
+    after: Optional[str] = None,
+    since: Optional[int] = None,
+) -> Dict[str, Any]:
     """
-    Gets the user's own most recent media (posts).
-    Used for importing manually created posts.
+    Gets the user's own media (posts), newest first.
+    Used for importing manually created posts and for full archive sync.
+    Supports pagination via 'after' cursor and 'since' (unix timestamp) filter;
+    'paging' from the API response is returned as is.
     """
     url = f"{THREADS_BASE}/me/threads"
     params = {
@@ -260,7 +277,11 @@ async def get_user_media(access_token: str, limit: int = 10) -> Dict[str, Any]:
         "fields": "id,text,timestamp,media_type,media_product_type,permalink",
         "limit": limit
     }
-    log.debug("Requesting user's media (limit=%d)", limit)
+    if after:
+        params["after"] = after
+    if since:
+        params["since"] = since
+    log.debug("Requesting user's media (limit=%d, after=%s, since=%s)", limit, after, since)
     try:
         data = await _get_json(url, params)
         log.debug("User media received: %d posts", len(data.get("data", [])))
@@ -313,70 +334,91 @@ async def _create_media_container(access_token: str, payload: Dict[str, Any]) ->
     log.debug("Media container created: %s", container_id)
     return container_id
 
-async def post_thread(
+async def create_post_container(
     access_token: str,
     *,
     text: Optional[str] = None,
     image_urls: Optional[Iterable[str]] = None,
     reply_to_id: Optional[str] = None, # ID of the comment being replied to
-) -> Dict[str, Any]:
+) -> str:
     """
-    Publishes content to Threads. Handles text, single image, carousel (up to 10 images),
-    and replies to specific comments.
+    Step 1 of publishing: creates the container for text, single image, carousel
+    (up to 10 images) or a reply and returns its ID. Nothing is visible until
+    publish_container() is called, so a stored ID can be published on retry.
+    Raises ValueError for an invalid content combination.
     """
     images = list(image_urls or [])
     num_images = len(images)
-    container_id = None
-    media_type_for_payload = None
 
-    try:
-        if reply_to_id:
-            log.info("Preparing reply to comment %s", reply_to_id)
-            media_type_for_payload = "TEXT"
-            payload = _prepare_payload(access_token, text=text, reply_to_id=reply_to_id, media_type=media_type_for_payload)
-            container_id = await _create_media_container(access_token, payload)
-
-        elif text and not images:
-            log.info("Preparing text-only post.")
-            media_type_for_payload = "TEXT"
-            payload = _prepare_payload(access_token, text=text, media_type=media_type_for_payload)
-            container_id = await _create_media_container(access_token, payload)
-
-        elif num_images == 1:
-            log.info("Preparing single image post.")
-            media_type_for_payload = "IMAGE"
-            payload = _prepare_payload(access_token, text=text, media_type=media_type_for_payload, image_urls=images)
-            container_id = await _create_media_container(access_token, payload)
-
-        elif 1 < num_images <= 10:
-            log.info("Preparing carousel post with %d images.", num_images)
-            child_ids = []
-            for i, img_url in enumerate(images):
-                log.debug("Creating carousel item %d/%d", i + 1, num_images)
-                item_payload = _prepare_payload(access_token, media_type="IMAGE", image_urls=[img_url], is_carousel_item=True)
-                child_id = await _create_media_container(access_token, item_payload)
-                child_ids.append(child_id)
-                await asyncio.sleep(0.5)
-
-            log.debug("Creating main carousel container with children: %s", child_ids)
-            media_type_for_payload = "CAROUSEL"
-            carousel_payload = _prepare_payload(access_token, text=text, media_type=media_type_for_payload, children=child_ids)
-            container_id = await _create_media_container(access_token, carousel_payload)
-
-        else:
-            if num_images > 10: raise ValueError("Cannot publish more than 10 images in a carousel.")
-            elif not text: raise ValueError("Post must contain text or at least one image.")
-            else: raise ValueError("Invalid content combination for post.")
+    if reply_to_id:
+        log.info("Preparing reply to comment %s", reply_to_id)
+        payload = _prepare_payload(access_token, text=text, reply_to_id=reply_to_id, media_type="TEXT")
+        return await _create_media_container(access_token, payload)
+
+    if text and not images:
+        log.info("Preparing text-only post.")
+        payload = _prepare_payload(access_token, text=text, media_type="TEXT")
+        return await _create_media_container(access_token, payload)
+
+    if num_images == 1:
+        log.info("Preparing single image post.")
+        payload = _prepare_payload(access_token, text=text, media_type="IMAGE", image_urls=images)
+        return await _create_media_container(access_token, payload)
+
+    if 1 < num_images <= 10:
+        log.info("Preparing carousel post with %d images.", num_images)
+        child_ids = []
+        for i, img_url in enumerate(images):
+            log.debug("Creating carousel item %d/%d", i + 1, num_images)
+            item_payload = _prepare_payload(access_token, media_type="IMAGE", image_urls=[img_url], is_carousel_item=True)
+            child_id = await _create_media_container(access_token, item_payload)
+            child_ids.append(child_id)
+            await asyncio.sleep(0.5)
+
+        log.debug("Creating main carousel container with children: %s", child_ids)
+        carousel_payload = _prepare_payload(access_token, text=text, media_type="CAROUSEL", children=child_ids)
+        return await _create_media_container(access_token, carousel_payload)
+
+    if num_images > 10: raise ValueError("Cannot publish more than 10 images in a carousel.")
+    elif not text: raise ValueError("Post must contain text or at least one image.")
+    else: raise ValueError("Invalid content combination for post.")
+
+async def get_container_status(access_token: str, container_id: str) -> Dict[str, Any]:
+    """
+    Status of a media container: {"id", "status", "error_message"?}.
+    status is one of IN_PROGRESS, FINISHED, PUBLISHED, ERROR, EXPIRED.
+    Lets a retried publish see that the container already went public.
+    """
+    url = f"{THREADS_BASE}/{container_id}"
+    params = {"access_token": access_token, "fields": "id,status,error_message"}
+    return await _get_json(url, params)
 
-        if not container_id:
-            raise ThreadsError("Failed to create any container.")
+async def publish_container(access_token: str, container_id: str) -> Dict[str, Any]:
+    """Step 2 of publishing: makes the container public. Returns {"id": post_id, "published": raw}."""
+    if not container_id:
+        raise ThreadsError("Failed to create any container.")
+    log.info("Publishing container %s...", container_id)
+    published_result = await _publish_container(access_token, container_id)
+    log.info("Container %s published successfully.", container_id)
+    final_post_id = published_result.get("id") or container_id
+    return {"id": final_post_id, "published": published_result}
 
-        log.info("Publishing container %s...", container_id)
-        published_result = await _publish_container(access_token, container_id)
-        log.info("Container %s published successfully.", container_id)
-        
-        final_post_id = published_result.get("id") or container_id
-        return {"id": final_post_id, "published": published_result}
+async def post_thread(
+    access_token: str,
+    *,
+    text: Optional[str] = None,
+    image_urls: Optional[Iterable[str]] = None,
+    reply_to_id: Optional[str] = None, # ID of the comment being replied to
+) -> Dict[str, Any]:
+    """
+    Publishes content to Threads in one go (create_post_container + publish_container).
+    Handles text, single image, carousel (up to 10 images), and replies to specific comments.
+    """
+    try:
+        container_id = await create_post_container(
+            access_token, text=text, image_urls=image_urls, reply_to_id=reply_to_id
+        )
+        return await publish_container(access_token, container_id)
 
     except Exception as e:
         log.exception("Error during post_thread execution: %s", e)
@@ -415,8 +457,9 @@ get_me = get_profile
 
 __all__ = [
     "ThreadsError", "ThreadsAPIError",
-    "get_profile", "get_post_metrics", "get_post_comments", "get_user_media", # <-- Добавлено
+    "get_profile", "get_post_metrics", "get_post_fields", "get_post_comments", "get_user_media", # <-- Добавлено
     "post_thread_text", "post_thread", "post_reply",
+    "create_post_container", "publish_container",
     "publish_auto",
     "create_thread", "publish_thread", "publish_text_thread", "get_me",
 ]
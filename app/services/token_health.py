@@ -4,6 +4,7 @@ from __future__ import annotations
 
 import asyncio
 import logging
+from html import escape
 from datetime import datetime, timedelta, timezone
 from typing import Tuple, Optional
 
@@ -12,6 +13,7 @@ from sqlalchemy import select
 from app.database.models import async_session, Account
 from app.services.threads_client import get_profile, ThreadsError
 from app.services.notifications import notify_user
+from app.services.row_cache import invalidate_account
 from app.config import settings
 
 log = logging.getLogger(__name__)
@@ -51,6 +53,7 @@ async def check_and_cache_token_health(acc_id: int, notify_on_error: bool = True
                 if acc.title and not db_acc.title:
                     db_acc.title = acc.title
             await session.commit()
+        invalidate_account(acc.id)
     except Exception as e:
         log.warning("token_health: cache update failed for acc %s: %s", acc.id, e)
 
@@ -60,8 +63,8 @@ async def check_and_cache_token_health(acc_id: int, notify_on_error: bool = True
             await notify_user(
                 acc.tg_user_id,
                 "⚠️ Token check failed\n"
-                f"Account: <b>{acc.title or f'id={acc.id}'}</b>\n"
-                f"Reason: <code>{msg or 'unknown'}</code>"
+                f"Account: <b>{escape(acc.title or f'id={acc.id}')}</b>\n"
+                f"Reason: <code>{escape(msg or 'unknown')}</code>"
             )
         except Exception as e:
             log.warning("token_health: notify failed for acc %s: %s", acc.id, e)
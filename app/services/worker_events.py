@@ -0,0 +1,188 @@
+# app/services/worker_events.py
+# ------------------------------------------------------------
+# Раздельный запуск: UI-процесс (long polling + хендлеры) и воркер публикаций
+# (APScheduler, _run_job, служебные задачи). Роль — ROLE / --role:
+#   all    — всё в одном процессе (как раньше);
+#   ui     — только обновления Telegram; изменения расписания уходят воркерам
+#            событиями через таблицу worker_events;
+#   worker — планировщик + опрос worker_events.
+# Сброс кеша строк (row_cache) рассылается в обе стороны: воркер тоже меняет
+# аккаунты (проверка токенов, синхронизация архива), UI применяет только такие события.
+# Воркеров может быть несколько: WORKER_SHARDS / WORKER_SHARD делят задачи
+# по job_id % WORKER_SHARDS; служебные задачи выполняет только шард 0.
+# События читает каждый процесс (свой курсор по id), старые удаляются.
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, Optional, Set
+
+from sqlalchemy import select, delete, func
+
+from app.config import settings
+from app.database.models import async_session, WorkerEvent
+from app.services import row_cache
+
+log = logging.getLogger(__name__)
+
+ROLES = ("all", "ui", "worker")
+ROLE_ALL, ROLE_UI, ROLE_WORKER = ROLES
+
+EVENT_RELOAD = "reload"                # пересобрать расписание целиком
+EVENT_SCHEDULE_JOBS = "schedule_jobs"  # добавить триггеры задач {"ids": [...]}
+EVENT_INVALIDATE = "invalidate"        # сбросить строку кеша {"cache": ..., "key": ...}
+
+EVENT_BATCH = 500
+SCHEDULE_IDS_PER_EVENT = 5000
+EVENT_RETENTION = timedelta(days=1)
+PRUNE_EVERY = timedelta(hours=1)
+
+_role: str = settings.ROLE if settings.ROLE in ROLES else ROLE_ALL
+_pending: Set[asyncio.Task] = set()
+
+
+def set_role(role: str) -> None:
+    global _role
+    if role not in ROLES:
+        raise ValueError(f"Unknown role '{role}', expected one of: {', '.join(ROLES)}")
+    _role = role
+
+
+def current_role() -> str:
+    return _role
+
+
+def is_ui_only() -> bool:
+    """True — в этом процессе нет планировщика, изменения расписания уходят воркеру."""
+    return _role == ROLE_UI
+
+
+def owns_job(job_id: int) -> bool:
+    """Задача относится к шарду этого воркера."""
+    shards = max(1, int(settings.WORKER_SHARDS or 1))
+    return shards == 1 or job_id % shards == int(settings.WORKER_SHARD) % shards
+
+
+def runs_service_jobs() -> bool:
+    return int(settings.WORKER_SHARD or 0) == 0
+
+
+# ----------------------- ОТПРАВКА (UI) -------------------- #
+
+async def publish_event(kind: str, payload: Optional[Dict[str, Any]] = None) -> int:
+    async with async_session() as session:
+        event = WorkerEvent(kind=kind, payload=json.dumps(payload) if payload else None)
+        session.add(event)
+        await session.commit()
+        log.debug("worker_events: published #%s %s", event.id, kind)
+        return event.id
+
+
+async def publish_schedule_jobs(job_ids: Iterable[int]) -> int:
+    ids = list(job_ids)
+    for start in range(0, len(ids), SCHEDULE_IDS_PER_EVENT):
+        await publish_event(EVENT_SCHEDULE_JOBS, {"ids": ids[start:start + SCHEDULE_IDS_PER_EVENT]})
+    return len(ids)
+
+
+def _publish_nowait(kind: str, payload: Dict[str, Any]) -> None:
+    try:
+        task = asyncio.get_running_loop().create_task(publish_event(kind, payload))
+    except RuntimeError:
+        return  # вне event loop (скрипты/импорт) — воркер догонит по TTL кеша
+    _pending.add(task)
+    task.add_done_callback(_pending.discard)
+
+
+def install_invalidation_hooks() -> None:
+    """
+    Раздельный запуск (ui / worker): сброс кеша строк пересылается остальным процессам,
+    иначе у них устаревшие токены, статусы и пояса до истечения ROW_CACHE_TTL_SECONDS.
+    """
+    row_cache.add_invalidation_listener(
+        lambda cache, key: _publish_nowait(EVENT_INVALIDATE, {"cache": cache, "key": key})
+    )
+
+
+async def drain_pending(timeout: float = 5.0) -> None:
+    """Дождаться неотправленных событий (при остановке процесса)."""
+    if not _pending:
+        return
+    done, pending = await asyncio.wait(set(_pending), timeout=timeout)
+    if pending:
+        log.warning("worker_events: %s event(s) not published before shutdown", len(pending))
+
+
+# ----------------------- ОБРАБОТКА (WORKER) -------------------- #
+
+async def _apply(event: WorkerEvent) -> None:
+    # Ленивый импорт: scheduler сам импортирует этот модуль
+    from app.services.scheduler import reload_schedule, schedule_jobs
+
+    payload = json.loads(event.payload) if event.payload else {}
+    if event.kind == EVENT_INVALIDATE:
+        row_cache.apply_invalidation(payload.get("cache"), payload.get("key"))
+    elif is_ui_only():
+        return  # расписанием UI не занимается
+    elif event.kind == EVENT_RELOAD:
+        # Пояс пользователя мог смениться: событие сброса кеша может прийти позже reload
+        row_cache.clear_caches()
+        await reload_schedule()
+    elif event.kind == EVENT_SCHEDULE_JOBS:
+        await schedule_jobs(payload.get("ids") or [])
+    else:
+        log.warning("worker_events: unknown event #%s kind=%s", event.id, event.kind)
+
+
+async def _prune(now: datetime) -> None:
+    async with async_session() as session:
+        res = await session.execute(delete(WorkerEvent).where(WorkerEvent.created_at < now - EVENT_RETENTION))
+        await session.commit()
+    if res.rowcount:
+        log.info("worker_events: pruned %s old event(s)", res.rowcount)
+
+
+async def last_event_id() -> int:
+    async with async_session() as session:
+        return (await session.execute(select(func.max(WorkerEvent.id)))).scalar() or 0
+
+
+async def run_event_loop(after_id: int, poll_seconds: Optional[float] = None) -> None:
+    """
+    Опрос worker_events (воркер — все события, UI — только сброс кеша).
+    Курсор — последний обработанный id; у воркера after_id берётся до сборки
+    расписания при старте, чтобы не потерять события, пришедшие во время неё.
+    """
+    poll = max(0.2, float(poll_seconds or settings.WORKER_POLL_SECONDS))
+    last_id = after_id
+    log.info("worker_events: event loop started (role=%s shard=%s/%s, from event #%s)",
+             _role, settings.WORKER_SHARD, settings.WORKER_SHARDS, last_id)
+
+    next_prune = datetime.utcnow()
+    while True:
+        events = []
+        try:
+            async with async_session() as session:
+                events = (await session.execute(
+                    select(WorkerEvent).where(WorkerEvent.id > last_id).order_by(WorkerEvent.id).limit(EVENT_BATCH)
+                )).scalars().all()
+            for event in events:
+                try:
+                    await _apply(event)
+                except Exception as e:
+                    log.exception("worker_events: failed to apply #%s %s: %s", event.id, event.kind, e)
+                last_id = event.id
+
+            now = datetime.utcnow()
+            if now >= next_prune and not is_ui_only() and runs_service_jobs():
+                await _prune(now)
+                next_prune = now + PRUNE_EVERY
+        except Exception as e:
+            log.warning("worker_events: poll failed: %s", e)
+
+        if len(events) < EVENT_BATCH:
+            await asyncio.sleep(poll)
@@ -0,0 +1,84 @@
+# benchmarks/bench_schedule_projection.py
+# ------------------------------------------------------------
+# Сравнение прежнего расчёта /next_runs (генератор на каждую задачу)
+# с пакетной проекцией app.services.schedule_projection.
+# Запуск из корня репозитория:
+#   python -m benchmarks.bench_schedule_projection [кол-во задач ...]
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from zoneinfo import ZoneInfo
+
+from app.services.schedule_projection import expand_fire_times
+
+TZ = "Europe/Berlin"
+DEFAULT_SIZES = (100, 1_000, 5_000, 20_000)
+REPEATS = 3
+
+
+def make_jobs(n: int, seed: int = 42) -> list:
+    rnd = random.Random(seed)
+    return [
+        SimpleNamespace(
+            id=i,
+            time_str=f"{rnd.randrange(24):02d}:{rnd.choice((0, 15, 30, 45)):02d}",
+            dow_mask=rnd.randint(1, 127),
+            account_id=1,
+        )
+        for i in range(n)
+    ]
+
+
+def legacy_next_runs(jobs: list, tz_name: str, days: int = 7, limit: int = 20) -> list:
+    """Прежний алгоритм из next_runs_cmd: ZoneInfo и разбор времени — на каждую задачу."""
+    def next_dates_for_job(time_str, mask, tz, days=7):
+        zone = ZoneInfo(tz)
+        hh, mm = map(int, time_str.split(":"))
+        now = datetime.now(zone).replace(second=0, microsecond=0)
+        cur = now
+        for _ in range(days):
+            dt = cur.replace(hour=hh, minute=mm)
+            if dt < cur:
+                dt += timedelta(days=1)
+            while True:
+                if (mask >> dt.weekday()) & 1:
+                    yield dt
+                    break
+                dt += timedelta(days=1)
+            cur += timedelta(days=1)
+
+    upcoming = []
+    for j in jobs:
+        upcoming.extend((dt, j) for dt in next_dates_for_job(j.time_str, j.dow_mask, tz_name, days))
+    upcoming.sort(key=lambda x: x[0])
+    return upcoming[:limit]
+
+
+def best_of(fn, *args) -> float:
+    best = float("inf")
+    for _ in range(REPEATS):
+        t0 = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def main(sizes) -> None:
+    print(f"{'jobs':>8} | {'next_runs old':>13} | {'next_runs new':>13}")
+    for n in sizes:
+        jobs = make_jobs(n)
+        print(
+            f"{n:>8} | "
+            f"{best_of(legacy_next_runs, jobs, TZ):>10.1f} ms | "
+            f"{best_of(lambda: expand_fire_times(jobs, TZ, days=7, limit=20)):>10.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or DEFAULT_SIZES)
@@ -2,10 +2,13 @@
 # ------------------------------------------------------------
 # Точка входа бота (aiogram v3.7+).
 # Подключаем только корневой роутер, инициализируем БД и планировщик.
+# Роль процесса (ROLE / --role): all — всё сразу; ui — только обновления
+# Telegram; worker — планировщик и публикации (см. app/services/worker_events.py).
 # ------------------------------------------------------------
 
 from __future__ import annotations
 
+import argparse
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
@@ -14,12 +17,40 @@ from aiogram.enums import ParseMode
 
 from app.config import settings
 from app.routers import router as root_router
-from app.database.init_db import init_db
+from app.database.init_db import init_db, ensure_wal_mode
 from app.services.scheduler import init_schedule
 
 # ВАЖНО: привязки бота к сервисам
 from app.services import tg_io
-from app.services.notifications import bind_bot as bind_notifications_bot
+from app.services.notifications import (
+    bind_bot as bind_notifications_bot, shutdown_notifications, log_notification_stats,
+)
+from app.services.ai_assistant import close_ai_client
+from app.middleware.throttling import throttling_middleware, log_throttle_stats
+from app.services import worker_events
+from app.keyboards import log_keyboard_stats
+from app.services.row_cache import log_cache_stats
+
+
+def _parse_role() -> str:
+    parser = argparse.ArgumentParser(description="Threads scheduler bot")
+    parser.add_argument("--role", choices=worker_events.ROLES, default=worker_events.current_role())
+    args, _ = parser.parse_known_args()
+    return args.role
+
+
+def _log_stats() -> None:
+    # Каждая функция молчит, если в этой роли ей нечего показать
+    log_keyboard_stats()
+    log_throttle_stats()
+    log_cache_stats()
+    log_notification_stats()
+
+
+async def _log_stats_periodically(minutes: int) -> None:
+    while True:
+        await asyncio.sleep(minutes * 60)
+        _log_stats()
 
 
 async def main() -> None:
@@ -28,6 +59,10 @@ async def main() -> None:
         format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
     )
 
+    worker_events.set_role(_parse_role())
+    role = worker_events.current_role()
+    logging.info("Starting with role=%s", role)
+
     bot_token = getattr(settings, "TG_BOT_TOKEN", None)
     if not bot_token:
         raise RuntimeError("TG_BOT_TOKEN is not set in settings/.env")
@@ -42,17 +77,52 @@ async def main() -> None:
     tg_io.bind_bot(bot)
     bind_notifications_bot(bot)
 
+    # Анти-флуд: до фильтров и хендлеров, чтобы отклонённые события не доходили до БД/API
+    dp.message.outer_middleware(throttling_middleware)
+    dp.callback_query.outer_middleware(throttling_middleware)
+
     # Подключаем корневой роутер
     dp.include_router(root_router)
 
     # 1) Инициализация БД
     await init_db()
+    if role != worker_events.ROLE_ALL:
+        await ensure_wal_mode()
 
-    # 2) Планировщик (APS) + периодический health-check токенов
-    await init_schedule(bot, tz="Europe/Berlin")
+    background: list[asyncio.Task] = []
+    if settings.STATS_LOG_MINUTES > 0:
+        background.append(asyncio.create_task(_log_stats_periodically(settings.STATS_LOG_MINUTES)))
+    try:
+        if role == worker_events.ROLE_WORKER:
+            # 2) Воркер: курсор событий берём до сборки расписания, чтобы не пропустить изменения
+            after_id = await worker_events.last_event_id()
+            worker_events.install_invalidation_hooks()
+            await init_schedule(bot, tz="Europe/Berlin")
+            await worker_events.run_event_loop(after_id)
+        else:
+            # 2) Планировщик (APS) + периодический health-check токенов — только в режиме all;
+            #    UI вместо него слушает сброс кеша от воркеров
+            if role == worker_events.ROLE_UI:
+                worker_events.install_invalidation_hooks()
+                background.append(asyncio.create_task(
+                    worker_events.run_event_loop(await worker_events.last_event_id())
+                ))
+            else:
+                await init_schedule(bot, tz="Europe/Berlin")
 
-    # 3) Запуск polling
-    await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+            # 3) Запуск polling
+            await dp.start_polling(bot, allowed_updates=dp.resolve_used_update_types())
+    finally:
+        for task in background:
+            task.cancel()
+        # События, поставленные в фоне (сброс кеша), не должны потеряться при остановке
+        await worker_events.drain_pending()
+        # Досылаем уведомления, накопленные в очереди диспетчера
+        await shutdown_notifications()
+        _log_stats()
+        await close_ai_client()
+        if role == worker_events.ROLE_WORKER:
+            await bot.session.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,73 @@
+# scripts/check_modules.py
+# ------------------------------------------------------------
+# Быстрая проверка перед коммитом:
+# • импортирует все модули пакета app (роутеры, сервисы, клавиатуры) —
+#   ловит ошибки импорта и опечатки уровня модуля;
+# • если установлен pyflakes — ищет неопределённые имена в телах функций
+#   (их импорт не ловит: NameError всплывает только при вызове хендлера).
+# Запуск из корня репозитория (нужен TG_BOT_TOKEN, как и для бота):
+#   python -m scripts.check_modules
+# ------------------------------------------------------------
+
+from __future__ import annotations
+
+import importlib
+import pkgutil
+import sys
+import traceback
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+PACKAGE = "app"
+
+
+def import_all() -> list[str]:
+    errors: list[str] = []
+    package = importlib.import_module(PACKAGE)
+    for info in pkgutil.walk_packages(package.__path__, prefix=f"{PACKAGE}."):
+        try:
+            importlib.import_module(info.name)
+        except Exception:
+            errors.append(f"{info.name}: import failed\n{traceback.format_exc(limit=3)}")
+    return errors
+
+
+def undefined_names() -> list[str]:
+    try:
+        from pyflakes.api import checkPath
+        from pyflakes.reporter import Reporter
+    except ImportError:
+        print("pyflakes is not installed — skipping the undefined-name check")
+        return []
+
+    class _Collect(Reporter):
+        def __init__(self) -> None:
+            self.found: list[str] = []
+
+        def flake(self, message) -> None:
+            if "undefined name" in str(message):
+                self.found.append(str(message))
+
+        def syntaxError(self, filename, msg, lineno, offset, text) -> None:
+            self.found.append(f"{filename}:{lineno}: syntax error: {msg}")
+
+        def unexpectedError(self, filename, msg) -> None:
+            self.found.append(f"{filename}: {msg}")
+
+    reporter = _Collect()
+    for path in sorted([ROOT / "main.py", *(ROOT / PACKAGE).rglob("*.py")]):
+        checkPath(str(path), reporter)
+    return reporter.found
+
+
+def main() -> int:
+    sys.path.insert(0, str(ROOT))
+    problems = import_all() + undefined_names()
+    for problem in problems:
+        print(problem)
+    print(f"{len(problems)} problem(s)" if problems else "ok")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())